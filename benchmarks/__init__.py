@@ -0,0 +1,7 @@
+"""
+Performance benchmarks for `dtimsprep`.
+
+Run from the root of the repository:
+
+	python -m benchmarks.run --help
+"""
@@ -0,0 +1,148 @@
+"""
+Time `merge.on_slk_intervals()` and measure its peak memory for each `AggregationType` on a synthetic road network.
+
+Results are saved as JSON in the output directory and compared against the most recent earlier result that used the
+same parameters. The exit status is 1 if any aggregation became slower than `--threshold` times its earlier time.
+
+	python -m benchmarks.run --roads 200 --segments-per-road 500
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+import dtimsprep.merge as merge
+from benchmarks.synthetic import road_network
+
+
+def aggregation_for(aggregation_type: merge.AggregationType) -> merge.Aggregation:
+	if aggregation_type == merge.AggregationType.LengthWeightedPercentile:
+		return merge.Aggregation.LengthWeightedPercentile(0.75)
+	return merge.Aggregation(aggregation_type)
+
+
+def measure(target, data, column_actions, engine: str, repeat: int) -> dict:
+	"""Return the best wall time of `repeat` runs, and the peak memory traced during a separate run"""
+	seconds = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		merge.on_slk_intervals(target, data, ["road_no", "carriageway"], column_actions, ("slk_from", "slk_to"), engine=engine)
+		seconds.append(time.perf_counter() - start)
+	
+	# tracing slows the merge down, so memory is measured on its own run
+	tracemalloc.start()
+	merge.on_slk_intervals(target, data, ["road_no", "carriageway"], column_actions, ("slk_from", "slk_to"), engine=engine)
+	_, peak_bytes = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	
+	return {"seconds": min(seconds), "peak_bytes": peak_bytes}
+
+
+def previous_result(output_directory: str, parameters: dict) -> Optional[dict]:
+	"""The most recent saved result with the same parameters, if any"""
+	if not os.path.isdir(output_directory):
+		return None
+	for file_name in sorted(os.listdir(output_directory), reverse=True):
+		if not file_name.endswith(".json"):
+			continue
+		with open(os.path.join(output_directory, file_name)) as file:
+			result = json.load(file)
+		if result.get("parameters") == parameters:
+			return result
+	return None
+
+
+def main(argv=None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--roads",             type=int,   default=100)
+	parser.add_argument("--segments-per-road", type=int,   default=200)
+	parser.add_argument("--data-ratio",        type=float, default=3.0,  help="data rows per target row")
+	parser.add_argument("--overlap-density",   type=float, default=0.0,  help="fraction of data rows overlapping the next row")
+	parser.add_argument("--nan-fraction",      type=float, default=0.05, help="fraction of blank data values")
+	parser.add_argument("--columns",           type=int,   default=1,    help="number of numeric data columns")
+	parser.add_argument("--seed",              type=int,   default=0)
+	parser.add_argument("--engine",            default="sweep", choices=["sweep", "reference"])
+	parser.add_argument("--repeat",            type=int,   default=3)
+	parser.add_argument("--threshold",         type=float, default=1.25, help="slowdown ratio reported as a regression")
+	parser.add_argument("--output",            default=os.path.join(os.path.dirname(__file__), "results"))
+	arguments = parser.parse_args(argv)
+	
+	parameters = {
+		"roads":             arguments.roads,
+		"segments_per_road": arguments.segments_per_road,
+		"data_ratio":        arguments.data_ratio,
+		"overlap_density":   arguments.overlap_density,
+		"nan_fraction":      arguments.nan_fraction,
+		"columns":           arguments.columns,
+		"seed":              arguments.seed,
+		"engine":            arguments.engine,
+	}
+	target, data = road_network(
+		roads=arguments.roads,
+		segments_per_road=arguments.segments_per_road,
+		data_ratio=arguments.data_ratio,
+		overlap_density=arguments.overlap_density,
+		nan_fraction=arguments.nan_fraction,
+		columns=arguments.columns,
+		seed=arguments.seed,
+	)
+	print(f"target rows: {len(target):,}  data rows: {len(data):,}")
+	
+	results = {}
+	for aggregation_type in merge.AggregationType:
+		column_name = "category" if aggregation_type == merge.AggregationType.KeepLongest else "value_0"
+		column_actions = [merge.Action(column_name, aggregation_for(aggregation_type), rename="result")]
+		results[aggregation_type.name] = measure(target, data, column_actions, arguments.engine, arguments.repeat)
+	
+	# every numeric column at once shows how the cost grows with the number of actions
+	results["AllColumnsLengthWeightedAverage"] = measure(
+		target,
+		data,
+		[merge.Action(f"value_{column_index}", merge.Aggregation.LengthWeightedAverage(), rename=f"result_{column_index}") for column_index in range(arguments.columns)],
+		arguments.engine,
+		arguments.repeat
+	)
+	
+	previous = previous_result(arguments.output, parameters)
+	regressions = []
+	print(f"{'aggregation':<32}{'seconds':>10}{'peak MiB':>10}{'vs previous':>13}")
+	for name, result in results.items():
+		comparison = ""
+		if previous is not None and name in previous["results"]:
+			ratio = result["seconds"] / previous["results"][name]["seconds"]
+			comparison = f"{ratio:>12.2f}x"
+			if ratio > arguments.threshold:
+				comparison += " SLOWER"
+				regressions.append(name)
+		print(f"{name:<32}{result['seconds']:>10.3f}{result['peak_bytes'] / 2**20:>10.1f}{comparison}")
+	
+	os.makedirs(arguments.output, exist_ok=True)
+	created = datetime.datetime.now()
+	with open(os.path.join(arguments.output, f"{created:%Y%m%dT%H%M%S}.json"), "w") as file:
+		json.dump({
+			"created":    created.isoformat(),
+			"parameters": parameters,
+			"versions": {
+				"python": platform.python_version(),
+				"numpy":  np.__version__,
+				"pandas": pd.__version__,
+			},
+			"results":    results,
+		}, file, indent=4)
+	
+	if len(regressions) > 0:
+		print(f"Slower than the previous result by more than {arguments.threshold}x: {', '.join(regressions)}")
+		return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,71 @@
+"""Reproducible synthetic road networks for benchmarking merges."""
+from typing import Tuple, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def road_network(
+		roads: int = 100,
+		segments_per_road: int = 200,
+		data_ratio: float = 3.0,
+		overlap_density: float = 0.0,
+		nan_fraction: float = 0.05,
+		columns: int = 1,
+		carriageways: Sequence[str] = ("L", "R"),
+		seed: int = 0
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+	"""
+	Generate a `(target, data)` pair of DataFrames describing the same synthetic road network.
+	
+	Both frames have the columns `road_no`, `carriageway`, `slk_from` and `slk_to` with integer SLKs in metres.
+	Each road and carriageway of `target` is split into `segments_per_road` contiguous segments. `data` covers the
+	same length with about `data_ratio` times as many segments, and has `columns` numeric columns named `value_0`,
+	`value_1`... plus a categorical column named `category`.
+	
+	`overlap_density` is the fraction of data rows extended past the start of the next data row. `nan_fraction` is
+	the fraction of blank values in each data column. The same parameters and `seed` always give the same frames.
+	"""
+	rng = np.random.default_rng(seed)
+	
+	target_parts = []
+	data_parts = []
+	for road_index in range(roads):
+		road_no = f"H{road_index:03d}"
+		for carriageway in carriageways:
+			segment_length = rng.integers(50, 500, size=segments_per_road)
+			target_to = np.cumsum(segment_length)
+			target_parts.append(pd.DataFrame({
+				"road_no":     road_no,
+				"carriageway": carriageway,
+				"slk_from":    target_to - segment_length,
+				"slk_to":      target_to,
+			}))
+			
+			road_length = int(target_to[-1])
+			data_rows = max(int(round(segments_per_road * data_ratio)), 1)
+			breaks = np.unique(np.concatenate(([0, road_length], rng.integers(1, road_length, size=data_rows - 1))))
+			data_from = breaks[:-1]
+			data_to   = breaks[1:].copy()
+			is_overlapping = rng.random(len(data_to)) < overlap_density
+			data_to[is_overlapping] += rng.integers(1, 100, size=is_overlapping.sum())
+			data_parts.append(pd.DataFrame({
+				"road_no":     road_no,
+				"carriageway": carriageway,
+				"slk_from":    data_from,
+				"slk_to":      data_to,
+			}))
+	
+	target = pd.concat(target_parts, ignore_index=True)
+	data = pd.concat(data_parts, ignore_index=True)
+	
+	for column_index in range(columns):
+		values = rng.normal(100, 25, size=len(data)).round(1)
+		values[rng.random(len(data)) < nan_fraction] = np.nan
+		data[f"value_{column_index}"] = values
+	
+	category = rng.choice(np.array(["AC", "CS", "PS", "SS", "BR"], dtype=object), size=len(data))
+	category[rng.random(len(data)) < nan_fraction] = None
+	data["category"] = category
+	
+	return target, data
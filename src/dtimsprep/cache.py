@@ -0,0 +1,82 @@
+import importlib.util
+import os
+import tempfile
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+class MergeCache:
+	def __init__(self, directory: str, max_bytes: int = 2**30):
+		"""
+		Pass an instance to the `cache` parameter of `merge.on_slk_intervals()` to keep merge results in `directory`,
+		so that repeating a merge with identical inputs reads the result back instead of merging again.
+
+		Results are stored as Parquet files, which requires the optional `pyarrow` package. When the files in
+		`directory` grow beyond `max_bytes` the least recently used results are deleted.
+		"""
+		if importlib.util.find_spec("pyarrow") is None:
+			raise Exception("`MergeCache` stores results as Parquet files, which requires the `pyarrow` package. Please install it with `pip install pyarrow`.")
+		if max_bytes < 0:
+			raise Exception(f"Parameter `max_bytes` must not be negative. Got {max_bytes}.")
+		self.directory: str = str(directory)
+		self.max_bytes: int = max_bytes
+		os.makedirs(self.directory, exist_ok=True)
+
+	def _path(self, key: str) -> str:
+		return os.path.join(self.directory, f"{key}.parquet")
+
+	@staticmethod
+	def _touch(path: str):
+		# the modification time records when each result was last used. It is set explicitly because the file system
+		# clock may be too coarse to order operations that happen close together.
+		now = time.time_ns()
+		os.utime(path, ns=(now, now))
+
+	def get(self, key: str) -> Optional[pd.DataFrame]:
+		"""Return the stored result for `key`, or None if there is none"""
+		path = self._path(key)
+		try:
+			result = pd.read_parquet(path)
+		except FileNotFoundError:
+			return None
+		self._touch(path)
+		# Parquet reads blanks in object columns back as None
+		for column_name in result.columns[result.dtypes == object]:
+			result[column_name] = result[column_name].where(result[column_name].notna(), np.nan)
+		return result
+
+	def put(self, key: str, result: pd.DataFrame):
+		"""Store `result` under `key`, then evict the least recently used results until the cache fits in `max_bytes`"""
+		file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+		os.close(file_descriptor)
+		try:
+			result.to_parquet(temporary_path, index=False)
+		except (ValueError, TypeError):
+			# some results can't be written to Parquet, for example when a column holds values of mixed types.
+			# These are not cached.
+			os.remove(temporary_path)
+			return
+		os.replace(temporary_path, self._path(key))
+		self._touch(self._path(key))
+		self.evict()
+
+	def evict(self):
+		entries = []
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith(".parquet"):
+				stat = entry.stat()
+				entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+		total_bytes = sum(size for _, size, _ in entries)
+		for _, size, path in sorted(entries):
+			if total_bytes <= self.max_bytes:
+				break
+			os.remove(path)
+			total_bytes -= size
+
+	def clear(self):
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith(".parquet"):
+				os.remove(entry.path)
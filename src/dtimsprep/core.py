@@ -0,0 +1,618 @@
+"""
+The pandas-free core of the merge. Everything here works on plain NumPy arrays, so process pool workers and pipelines
+that don't use pandas can import this module without paying for the pandas import. `dtimsprep.merge` builds on it and
+re-exports `Aggregation`, `Action` and `on_slk_interval_arrays()`.
+"""
+import concurrent.futures
+import os
+from enum import Enum
+from typing import Optional, List, Tuple, Dict, Union, Mapping
+
+import numpy as np
+
+from dtimsprep.profiling import NO_PROFILE
+
+
+class AggregationType(Enum):
+	KeepLongestSegment = 1  # Deprecated
+	KeepLongest = 2
+	Average = 3
+	LengthWeightedAverage = 4
+	LengthWeightedPercentile = 5
+	First = 6
+	ProportionalSum = 7
+	Sum = 8
+	IndexOfMax = 9
+	Count = 10
+	Max = 11
+
+
+class Aggregation:
+	
+	def __init__(self, aggregation_type: AggregationType, percentile: Optional[float] = None, percentiles: Optional[List[float]] = None):
+		"""Don't use initialise this class directly, please use one of the static factory functions above"""
+		self.type: AggregationType = aggregation_type
+		self.percentile: Optional[float] = percentile
+		self.percentiles: Optional[List[float]] = percentiles
+		pass
+	
+	@staticmethod
+	def First():
+		return Aggregation(AggregationType.First)
+	
+	@staticmethod
+	def KeepLongestSegment():
+		print("WARNING KeepLongestSegment is deprecated please do not use this function. it is kept here for testing but is to be removed in future versions.")
+		return Aggregation(AggregationType.KeepLongestSegment)
+	
+	@staticmethod
+	def KeepLongest():
+		return Aggregation(AggregationType.KeepLongest)
+	
+	@staticmethod
+	def LengthWeightedAverage():
+		return Aggregation(AggregationType.LengthWeightedAverage)
+	
+	@staticmethod
+	def Average():
+		return Aggregation(AggregationType.Average)
+	
+	@staticmethod
+	def LengthWeightedPercentile(percentile: float):
+		if percentile > 1.0 or percentile < 0.0:
+			raise ValueError(
+				f"Percentile out of range. Must be greater than 0.0 and less than 1.0. Got {percentile}." +
+				(" Do you need to divide by 100?" if percentile > 1.0 else "")
+			)
+		return Aggregation(
+			AggregationType.LengthWeightedPercentile,
+			percentile=percentile
+		)
+	
+	@staticmethod
+	def LengthWeightedPercentiles(percentiles: List[float]):
+		"""Several length weighted percentiles of the same column, each in its own output column. The values are only sorted once for all of them."""
+		if len(percentiles) == 0:
+			raise ValueError("At least one percentile is required.")
+		for percentile in percentiles:
+			Aggregation.LengthWeightedPercentile(percentile)
+		return Aggregation(
+			AggregationType.LengthWeightedPercentile,
+			percentiles=list(percentiles)
+		)
+	
+	@staticmethod
+	def ProportionalSum():
+		"""This is the sum of values overlapping the target segment; The value of each segment is multiplied by the proportion of that segment overlapping the target segment."""
+		return Aggregation(AggregationType.ProportionalSum)
+
+	@staticmethod
+	def Sum():
+		"""This is the sum of values touching the target. Even if only part of the value is overlapping the target segment, the entire data value will be added to the sum"""
+		return Aggregation(AggregationType.Sum)
+
+	@staticmethod
+	def IndexOfMax():
+		"""This is the row label of the maximum value detected in the data"""
+		return Aggregation(AggregationType.IndexOfMax)
+
+	@staticmethod
+	def Count():
+		"""This is the number of non-blank values touching the target"""
+		return Aggregation(AggregationType.Count)
+
+	@staticmethod
+	def Max():
+		"""This is the maximum value touching the target"""
+		return Aggregation(AggregationType.Max)
+
+	# @staticmethod
+	# def SumLengthWeightedAveragePerCategory(category_column_name:str):
+	# 	"""For the set of data matching a target row, get the length weighted average for each category, then sum the results."""
+	# 	return Aggregation(AggregationType.IndexOfMax)
+
+class Action:
+	def __init__(
+			self,
+			column_name: str,
+			aggregation: Aggregation,
+			rename: Optional[Union[str, List[str]]] = None
+	):
+		"""
+		When `aggregation` is `Aggregation.LengthWeightedPercentiles()`, `rename` may be a list with one name per
+		percentile. Otherwise the output columns are named `{rename}_p{percent}`, for example `width_p75`.
+		"""
+		self.column_name: str = column_name
+		self.rename = rename if rename is not None else self.column_name
+		self.aggregation: Aggregation = aggregation
+
+
+ArrayTable = Union[Mapping[str, np.ndarray], np.ndarray]
+
+
+def on_slk_interval_arrays(
+		target: ArrayTable,
+		data: ArrayTable,
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str],
+		threads: int = 1
+) -> Dict[str, np.ndarray]:
+	"""
+	The same merge as `merge.on_slk_intervals()`, but `target` and `data` are dictionaries of equal length 1-D arrays
+	(or NumPy structured arrays) and the result is a dictionary of arrays, one for each output column, with one value
+	per target row. Rows that overlap no data are NaN.
+	
+	Arrays have no row labels, so `IndexOfMax` returns the position of the data row, and `First` takes data rows in
+	order of position. pandas is only imported if a column or `join_left` key has `object` dtype, to recognise blank
+	values in it.
+	"""
+	if not isinstance(join_left, list):
+		raise Exception("Parameter `join_left` must be a list literal.")
+	if threads < 1:
+		raise Exception(f"Parameter `threads` must be at least 1. Got {threads}.")
+	
+	column_actions = _expand_actions(column_actions)
+	target_names = _array_table_names(target)
+	data_names = _array_table_names(data)
+	missing_columns = (
+		[f"Column '{column_name}' is missing from `target`." for column_name in [*join_left, *from_to] if column_name not in target_names] +
+		[f"Column '{column_name}' is missing from `data`." for column_name in [*join_left, *from_to, *(column_action.column_name for column_action in column_actions)] if column_name not in data_names]
+	)
+	if len(missing_columns) > 0:
+		raise Exception("\n".join(dict.fromkeys(missing_columns)))
+	
+	slk_from, slk_to = from_to
+	target_from = np.asarray(target[slk_from])
+	target_to   = np.asarray(target[slk_to])
+	target_rows = len(target_from)
+	
+	# sort the data by group, keeping the rows of each group in order of position
+	target_keys, data_keys = _array_join_keys(target, data, join_left, target_rows, len(data[slk_from]))
+	data_order = np.argsort(data_keys, kind="stable")
+	data_keys = data_keys[data_order]
+	group_table = _array_group_table(target_keys, data_keys)
+	
+	data_from = np.asarray(data[slk_from])[data_order]
+	data_to   = np.asarray(data[slk_to])[data_order]
+	column_values = [np.asarray(data[column_action.column_name])[data_order] for column_action in column_actions]
+	
+	target_positions, data_positions = _overlap_pair_table(target_from, target_to, data_from, data_to, *group_table)
+	result_targets, column_results = _aggregate_pairs(
+		target_positions,
+		data_positions,
+		target_from,
+		target_to,
+		data_from,
+		data_to,
+		column_values,
+		column_actions,
+		threads=threads
+	)
+	
+	result = {}
+	for column_action, (run_target, run_result) in zip(column_actions, column_results):
+		if column_action.aggregation.type == AggregationType.IndexOfMax:
+			run_result = data_order[run_result]
+		if len(run_target) == target_rows and len(result_targets) > 0:
+			result[column_action.rename] = run_result
+		else:
+			result_column = np.full(target_rows, np.nan, dtype=float if run_result.dtype.kind in "iuf" else object)
+			result_column[run_target] = run_result
+			result[column_action.rename] = result_column
+	return result
+
+
+def _array_table_names(table: ArrayTable) -> List[str]:
+	if isinstance(table, np.ndarray):
+		if table.dtype.names is None:
+			raise Exception("Arrays passed to `on_slk_interval_arrays()` must be structured arrays with named fields, or dictionaries of arrays.")
+		return list(table.dtype.names)
+	return list(table.keys())
+
+
+def _array_join_keys(target: ArrayTable, data: ArrayTable, join_left: List[str], target_rows: int, data_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Give each distinct combination of `join_left` values one integer key, shared by `target` and `data`. Rows with a
+	blank key are given the key -1 so that they match nothing.
+	"""
+	keys = np.zeros(target_rows + data_rows, dtype=np.int64)
+	is_blank = np.zeros(target_rows + data_rows, dtype=bool)
+	key_count = 1
+	for column_name in join_left:
+		codes, uniques = _factorize(np.concatenate([np.asarray(target[column_name]), np.asarray(data[column_name])]))
+		if key_count * max(len(uniques), 1) >= 2**62:
+			# renumber the keys seen so far so that the combined key can't overflow
+			_, keys = np.unique(keys, return_inverse=True)
+			keys = keys.reshape(-1).astype(np.int64)
+			key_count = int(keys.max()) + 1
+		# the keys are combined mixed-radix, so they order like the tuple of sorted codes
+		keys = keys * max(len(uniques), 1) + codes
+		key_count *= max(len(uniques), 1)
+		is_blank |= codes == -1
+	keys[is_blank] = -1
+	return keys[:target_rows], keys[target_rows:]
+
+
+def _array_group_table(target_keys: np.ndarray, sorted_data_keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+	"""The group table (see `merge._group_table()`) of target rows against data sorted by key"""
+	target_order = np.argsort(target_keys, kind="stable")
+	target_order = target_order[target_keys[target_order] != -1]
+	sorted_target_keys = target_keys[target_order]
+	group_keys = np.unique(sorted_target_keys)
+	return (
+		target_order.astype(np.intp),
+		np.append(np.searchsorted(sorted_target_keys, group_keys), len(target_order)).astype(np.intp),
+		np.searchsorted(sorted_data_keys, group_keys, side="left").astype(np.intp),
+		np.searchsorted(sorted_data_keys, group_keys, side="right").astype(np.intp),
+	)
+
+
+def _expand_actions(column_actions: List[Action]) -> List[Action]:
+	"""Replace each `LengthWeightedPercentiles()` action with one `LengthWeightedPercentile()` action per output column"""
+	expanded_actions = []
+	for column_action in column_actions:
+		percentiles = column_action.aggregation.percentiles
+		if percentiles is None:
+			expanded_actions.append(column_action)
+			continue
+		if isinstance(column_action.rename, list):
+			if len(column_action.rename) != len(percentiles):
+				raise Exception(f"The `rename` list for column '{column_action.column_name}' has {len(column_action.rename)} names but {len(percentiles)} percentiles were requested.")
+			renames = column_action.rename
+		else:
+			renames = [f"{column_action.rename}_p{percentile * 100:g}" for percentile in percentiles]
+		expanded_actions.extend(
+			Action(column_action.column_name, Aggregation.LengthWeightedPercentile(percentile), rename)
+			for percentile, rename in zip(percentiles, renames)
+		)
+	return expanded_actions
+
+
+def _overlap_pair_table(
+		target_from: np.ndarray,
+		target_to: np.ndarray,
+		data_from: np.ndarray,
+		data_to: np.ndarray,
+		target_order: np.ndarray,
+		target_offsets: np.ndarray,
+		data_starts: np.ndarray,
+		data_stops: np.ndarray,
+		groups: Optional[np.ndarray] = None,
+		profile=NO_PROFILE
+) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Build one flat table of every overlapping (target position, data position) pair for the listed `groups` of the
+	group table (see `_group_table`), or for every group if `groups` is None.
+	
+	The table is sorted by target position, then by data position.
+	"""
+	if groups is None:
+		groups = np.arange(len(data_starts))
+	
+	target_position_parts = []
+	data_position_parts = []
+	for group in groups:
+		group_started = profile.clock()
+		target_group_positions = target_order[target_offsets[group]:target_offsets[group + 1]]
+		if data_starts[group] == data_stops[group]:
+			profile.group_finished(group, len(target_group_positions), 0, 0, group_started)
+			continue
+		data_start = data_starts[group]
+		data_stop  = data_stops[group]
+		group_target_positions, group_data_positions = _sweep_overlaps(
+			target_from[target_group_positions],
+			target_to[target_group_positions],
+			data_from[data_start:data_stop],
+			data_to[data_start:data_stop],
+		)
+		target_position_parts.append(target_group_positions[group_target_positions])
+		data_position_parts.append(group_data_positions + data_start)
+		profile.group_finished(group, len(target_group_positions), data_stop - data_start, len(group_data_positions), group_started)
+	
+	if len(target_position_parts) == 0:
+		return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+	
+	target_positions = np.concatenate(target_position_parts)
+	data_positions   = np.concatenate(data_position_parts)
+	pair_order = np.lexsort((data_positions, target_positions))
+	return target_positions[pair_order], data_positions[pair_order]
+
+
+def _merge_shard(array_directory: str, groups: np.ndarray, column_actions: List[Action]) -> Tuple[np.ndarray, list]:
+	"""Process pool worker for `_merge_in_process_pool`; merges the listed groups using memory-mapped arrays."""
+	def load(name):
+		return np.load(os.path.join(array_directory, f"{name}.npy"), mmap_mode="r")
+	
+	target_from = load("target_from")
+	target_to   = load("target_to")
+	data_from   = load("data_from")
+	data_to     = load("data_to")
+	target_positions, data_positions = _overlap_pair_table(
+		target_from,
+		target_to,
+		data_from,
+		data_to,
+		load("target_order"),
+		load("target_offsets"),
+		load("data_starts"),
+		load("data_stops"),
+		groups
+	)
+	return _aggregate_pairs(
+		target_positions,
+		data_positions,
+		target_from,
+		target_to,
+		data_from,
+		data_to,
+		[load(f"column_{column_action_index}") for column_action_index in range(len(column_actions))],
+		column_actions
+	)
+
+
+def _aggregate_pairs(
+		target_positions: np.ndarray,
+		data_positions: np.ndarray,
+		target_from: np.ndarray,
+		target_to: np.ndarray,
+		data_from: np.ndarray,
+		data_to: np.ndarray,
+		column_values: List[np.ndarray],
+		column_actions: List[Action],
+		profile=NO_PROFILE,
+		column_codes: Optional[List[Optional[Tuple[np.ndarray, np.ndarray]]]] = None,
+		threads: int = 1
+) -> Tuple[np.ndarray, list]:
+	"""
+	Reduce the overlapping pairs of each target row down to one value per column action.
+	
+	Every aggregation is computed as a grouped reduction over runs of pairs sharing the same target position.
+	`column_codes` may hold the `PreparedData.factorized_column()` of each KeepLongest action, otherwise the column is
+	factorized here. When `threads` is greater than 1 the actions are evaluated concurrently on a thread pool. The
+	threads share the pair table, but each allocates its own temporary arrays, so peak memory grows with `threads`.
+	
+	Returns `(result_targets, column_results)`. `result_targets` lists every target position that overlaps any data;
+	these are the rows that the reference engine produces. `column_results` holds a `(run_targets, results)` pair of
+	arrays for each column action, leaving out targets where every overlapping value was NaN. IndexOfMax results are
+	data positions rather than data labels.
+	"""
+	result_targets = np.unique(target_positions)
+	
+	overlap_len = (
+		np.minimum(data_to[data_positions],   target_to[target_positions]) -
+		np.maximum(data_from[data_positions], target_from[target_positions])
+	)
+	
+	column_results = [None] * len(column_actions)
+	
+	def aggregate_columns(column_action_indexes: List[int]):
+		percentile_tables = {}
+		for column_action_index in column_action_indexes:
+			column_action = column_actions[column_action_index]
+			values = column_values[column_action_index]
+			column_started = profile.clock()
+			
+			# drop NaN data and zero length overlaps
+			is_valid = ~_isna(values[data_positions]) & (overlap_len > 0)
+			pair_target = target_positions[is_valid]
+			pair_data   = data_positions[is_valid]
+			pair_len    = overlap_len[is_valid]
+			pair_value  = values[pair_data]
+			
+			if len(pair_target) == 0:
+				column_results[column_action_index] = (pair_target, pair_data if column_action.aggregation.type == AggregationType.IndexOfMax else pair_value)
+				continue
+			
+			# pairs are sorted by target, so each target is one run of pairs
+			run_start = np.flatnonzero(np.diff(pair_target, prepend=-1))
+			run_target = pair_target[run_start]
+			aggregation_type = column_action.aggregation.type
+			if aggregation_type   == AggregationType.Average:
+				result = np.add.reduceat(pair_value, run_start) / np.diff(np.append(run_start, len(pair_value)))
+			
+			elif aggregation_type == AggregationType.First:
+				result = pair_value[run_start]
+			
+			elif aggregation_type == AggregationType.LengthWeightedAverage:
+				result = np.add.reduceat(pair_value * pair_len, run_start) / np.add.reduceat(pair_len, run_start)
+			
+			elif aggregation_type == AggregationType.KeepLongestSegment:
+				result = pair_value[_first_max_of_runs(pair_len, run_start)]
+			
+			elif aggregation_type == AggregationType.KeepLongest:
+				# total the overlap length of each distinct value within each target, then keep the longest total.
+				# codes are assigned in sorted order so that ties resolve to the smallest value
+				if column_codes is not None and column_codes[column_action_index] is not None:
+					codes, uniques = column_codes[column_action_index]
+				else:
+					codes, uniques = _factorize(values)
+				
+				# a single integer key orders the pairs by target, then by code
+				pair_key = pair_target.astype(np.int64) * len(uniques) + codes[pair_data]
+				pair_order = np.argsort(pair_key, kind="stable")
+				sorted_key = pair_key[pair_order]
+				value_run_start = np.flatnonzero(np.diff(sorted_key, prepend=-1))
+				value_run_target, value_run_code = np.divmod(sorted_key[value_run_start], len(uniques))
+				value_run_len = np.add.reduceat(pair_len[pair_order], value_run_start)
+				result = uniques[value_run_code[_first_max_of_runs(
+					value_run_len,
+					np.flatnonzero(np.diff(value_run_target, prepend=-1))
+				)]]
+			
+			elif aggregation_type == AggregationType.LengthWeightedPercentile:
+				# every percentile of the same column shares one sort and one set of x coordinates
+				if column_action.column_name not in percentile_tables:
+					percentile_tables[column_action.column_name] = _percentile_table(pair_value, pair_len, pair_target, run_start)
+				result = _interpolate_percentile(*percentile_tables[column_action.column_name], run_start, column_action.aggregation.percentile)
+			
+			elif aggregation_type == AggregationType.ProportionalSum:
+				result = np.add.reduceat(
+					pair_value * pair_len / (data_to[pair_data] - data_from[pair_data]),
+					run_start
+				)
+			
+			elif aggregation_type == AggregationType.Sum:
+				result = np.add.reduceat(pair_value, run_start)
+			
+			elif aggregation_type == AggregationType.IndexOfMax:
+				result = pair_data[_first_max_of_runs(pair_value, run_start)]
+			
+			elif aggregation_type == AggregationType.Count:
+				result = np.diff(np.append(run_start, len(pair_value)))
+			
+			elif aggregation_type == AggregationType.Max:
+				result = np.maximum.reduceat(pair_value, run_start)
+			
+			column_results[column_action_index] = (run_target, result)
+			profile.aggregation_finished(aggregation_type.name, len(pair_target), column_started)
+	
+	# the actions are independent, except that percentiles of the same column share one sort, so are kept together
+	tasks = {}
+	for column_action_index, column_action in enumerate(column_actions):
+		if column_action.aggregation.type == AggregationType.LengthWeightedPercentile:
+			tasks.setdefault(("percentile", column_action.column_name), []).append(column_action_index)
+		else:
+			tasks[column_action_index] = [column_action_index]
+	
+	if threads > 1 and len(tasks) > 1:
+		# numpy releases the GIL inside most of these reductions. The overlap arrays are shared, not copied.
+		with concurrent.futures.ThreadPoolExecutor(min(threads, len(tasks))) as executor:
+			for future in [executor.submit(aggregate_columns, column_action_indexes) for column_action_indexes in tasks.values()]:
+				future.result()
+	else:
+		for column_action_indexes in tasks.values():
+			aggregate_columns(column_action_indexes)
+	
+	return result_targets, column_results
+
+
+def _isna(values: np.ndarray) -> np.ndarray:
+	"""Like `pandas.isna()` for a 1-D array. pandas is only imported for `object` arrays, which may hold any of its blank values."""
+	if values.dtype.kind in "fc":
+		return np.isnan(values)
+	if values.dtype.kind in "mM":
+		return np.isnat(values)
+	if values.dtype.kind == "O":
+		import pandas
+		return pandas.isna(values)
+	return np.zeros(len(values), dtype=bool)
+
+
+def _factorize(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+	"""Like `pandas.factorize(values, sort=True)`; integer codes assigned in sorted order of the values, with -1 for blanks"""
+	if values.dtype.kind == "O":
+		import pandas
+		codes, uniques = pandas.factorize(values, sort=True)
+		return codes, np.asarray(uniques)
+	is_blank = _isna(values)
+	uniques, valid_codes = np.unique(values[~is_blank], return_inverse=True)
+	codes = np.full(len(values), -1, dtype=np.intp)
+	codes[~is_blank] = valid_codes.reshape(-1)
+	return codes, uniques
+
+
+def _percentile_table(pair_value: np.ndarray, pair_len: np.ndarray, pair_target: np.ndarray, run_start: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Sort the pairs of each target run by value, and give each pair an x coordinate running from 0 to 1 within its run.
+	The x coordinate of a pair is the cumulative mean length of each neighbouring pair of pairs, as in the reference engine.
+	"""
+	pair_order = np.lexsort((pair_value.astype(float), pair_target))
+	sorted_value = pair_value[pair_order].astype(float)
+	sorted_len   = pair_len[pair_order]
+	run_length = np.diff(np.append(run_start, len(pair_value)))
+	
+	x_step = np.empty(len(sorted_len))
+	x_step[0] = 0
+	x_step[1:] = (sorted_len[:-1] + sorted_len[1:]) / 2
+	x_step[run_start] = 0
+	x_coords = np.cumsum(x_step)
+	x_coords -= np.repeat(x_coords[run_start], run_length)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		x_coords /= np.repeat(x_coords[run_start + run_length - 1], run_length)
+	return sorted_value, x_coords
+
+
+def _interpolate_percentile(sorted_value: np.ndarray, x_coords: np.ndarray, run_start: np.ndarray, percentile: float) -> np.ndarray:
+	"""Evaluate `np.interp(percentile, x_coords, sorted_value)` separately for every run, without a loop over runs"""
+	run_last = np.append(run_start[1:], len(x_coords)) - 1
+	
+	# within each run the x coordinates increase, so counting those at or below the percentile locates its interval
+	lower = np.minimum(run_start + np.maximum(np.add.reduceat(x_coords <= percentile, run_start) - 1, 0), run_last)
+	upper = np.minimum(lower + 1, run_last)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		slope = (sorted_value[upper] - sorted_value[lower]) / (x_coords[upper] - x_coords[lower])
+		result = slope * (percentile - x_coords[lower]) + sorted_value[lower]
+	return np.where((lower == run_last) | (x_coords[lower] == percentile), sorted_value[lower], result)
+
+
+def _first_max_of_runs(values: np.ndarray, run_start: np.ndarray) -> np.ndarray:
+	"""Return the position of the first maximum value in each run of `values`"""
+	run_length = np.diff(np.append(run_start, len(values)))
+	is_run_max = values == np.repeat(np.maximum.reduceat(values, run_start), run_length)
+	return np.minimum.reduceat(np.where(is_run_max, np.arange(len(values)), len(values)), run_start)
+
+
+def _sweep_overlaps(target_from: np.ndarray, target_to: np.ndarray, data_from: np.ndarray, data_to: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Find every (target, data) pair where `data_from < target_to` and `data_to > target_from`.
+	
+	The data rows are split into classes of similar length (a power of two apart), and each class is swept separately
+	by `_sweep_candidates()`. Within a class no row is much longer than the others, so one very long row cannot make
+	every later row a candidate for every target, and the number of candidates stays close to the number of overlaps.
+	
+	Returns a pair of position arrays sorted by target position, then by data position; this is the same order that
+	the reference engine visits the data in.
+	"""
+	with np.errstate(invalid="ignore"):
+		data_length = np.asarray(data_to - data_from, dtype=float)
+	_, length_class = np.frexp(data_length)
+	# blank and infinite lengths get a class of their own
+	length_class[~np.isfinite(data_length)] = np.iinfo(length_class.dtype).max
+	
+	class_order = np.argsort(length_class, kind="stable")
+	class_start = np.flatnonzero(np.diff(length_class[class_order], prepend=length_class[class_order[:1]] - 1) != 0)
+	target_parts = []
+	data_parts = []
+	for class_positions in np.split(class_order, class_start[1:]):
+		class_target, class_data = _sweep_candidates(target_from, target_to, data_from[class_positions], data_to[class_positions])
+		target_parts.append(class_target)
+		data_parts.append(class_positions[class_data])
+	
+	if len(target_parts) == 0:
+		return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+	candidate_target = np.concatenate(target_parts)
+	candidate_data   = np.concatenate(data_parts)
+	pair_order = np.lexsort((candidate_data, candidate_target))
+	return candidate_target[pair_order], candidate_data[pair_order]
+
+
+def _sweep_candidates(target_from: np.ndarray, target_to: np.ndarray, data_from: np.ndarray, data_to: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	The overlapping (target, data) pairs of `_sweep_overlaps()`, in no particular order.
+	
+	Data is sorted by `from` once, and a running maximum of `to` is kept along that order. Every data row before
+	`start` ends at or before the target begins, and every data row from `stop` onward begins at or after the target
+	ends, so only the rows in between need to be tested. For well-formed (non-overlapping) data every row in between
+	overlaps the target.
+	"""
+	data_order = np.argsort(data_from, kind="stable")
+	data_from_sorted = data_from[data_order]
+	data_to_reach = np.maximum.accumulate(data_to[data_order])
+	
+	start = np.searchsorted(data_to_reach, target_from, side="right")
+	stop  = np.searchsorted(data_from_sorted, target_to, side="left")
+	
+	candidate_count = np.maximum(stop - start, 0)
+	candidate_target = np.repeat(np.arange(len(target_from)), candidate_count)
+	candidate_data = data_order[
+		np.arange(candidate_count.sum())
+		- np.repeat(np.cumsum(candidate_count) - candidate_count, candidate_count)
+		+ np.repeat(start, candidate_count)
+	]
+	
+	is_overlapping = (
+		(data_from[candidate_data] < target_to[candidate_target]) &
+		(data_to[candidate_data] > target_from[candidate_target])
+	)
+	return candidate_target[is_overlapping], candidate_data[is_overlapping]
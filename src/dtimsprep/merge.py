@@ -1,102 +1,1111 @@
-from enum import Enum
-from typing import Optional, List, Tuple
+import ast
+import concurrent.futures
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Optional, List, Tuple, Dict, Union, Iterator
 
 import numpy as np
 import pandas
 import pandas as pd
 
+from dtimsprep.cache import MergeCache
+from dtimsprep.core import (
+	AggregationType,
+	Aggregation,
+	Action,
+	on_slk_interval_arrays,
+	_expand_actions,
+	_overlap_pair_table,
+	_merge_shard,
+	_aggregate_pairs,
+	_array_join_keys,
+	_first_max_of_runs,
+	_isna,
+)
+from dtimsprep.profiling import MergeProfile, MergeProgress, NO_PROFILE
 
-class AggregationType(Enum):
-	KeepLongestSegment = 1  # Deprecated
-	KeepLongest = 2
-	Average = 3
-	LengthWeightedAverage = 4
-	LengthWeightedPercentile = 5
-	First = 6
-	ProportionalSum = 7
-	Sum = 8
-	IndexOfMax = 9
 
-
-class Aggregation:
+class PreparedData:
+	def __init__(
+			self,
+			data: pd.DataFrame,
+			join_left: List[str],
+			from_to: Tuple[str, str],
+			columns: List[str],
+			group_offsets: np.ndarray,
+			group_key_codes: np.ndarray
+	):
+		"""Don't initialise this class directly, please use `merge.prepare()`"""
+		self.data: pd.DataFrame = data
+		self.join_left: List[str] = join_left
+		self.from_to: Tuple[str, str] = from_to
+		self.columns: List[str] = columns
+		# the rows of group `g` are `group_offsets[g]:group_offsets[g+1]`, and `group_key_codes[g]` holds the code of
+		# its value in each `join_left` level of the data index
+		self.group_offsets: np.ndarray = group_offsets
+		self.group_key_codes: np.ndarray = group_key_codes
+		self.has_disjoint_groups: Optional[bool] = None
+		self.prefix_sum_indexes: Dict[str, _PrefixSumIndex] = {}
+		self.factorized_columns: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
 	
-	def __init__(self, aggregation_type: AggregationType, percentile: Optional[float] = None):
-		"""Don't use initialise this class directly, please use one of the static factory functions above"""
-		self.type: AggregationType = aggregation_type
-		self.percentile: Optional[float] = percentile
-		pass
+	def prefix_sum_index(self, column_name: str) -> "_PrefixSumIndex":
+		"""Build the prefix sum index of a column the first time it is needed, and keep it for later merges"""
+		if column_name not in self.prefix_sum_indexes:
+			slk_from, slk_to = self.from_to
+			self.prefix_sum_indexes[column_name] = _PrefixSumIndex(
+				self.data[slk_from].to_numpy(),
+				self.data[slk_to].to_numpy(),
+				self.data[column_name].to_numpy(),
+				self.group_offsets
+			)
+		return self.prefix_sum_indexes[column_name]
 	
-	@staticmethod
-	def First():
-		return Aggregation(AggregationType.First)
+	def factorized_column(self, column_name: str) -> Tuple[np.ndarray, np.ndarray]:
+		"""
+		Integer codes of a column, assigned in sorted order of the values, and the value of each code. Blank values are
+		given the code -1. Computed the first time it is needed and kept for later merges.
+		"""
+		if column_name not in self.factorized_columns:
+			codes, uniques = pd.factorize(self.data[column_name].to_numpy(), sort=True)
+			self.factorized_columns[column_name] = (codes, np.asarray(uniques))
+		return self.factorized_columns[column_name]
 	
-	@staticmethod
-	def KeepLongestSegment():
-		print("WARNING KeepLongestSegment is deprecated please do not use this function. it is kept here for testing but is to be removed in future versions.")
-		return Aggregation(AggregationType.KeepLongestSegment)
+	def save(self, path: str):
+		"""Save to disk so that a later run can use `PreparedData.load()` instead of calling `merge.prepare()` again"""
+		with open(path, "wb") as file:
+			pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
 	
 	@staticmethod
-	def KeepLongest():
-		return Aggregation(AggregationType.KeepLongest)
+	def load(path: str) -> "PreparedData":
+		with open(path, "rb") as file:
+			prepared_data = pickle.load(file)
+		if not isinstance(prepared_data, PreparedData):
+			raise Exception(f"The file '{path}' does not contain `PreparedData`.")
+		return prepared_data
+
+
+def prepare(data: pd.DataFrame, join_left: List[str], from_to: Tuple[str, str], columns: Optional[List[str]] = None) -> PreparedData:
+	"""
+	Sort `data` and find the boundaries of every `join_left` group once, so that the result can be passed to
+	`on_slk_intervals()` in place of `data` for any number of merges.
+	`columns` lists the data columns that later merges may aggregate. All columns are kept if it is omitted.
+	"""
+	if not isinstance(join_left, list):
+		raise Exception("Parameter `join_left` must be a list literal. Tuples and other sequence types will lead to cryptic errors from pandas.")
 	
-	@staticmethod
-	def LengthWeightedAverage():
-		return Aggregation(AggregationType.LengthWeightedAverage)
+	if columns is None:
+		columns = [column_name for column_name in data.columns if column_name not in join_left and column_name not in from_to]
 	
-	@staticmethod
-	def Average():
-		return Aggregation(AggregationType.Average)
+	missing_columns = [column_name for column_name in join_left + list(from_to) + columns if column_name not in data.columns]
+	if len(missing_columns) > 0:
+		raise Exception(f"Cannot prepare data. Columns {missing_columns} are missing from `data`.")
 	
-	@staticmethod
-	def LengthWeightedPercentile(percentile: float):
-		if percentile > 1.0 or percentile < 0.0:
-			raise ValueError(
-				f"Percentile out of range. Must be greater than 0.0 and less than 1.0. Got {percentile}." +
-				(" Do you need to divide by 100?" if percentile > 1.0 else "")
+	# ReIndex data for faster O(N) lookup
+	data = data.loc[:, list(dict.fromkeys([*join_left, *from_to, *columns]))]
+	data = data.assign(data_id=data.index)
+	data = data.set_index([*join_left, 'data_id'])
+	data = data.sort_index()
+	
+	# the data is sorted, so each group is one contiguous slice. Find where the join_left levels change.
+	key_codes = np.column_stack([data.index.codes[level] for level in range(len(join_left))]).reshape(len(data), len(join_left))
+	group_starts = np.flatnonzero(np.any(np.diff(key_codes, axis=0, prepend=-2) != 0, axis=1))
+	group_offsets = np.append(group_starts, len(data)).astype(np.intp)
+	
+	return PreparedData(data, join_left, tuple(from_to), columns, group_offsets, key_codes[group_starts])
+
+
+class PreflightReport:
+	def __init__(self, issues: pd.DataFrame):
+		"""
+		Returned by `merge.preflight()`. `issues` has one row per problem found, with the columns
+		 - `frame`: `"target"` or `"data"`
+		 - `check`: the name of the check that failed, see `PREFLIGHT_CHECKS`
+		 - `severity`: `"error"` for problems that make the merge produce invalid output, otherwise `"warning"`
+		 - `row`: the index label of the offending row, or None when the problem concerns a whole column
+		 - `column`: the name of the offending column when the problem concerns a whole column, otherwise None
+		"""
+		self.issues: pd.DataFrame = issues
+	
+	@property
+	def ok(self) -> bool:
+		"""True when no errors were found. Warnings are allowed."""
+		return not (self.issues["severity"] == "error").any()
+	
+	def errors(self) -> pd.DataFrame:
+		return self.issues[self.issues["severity"] == "error"]
+	
+	def summary(self) -> pd.DataFrame:
+		"""The number of offending rows for each frame and check"""
+		return self.issues.groupby(["frame", "check", "severity"], sort=False).size().rename("rows").reset_index()
+	
+	def __repr__(self):
+		if len(self.issues) == 0:
+			return "PreflightReport(no issues)"
+		return f"PreflightReport(\n{self.summary().to_string(index=False)}\n)"
+
+
+# the name and severity of each check done by `preflight()`
+PREFLIGHT_CHECKS = {
+	"blank_chainage":           "error",
+	"reversed_interval":        "error",
+	"join_left_dtype_mismatch": "error",
+	"zero_length":              "warning",
+	"non_integer_slk":          "warning",
+	"overlapping_data":         "warning",
+}
+
+
+def preflight(
+		target: pd.DataFrame,
+		data: Union[pd.DataFrame, PreparedData],
+		join_left: List[str],
+		from_to: Tuple[str, str]
+) -> PreflightReport:
+	"""
+	Check `target` and `data` for problems that would make `on_slk_intervals()` produce invalid or surprising output,
+	and return a `PreflightReport`. Every check is a vectorised operation on the `from_to` and `join_left` columns.
+	"""
+	if isinstance(data, PreparedData):
+		data = data.data.reset_index(level=join_left)
+	
+	issue_parts = [
+		_interval_issues("target", target, join_left, from_to, check_overlaps=False),
+		_interval_issues("data",   data,   join_left, from_to, check_overlaps=True),
+	]
+	for column_name in join_left:
+		if _value_kind(target[column_name].dtype) != _value_kind(data[column_name].dtype):
+			issue_parts.append(_issue_frame("data", "join_left_dtype_mismatch", [None], column_name))
+	return PreflightReport(pd.concat(issue_parts, ignore_index=True))
+
+
+def _value_kind(dtype) -> str:
+	"""
+	The kind of value held by a column of this dtype, regardless of how it is stored. Columns of the same kind can be
+	joined; for example a categorical column of strings matches a `str` or `object` column.
+	"""
+	if isinstance(dtype, pd.CategoricalDtype):
+		dtype = dtype.categories.dtype
+	if pd.api.types.is_numeric_dtype(dtype):
+		return "number"
+	if pd.api.types.is_string_dtype(dtype):
+		return "text"
+	return dtype.kind
+
+
+def _issue_frame(frame_name: str, check: str, rows, column_name: Optional[str] = None) -> pd.DataFrame:
+	return pd.DataFrame({
+		"frame":    pd.Series(frame_name, index=range(len(rows)), dtype=object),
+		"check":    pd.Series(check, index=range(len(rows)), dtype=object),
+		"severity": pd.Series(PREFLIGHT_CHECKS[check], index=range(len(rows)), dtype=object),
+		"row":      pd.Series(list(rows), index=range(len(rows)), dtype=object),
+		"column":   pd.Series(column_name, index=range(len(rows)), dtype=object),
+	})
+
+
+def _interval_issues(frame_name: str, frame: pd.DataFrame, join_left: List[str], from_to: Tuple[str, str], check_overlaps: bool) -> pd.DataFrame:
+	slk_from = frame[from_to[0]].to_numpy(dtype=float, na_value=np.nan)
+	slk_to   = frame[from_to[1]].to_numpy(dtype=float, na_value=np.nan)
+	is_blank = np.isnan(slk_from) | np.isnan(slk_to)
+	failed_checks = {
+		"blank_chainage":    is_blank,
+		"reversed_interval": slk_from > slk_to,
+		"zero_length":       slk_from == slk_to,
+		"non_integer_slk":   ~is_blank & ((slk_from != np.round(slk_from)) | (slk_to != np.round(slk_to))),
+	}
+	
+	if check_overlaps:
+		# sort the valid intervals of each group by `from`. A row overlaps an earlier row when it begins before the
+		# furthest `to` reached by the earlier rows of its group.
+		group = frame.groupby(join_left, sort=False, dropna=False).ngroup().to_numpy()
+		positions = np.flatnonzero(~is_blank & (slk_from < slk_to))
+		positions = positions[np.lexsort((slk_from[positions], group[positions]))]
+		reach = pd.Series(slk_to[positions]).groupby(group[positions]).cummax().to_numpy()
+		is_overlapping = np.zeros(len(frame), dtype=bool)
+		is_overlapping[positions[1:][
+			(group[positions[1:]] == group[positions[:-1]]) &
+			(slk_from[positions[1:]] < reach[:-1])
+		]] = True
+		failed_checks["overlapping_data"] = is_overlapping
+	
+	labels = frame.index.to_numpy()
+	return pd.concat([_issue_frame(frame_name, check, labels[failed]) for check, failed in failed_checks.items()], ignore_index=True)
+
+
+def on_slk_intervals(
+		target: pd.DataFrame,
+		data: Union[pd.DataFrame, PreparedData],
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str],
+		engine: str = "sweep",
+		workers: int = 1,
+		memory_budget: Optional[int] = None,
+		profile: Optional[MergeProfile] = None,
+		cache: Optional[MergeCache] = None,
+		threads: int = 1,
+		validation: str = "skip"
+):
+	profile = NO_PROFILE if profile is None else profile
+	
+	result_positions = []
+	result_rows = []
+	
+	if engine not in ("sweep", "reference"):
+		raise Exception(f"Parameter `engine` must be either 'sweep' or 'reference'. Got {engine!r}.")
+	
+	if workers > 1 and engine != "sweep":
+		raise Exception("Parameter `workers` can only be greater than 1 when using the 'sweep' engine.")
+	
+	if threads < 1:
+		raise Exception(f"Parameter `threads` must be at least 1. Got {threads}.")
+	
+	if threads > 1 and (engine != "sweep" or workers > 1):
+		raise Exception("Parameter `threads` can only be greater than 1 when using the 'sweep' engine with `workers=1`.")
+	
+	if validation not in ("skip", "strict"):
+		raise Exception(f"Parameter `validation` must be either 'skip' or 'strict'. Got {validation!r}.")
+	
+	column_actions = _expand_actions(column_actions)
+	_check_merge_parameters(target, data, join_left, column_actions, from_to, memory_budget, threads)
+	
+	if validation == "strict":
+		with profile.phase("preflight", len(target) + len(data.data if isinstance(data, PreparedData) else data)):
+			report = preflight(target, data, join_left, from_to)
+		if not report.ok:
+			raise Exception(f"The preflight checks found errors in the inputs. See `merge.preflight()` for details.\n{report.summary().to_string(index=False)}")
+	
+	if cache is not None:
+		# the key is found before the data is prepared, so a cache hit does not pay for the copy and sort
+		cache_key = _cache_key(target, data, join_left, from_to, column_actions, engine)
+		result = cache.get(cache_key)
+		if result is not None:
+			return pd.concat([target, result.set_axis(target.index)], axis=1)
+	
+	with profile.phase("prepare", len(target)):
+		prepared_data = _prepare_merge(target, data, join_left, column_actions, from_to)
+	data = prepared_data.data
+	
+	with profile.phase("group", len(target)):
+		group_table = _group_table(target, prepared_data)
+	target_order, target_offsets, _, _ = group_table
+	profile.start(len(target_order), target.iloc[target_order[target_offsets[:-1]]].loc[:, join_left])
+	
+	if engine == "reference":
+		with profile.phase("reference_loop", len(target)):
+			_reference_loop(target, data, group_table, column_actions, from_to, result_positions, result_rows, profile)
+		
+		with profile.phase("assemble", len(result_positions)):
+			result = pd.DataFrame(
+				result_rows,
+				columns=[x.rename for x in column_actions],
+				index=result_positions
+			).reindex(range(len(target))).set_axis(target.index)
+	
+	else:
+		result = _merge_sweep(target, prepared_data, group_table, column_actions, workers, profile, threads)
+	
+	if cache is not None:
+		cache.put(cache_key, result)
+	return pd.concat([target, result], axis=1)
+
+
+def _merge_sweep(
+		target: pd.DataFrame,
+		prepared_data: PreparedData,
+		group_table: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+		column_actions: List[Action],
+		workers: int,
+		profile=NO_PROFILE,
+		threads: int = 1
+) -> pd.DataFrame:
+	"""Merge with the 'sweep' engine and return the result columns, see `_result_frame()`"""
+	target_from, target_to, data_from, data_to, column_values = _merge_arrays(target, prepared_data, column_actions)
+	result_targets, column_results = _merge_group_table(
+		prepared_data,
+		group_table,
+		target_from,
+		target_to,
+		data_from,
+		data_to,
+		column_values,
+		column_actions,
+		workers,
+		profile,
+		threads
+	)
+	with profile.phase("assemble", len(result_targets)):
+		return _result_frame(target, prepared_data.data, result_targets, column_results, column_actions)
+
+
+def _cache_key(
+		target: pd.DataFrame,
+		data: Union[pd.DataFrame, PreparedData],
+		join_left: List[str],
+		from_to: Tuple[str, str],
+		column_actions: List[Action],
+		engine: str
+) -> str:
+	"""
+	Hash every input that can affect the result columns of a merge, for use as a `MergeCache` key. Only the columns
+	used by the merge are read. `PreparedData` keeps its `join_left` columns in the index, which is hashed with them.
+	"""
+	if isinstance(data, PreparedData):
+		data_columns = data.data.loc[:, list(dict.fromkeys([*from_to, *_action_columns(column_actions)]))]
+	else:
+		data_columns = data.loc[:, list(dict.fromkeys([*join_left, *from_to, *_action_columns(column_actions)]))]
+	target_columns = target.loc[:, [*join_left, *from_to]]
+	
+	digest = hashlib.blake2b(digest_size=20)
+	digest.update(pickle.dumps((
+		join_left,
+		tuple(from_to),
+		[(x.column_name, x.rename, x.aggregation.type.name, x.aggregation.percentile) for x in column_actions],
+		engine,
+		isinstance(data, PreparedData),
+		[str(dtype) for dtype in target_columns.dtypes],
+		[str(dtype) for dtype in data_columns.dtypes],
+		len(target),
+	)))
+	digest.update(pd.util.hash_pandas_object(target_columns, index=False).to_numpy().tobytes())
+	digest.update(pd.util.hash_pandas_object(data_columns, index=True).to_numpy().tobytes())
+	return digest.hexdigest()
+
+
+def _reference_loop(
+		target: pd.DataFrame,
+		data: pd.DataFrame,
+		group_table: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+		column_actions: List[Action],
+		from_to: Tuple[str, str],
+		result_positions: list,
+		result_rows: list,
+		profile=NO_PROFILE
+):
+	"""The main loop of the 'reference' engine. Appends the position and aggregated values of each matched target row to `result_positions` and `result_rows`"""
+	slk_from, slk_to = from_to
+	target_order, target_offsets, data_starts, data_stops = group_table
+	join_levels = list(range(data.index.nlevels - 1))
+	for group in range(len(data_starts)):
+		group_started = profile.clock()
+		target_group_positions = target_order[target_offsets[group]:target_offsets[group + 1]]
+		target_group = target.iloc[target_group_positions]
+		if data_starts[group] == data_stops[group]:
+			# There was no data matching the target group. Skip adding output. output to these rows will be NaN for all columns.
+			profile.group_finished(group, len(target_group), 0, 0, group_started)
+			continue
+		data_matching_target_group = data.iloc[data_starts[group]:data_stops[group]].droplevel(join_levels)
+		
+		# Iterate row by row through the target group
+		group_pairs = 0
+		for target_position, (_, target_row) in zip(target_group_positions.tolist(), target_group.iterrows()):
+			
+			# Select data with overlapping slk interval
+			data_to_aggregate_for_target_group = data_matching_target_group[
+				(data_matching_target_group[slk_from] < target_row[slk_to]) &
+				(data_matching_target_group[slk_to] > target_row[slk_from])
+			]
+			
+			# if no data matches the target group then skip
+			if data_to_aggregate_for_target_group.empty:
+				continue
+			
+			result_positions.append(target_position)
+			result_rows.append(_aggregate_row(
+				data_to_aggregate_for_target_group,
+				target_row[slk_from],
+				target_row[slk_to],
+				column_actions,
+				from_to
+			))
+			group_pairs += len(data_to_aggregate_for_target_group)
+		profile.group_finished(group, len(target_group), len(data_matching_target_group), group_pairs, group_started)
+
+
+def on_slk_intervals_many(
+		target: pd.DataFrame,
+		datasets: List[Tuple[Union[pd.DataFrame, PreparedData], List[Action]]],
+		join_left: List[str],
+		from_to: Tuple[str, str],
+		threads: int = 1
+) -> pd.DataFrame:
+	"""
+	Merge several datasets onto the same target in one call. `datasets` is a list of `(data, column_actions)` pairs.
+	
+	The target is grouped and sorted once and shared by every dataset, and the result columns of all datasets are
+	placed beside the target in one step. The result is the same as calling `on_slk_intervals()` once per dataset,
+	each time passing the previous result as the target.
+	"""
+	if threads < 1:
+		raise Exception(f"Parameter `threads` must be at least 1. Got {threads}.")
+	
+	dataset_column_actions = [_expand_actions(column_actions) for _, column_actions in datasets]
+	renames = [column_action.rename for column_actions in dataset_column_actions for column_action in column_actions]
+	repeated_renames = sorted({rename for rename in renames if renames.count(rename) > 1})
+	if len(repeated_renames) > 0:
+		raise Exception(f"The result columns {repeated_renames} are produced more than once. Please use the rename parameter to give every result column a different name; `Action(..., rename='xyz')`")
+	
+	prepared_datasets = [
+		_prepare_merge(target, data, join_left, column_actions, from_to)
+		for (data, _), column_actions in zip(datasets, dataset_column_actions)
+	]
+	target_groups = _TargetGroups(target, join_left)
+	results = [
+		_merge_sweep(target, prepared_data, target_groups.group_table(prepared_data), column_actions, 1, threads=threads)
+		for prepared_data, column_actions in zip(prepared_datasets, dataset_column_actions)
+	]
+	return pd.concat([target, *results], axis=1)
+
+
+def overlay(
+		datasets: List[Tuple[pd.DataFrame, List[str]]],
+		join_left: List[str],
+		from_to: Tuple[str, str]
+) -> pd.DataFrame:
+	"""
+	Split each `join_left` group at every `from` and `to` of every dataset, so that each piece lies entirely within or
+	entirely outside each data row. `datasets` is a list of `(data, columns)` pairs.
+	
+	Returns one row per piece covered by at least one dataset, sorted by group and `from`, with the `columns` of each
+	dataset taken from the data row covering the piece (blank where no row covers it). If several rows of a dataset
+	cover a piece, the first non-blank value by row label is used. The cost depends on the number of rows, not on the
+	length of the road.
+	"""
+	if not isinstance(join_left, list):
+		raise Exception("Parameter `join_left` must be a list literal. Tuples and other sequence types will lead to cryptic errors from pandas.")
+	for data, columns in datasets:
+		missing_columns = [column_name for column_name in join_left + list(from_to) + list(columns) if column_name not in data.columns]
+		if len(missing_columns) > 0:
+			raise Exception(f"Cannot overlay data. Columns {missing_columns} are missing from one of the `datasets`.")
+	
+	# every valid row starts covering its group at `from` and stops at `to`
+	slk_from, slk_to = from_to
+	events = []
+	for data, _ in datasets:
+		data = data.loc[data[slk_from] < data[slk_to], [*join_left, *from_to]]
+		events.append(pd.concat([
+			data.loc[:, join_left].assign(slk=data[slk_from], delta=1),
+			data.loc[:, join_left].assign(slk=data[slk_to],   delta=-1),
+		], ignore_index=True))
+	events = pd.concat(events, ignore_index=True).dropna(subset=join_left)
+	group    = events.groupby(join_left, sort=True).ngroup().to_numpy()
+	position = events["slk"].to_numpy()
+	order = np.lexsort((position, group))
+	group    = group[order]
+	position = position[order]
+	
+	# the distinct breakpoints of each group, and how many rows cover the piece that follows each one. The deltas of
+	# each group add up to zero, so one running total over every group is enough.
+	breakpoint_start = np.flatnonzero((np.diff(group, prepend=-1) != 0) | (np.diff(position, prepend=np.nan) != 0))
+	coverage = np.cumsum(np.add.reduceat(events["delta"].to_numpy()[order], breakpoint_start)) if len(order) > 0 else np.empty(0, dtype=int)
+	
+	is_piece = np.zeros(len(breakpoint_start), dtype=bool)
+	is_piece[:-1] = (coverage[:-1] > 0) & (group[breakpoint_start[1:]] == group[breakpoint_start[:-1]])
+	piece_start = breakpoint_start[is_piece]
+	piece_stop  = breakpoint_start[1:][is_piece[:-1]]
+	
+	pieces = events.iloc[order[piece_start]].loc[:, join_left].reset_index(drop=True)
+	pieces[slk_from] = position[piece_start]
+	pieces[slk_to]   = position[piece_stop]
+	
+	return on_slk_intervals_many(
+		pieces,
+		[(data, [Action(column_name, Aggregation.First()) for column_name in columns]) for data, columns in datasets],
+		join_left,
+		from_to
+	)
+
+
+# the number of target rows merged at once by `iter_slk_intervals()` when it yields one chunk per group
+_ITER_BATCH_ROWS = 65536
+
+
+def iter_slk_intervals(
+		target: pd.DataFrame,
+		data: Union[pd.DataFrame, PreparedData],
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str],
+		chunk_size: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
+	"""
+	Like `on_slk_intervals()`, but yields the result in chunks as they are finished, so that the output can be written
+	out incrementally without holding the whole result in memory.
+	
+	If `chunk_size` is omitted one chunk is yielded per `join_left` group, in sorted group order, followed by one
+	chunk holding any target rows with a blank `join_left` value. Otherwise each chunk holds the next `chunk_size`
+	target rows, in the same order as the target. Either way, concatenating the chunks gives every row of the result.
+	
+	Every chunk has the same dtypes, see `_result_dtypes()`, so the chunks can be appended to one file. Numeric result
+	columns are always float64, even where `on_slk_intervals()` would give int64 because every target row matched.
+	"""
+	if chunk_size is not None and chunk_size < 1:
+		raise Exception(f"Parameter `chunk_size` must be at least 1. Got {chunk_size}.")
+	
+	column_actions = _expand_actions(column_actions)
+	prepared_data = _prepare_merge(target, data, join_left, column_actions, from_to)
+	target_order, target_offsets, data_starts, data_stops = _group_table(target, prepared_data)
+	merge_arrays = _merge_arrays(target, prepared_data, column_actions)
+	result_dtypes = _result_dtypes(prepared_data, column_actions)
+	
+	def merge_chunk(chunk_group_table, chunk_positions):
+		result_targets, column_results = _merge_group_table(prepared_data, chunk_group_table, *merge_arrays, column_actions, 1)
+		return pd.concat([
+			target.iloc[chunk_positions],
+			_result_frame(target, prepared_data.data, result_targets, column_results, column_actions, chunk_positions, result_dtypes)
+		], axis=1)
+	
+	if chunk_size is None:
+		# building the result frames costs about as much for a small group as for a large one, so groups are merged in
+		# batches of about _ITER_BATCH_ROWS target rows, and each batch is then sliced into one chunk per group
+		group = 0
+		while group < len(data_starts):
+			batch_stop = max(np.searchsorted(target_offsets, target_offsets[group] + _ITER_BATCH_ROWS, side="right") - 1, group + 1)
+			batch_offsets = target_offsets[group:batch_stop + 1] - target_offsets[group]
+			batch_positions = target_order[target_offsets[group]:target_offsets[batch_stop]]
+			sorted_positions = np.sort(batch_positions)
+			batch_result = merge_chunk(
+				(batch_positions, batch_offsets, data_starts[group:batch_stop], data_stops[group:batch_stop]),
+				sorted_positions
+			).iloc[np.searchsorted(sorted_positions, batch_positions)]
+			for chunk_start, chunk_stop in zip(batch_offsets[:-1], batch_offsets[1:]):
+				yield batch_result.iloc[chunk_start:chunk_stop]
+			group = batch_stop
+		
+		# target rows with a blank join_left value do not belong to any group
+		ungrouped_positions = np.setdiff1d(np.arange(len(target)), target_order)
+		if len(ungrouped_positions) > 0:
+			yield merge_chunk((ungrouped_positions[:0], np.array([0]), data_starts[:0], data_stops[:0]), ungrouped_positions)
+	
+	else:
+		target_group = np.full(len(target), -1)
+		target_group[target_order] = np.repeat(np.arange(len(data_starts)), np.diff(target_offsets))
+		for chunk_start in range(0, len(target), chunk_size):
+			chunk_positions = np.arange(chunk_start, min(chunk_start + chunk_size, len(target)))
+			chunk_group = target_group[chunk_positions]
+			chunk_order = np.argsort(chunk_group, kind="stable")
+			chunk_order = chunk_order[chunk_group[chunk_order] >= 0]
+			# only the groups found in this chunk are swept
+			chunk_groups, chunk_group_size = np.unique(chunk_group[chunk_order], return_counts=True)
+			chunk_offsets = np.zeros(len(chunk_groups) + 1, dtype=np.intp)
+			np.cumsum(chunk_group_size, out=chunk_offsets[1:])
+			yield merge_chunk((chunk_positions[chunk_order], chunk_offsets, data_starts[chunk_groups], data_stops[chunk_groups]), chunk_positions)
+
+
+_POINT_AGGREGATION_TYPES = (
+	AggregationType.Count,
+	AggregationType.Sum,
+	AggregationType.First,
+	AggregationType.Max,
+	AggregationType.IndexOfMax,
+)
+
+
+def on_slk_points(
+		target: pd.DataFrame,
+		points: pd.DataFrame,
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str],
+		slk: str
+) -> pd.DataFrame:
+	"""
+	Merge point events, which have a single `slk` column instead of a from/to interval, onto the `target`
+	segmentation. Each point is given to the target row of its `join_left` group where `from <= slk <= to`; a point on
+	the boundary between two touching target rows goes to the later one.
+	
+	Only `Count`, `Sum`, `First`, `Max` and `IndexOfMax` can be used. The target rows of each `join_left` group must not
+	overlap each other.
+	"""
+	if not isinstance(join_left, list):
+		raise Exception("Parameter `join_left` must be a list literal. Tuples and other sequence types will lead to cryptic errors from pandas.")
+	for column_action in column_actions:
+		if column_action.aggregation.type not in _POINT_AGGREGATION_TYPES:
+			raise Exception(
+				f"Cannot compute {column_action.aggregation.type.name} of column '{column_action.column_name}' for point data. "
+				f"Only {', '.join(aggregation_type.name for aggregation_type in _POINT_AGGREGATION_TYPES)} can be used."
 			)
-		return Aggregation(
-			AggregationType.LengthWeightedPercentile,
-			percentile=percentile
+		if column_action.rename in target.columns:
+			raise Exception(f"Cannot merge column '{column_action.column_name}' as '{column_action.rename}' into target because the target already contains a column named '{column_action.rename}'.")
+	missing_columns = (
+		[f"Column '{column_name}' is missing from `target`." for column_name in [*join_left, *from_to] if column_name not in target.columns] +
+		[f"Column '{column_name}' is missing from `points`." for column_name in [*join_left, slk, *_action_columns(column_actions)] if column_name not in points.columns]
+	)
+	if len(missing_columns) > 0:
+		raise Exception("\n".join(missing_columns))
+	
+	slk_from, slk_to = from_to
+	target_keys, point_keys = _array_join_keys(target, points, join_left, len(target), len(points))
+	target_from = target[slk_from].to_numpy()
+	target_to   = target[slk_to].to_numpy()
+	point_slk   = points[slk].to_numpy()
+	
+	# sort the target rows by group and `from`, then check that they don't overlap
+	target_order = np.lexsort((target_to, target_from, target_keys))
+	sorted_keys = target_keys[target_order]
+	sorted_from = target_from[target_order]
+	sorted_to   = target_to[target_order]
+	if np.any((sorted_keys[1:] == sorted_keys[:-1]) & (sorted_from[1:] < sorted_to[:-1])):
+		raise Exception("The rows of `target` overlap each other within a `join_left` group. Each point must have only one target row to go to.")
+	
+	# group the points, then find the last target row with `from <= slk` by binary search within each group
+	point_order = np.argsort(point_keys, kind="stable")
+	sorted_point_keys = point_keys[point_order]
+	group_keys = np.unique(sorted_keys[sorted_keys != -1])
+	target_starts = np.searchsorted(sorted_keys, group_keys, side="left")
+	target_stops  = np.searchsorted(sorted_keys, group_keys, side="right")
+	point_starts  = np.searchsorted(sorted_point_keys, group_keys, side="left")
+	point_stops   = np.searchsorted(sorted_point_keys, group_keys, side="right")
+	point_target = np.full(len(points), -1, dtype=np.intp)
+	for target_start, target_stop, point_start, point_stop in zip(target_starts, target_stops, point_starts, point_stops):
+		group_points = point_order[point_start:point_stop]
+		found = np.searchsorted(sorted_from[target_start:target_stop], point_slk[group_points], side="right") - 1
+		point_target[group_points] = np.where(found >= 0, found + target_start, -1)
+	
+	is_matched = (point_target != -1) & ~_isna(point_slk)
+	candidates = np.flatnonzero(is_matched)
+	is_matched[candidates] = point_slk[candidates] <= sorted_to[point_target[candidates]]
+	
+	# pairs are ordered by target position, then by the order of the point labels, as for `on_slk_intervals()`
+	if points.index.is_monotonic_increasing:
+		point_rank = np.arange(len(points))
+	else:
+		point_rank = np.empty(len(points), dtype=np.intp)
+		point_rank[np.argsort(points.index.to_numpy(), kind="stable")] = np.arange(len(points))
+	pair_target = target_order[point_target[is_matched]]
+	pair_point  = np.flatnonzero(is_matched)
+	pair_order  = np.argsort(pair_target.astype(np.int64) * len(points) + point_rank[pair_point])
+	pair_target = pair_target[pair_order]
+	pair_point  = pair_point[pair_order]
+	
+	point_labels = points.index.to_numpy()
+	result_columns = {}
+	for column_action in column_actions:
+		values = points[column_action.column_name].to_numpy()
+		is_valid = ~_isna(values[pair_point])
+		run_point = pair_point[is_valid]
+		run_value = values[run_point]
+		run_start = np.flatnonzero(np.diff(pair_target[is_valid], prepend=-1))
+		run_target = pair_target[is_valid][run_start]
+		
+		aggregation_type = column_action.aggregation.type
+		if len(run_point) == 0:
+			result = np.empty(0)
+		elif aggregation_type == AggregationType.Count:
+			result = np.diff(np.append(run_start, len(run_point)))
+		elif aggregation_type == AggregationType.Sum:
+			result = np.add.reduceat(run_value, run_start)
+		elif aggregation_type == AggregationType.First:
+			result = run_value[run_start]
+		elif aggregation_type == AggregationType.Max:
+			result = np.maximum.reduceat(run_value, run_start)
+		elif aggregation_type == AggregationType.IndexOfMax:
+			result = point_labels[run_point[_first_max_of_runs(run_value, run_start)]]
+		
+		if len(run_target) == len(target):
+			result_columns[column_action.rename] = result
+		else:
+			result_column = np.full(len(target), np.nan, dtype=float if result.dtype.kind in "iuf" else object)
+			result_column[run_target] = result
+			result_columns[column_action.rename] = result_column
+	
+	return pd.concat([target, pd.DataFrame(result_columns, index=target.index).infer_objects()], axis=1)
+
+
+def on_slk_intervals_incremental(
+		target: pd.DataFrame,
+		data: Union[pd.DataFrame, PreparedData],
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str],
+		state_path: str
+) -> pd.DataFrame:
+	"""
+	Like `on_slk_intervals()`, but keeps the result of each `join_left` group in the file at `state_path`, along with
+	a fingerprint of the target and data rows of that group. On the next call only the groups whose target or data rows
+	have changed are merged again; the stored results of all other groups are reused. The result is identical to a
+	full merge. If `column_actions`, `from_to`, `join_left` or the data column types change, every group is merged again.
+	
+	Every group is also merged again when a full merge would switch between the prefix sum path and the overlap pair
+	path, since the two can round differently in the last bits. Stored and new groups therefore always come from the
+	same path as a full merge.
+	"""
+	column_actions = _expand_actions(column_actions)
+	prepared_data = _prepare_merge(target, data, join_left, column_actions, from_to)
+	target_order, target_offsets, data_starts, data_stops = _group_table(target, prepared_data)
+	group_keys = list(target.iloc[target_order[target_offsets[:-1]]].loc[:, join_left].itertuples(index=False, name=None))
+	target_fingerprints, data_fingerprints = _group_fingerprints(target, prepared_data, (target_order, target_offsets, data_starts, data_stops), column_actions)
+	merge_arrays = _merge_arrays(target, prepared_data, column_actions)
+	target_from, target_to = merge_arrays[:2]
+	merge_spec = (
+		list(join_left),
+		tuple(from_to),
+		[(x.column_name, x.rename, x.aggregation.type.name, x.aggregation.percentile) for x in column_actions],
+		[str(prepared_data.data[column_name].dtype) for column_name in [*from_to, *_action_columns(column_actions)]],
+		[str(target[column_name].dtype) for column_name in from_to],
+		_can_use_prefix_sums(prepared_data, target_from, target_to, column_actions),
+	)
+	
+	stored_groups = {}
+	if os.path.exists(state_path):
+		with open(state_path, "rb") as file:
+			state = pickle.load(file)
+		if state["merge_spec"] == merge_spec:
+			stored_groups = state["groups"]
+	
+	group_results = {}
+	changed_groups = []
+	for group, group_key in enumerate(group_keys):
+		stored_group = stored_groups.get(group_key)
+		if stored_group is not None and stored_group[0] == target_fingerprints[group] and stored_group[1] == data_fingerprints[group]:
+			group_results[group] = stored_group[2]
+		else:
+			changed_groups.append(group)
+	
+	# merge the changed groups, then split the result into the part belonging to each group
+	if len(changed_groups) > 0:
+		changed_groups = np.array(changed_groups)
+		changed_target_positions = [target_order[target_offsets[group]:target_offsets[group + 1]] for group in changed_groups]
+		changed_target_offsets = np.zeros(len(changed_groups) + 1, dtype=np.intp)
+		np.cumsum([len(positions) for positions in changed_target_positions], out=changed_target_offsets[1:])
+		result_targets, column_results = _merge_group_table(
+			prepared_data,
+			(np.concatenate(changed_target_positions), changed_target_offsets, data_starts[changed_groups], data_stops[changed_groups]),
+			*merge_arrays,
+			column_actions,
+			1
 		)
+		target_group = np.full(len(target), -1)
+		target_group[target_order] = np.repeat(np.arange(len(group_keys)), np.diff(target_offsets))
+		target_local_position = np.zeros(len(target), dtype=np.intp)
+		target_local_position[target_order] = np.arange(len(target_order)) - np.repeat(target_offsets[:-1], np.diff(target_offsets))
+		for group in changed_groups:
+			local_column_results = []
+			for column_action, (run_target, result) in zip(column_actions, column_results):
+				is_in_group = target_group[run_target] == group
+				group_result = result[is_in_group]
+				if column_action.aggregation.type == AggregationType.IndexOfMax:
+					# store data positions relative to the start of the group, which moves when other groups change
+					group_result = group_result - data_starts[group]
+				local_column_results.append((target_local_position[run_target[is_in_group]], group_result))
+			group_results[group] = (target_local_position[result_targets[target_group[result_targets] == group]], local_column_results)
 	
-	@staticmethod
-	def ProportionalSum():
-		"""This is the sum of values overlapping the target segment; The value of each segment is multiplied by the proportion of that segment overlapping the target segment."""
-		return Aggregation(AggregationType.ProportionalSum)
+	with open(state_path, "wb") as file:
+		pickle.dump({
+			"merge_spec": merge_spec,
+			"groups": {
+				group_key: (target_fingerprints[group], data_fingerprints[group], group_results[group])
+				for group, group_key in enumerate(group_keys)
+			},
+		}, file, protocol=pickle.HIGHEST_PROTOCOL)
+	
+	# splice the results of every group back together by target position
+	result_target_parts = [np.empty(0, dtype=np.intp)]
+	column_result_parts = [([np.empty(0, dtype=np.intp)], []) for _ in column_actions]
+	for group, (local_result_targets, local_column_results) in group_results.items():
+		group_positions = target_order[target_offsets[group]:target_offsets[group + 1]]
+		result_target_parts.append(group_positions[local_result_targets])
+		for column_action, (run_target_parts, result_parts), (local_run_target, result) in zip(column_actions, column_result_parts, local_column_results):
+			run_target_parts.append(group_positions[local_run_target])
+			result_parts.append(result + data_starts[group] if column_action.aggregation.type == AggregationType.IndexOfMax else result)
+	
+	result_targets = np.sort(np.concatenate(result_target_parts))
+	column_results = []
+	for run_target_parts, result_parts in column_result_parts:
+		run_target = np.concatenate(run_target_parts)
+		run_order = np.argsort(run_target, kind="stable")
+		result = np.concatenate(result_parts) if len(result_parts) > 0 else np.empty(0)
+		column_results.append((run_target[run_order], result[run_order]))
+	return pd.concat([target, _result_frame(target, prepared_data.data, result_targets, column_results, column_actions)], axis=1)
 
-	@staticmethod
-	def Sum():
-		"""This is the sum of values touching the target. Even if only part of the value is overlapping the target segment, the entire data value will be added to the sum"""
-		return Aggregation(AggregationType.Sum)
 
-	@staticmethod
-	def IndexOfMax():
-		"""This is the row label of the maximum value detected in the data"""
-		return Aggregation(AggregationType.IndexOfMax)
+def _group_fingerprints(
+		target: pd.DataFrame,
+		prepared_data: PreparedData,
+		group_table: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+		column_actions: List[Action]
+) -> Tuple[List[bytes], List[bytes]]:
+	"""
+	Hash the rows of each group that can affect its merge result: the `from_to` columns of its target rows in order,
+	and the `from_to`, action columns and row labels of its data rows.
+	"""
+	target_order, target_offsets, data_starts, data_stops = group_table
+	target_row_hashes = pd.util.hash_pandas_object(target.loc[:, list(prepared_data.from_to)], index=False).to_numpy()[target_order]
+	data_row_hashes = pd.util.hash_pandas_object(
+		prepared_data.data.loc[:, list(dict.fromkeys([*prepared_data.from_to, *_action_columns(column_actions)]))].reset_index("data_id"),
+		index=False
+	).to_numpy()
+	return (
+		[hashlib.blake2b(target_row_hashes[start:stop].tobytes()).digest() for start, stop in zip(target_offsets[:-1], target_offsets[1:])],
+		[hashlib.blake2b(data_row_hashes[start:stop].tobytes()).digest() for start, stop in zip(data_starts, data_stops)],
+	)
 
-	# @staticmethod
-	# def SumLengthWeightedAveragePerCategory(category_column_name:str):
-	# 	"""For the set of data matching a target row, get the length weighted average for each category, then sum the results."""
-	# 	return Aggregation(AggregationType.IndexOfMax)
 
-class Action:
-	def __init__(
-			self,
-			column_name: str,
-			aggregation: Aggregation,
-			rename: Optional[str] = None
-	):
-		self.column_name: str = column_name
-		self.rename = rename if rename is not None else self.column_name
-		self.aggregation: Aggregation = aggregation
+_ROLLUP_AGGREGATION_TYPES = (
+	AggregationType.LengthWeightedAverage,
+	AggregationType.ProportionalSum,
+	AggregationType.KeepLongest,
+)
+
+
+def sufficient_statistics(
+		target: pd.DataFrame,
+		data: Union[pd.DataFrame, PreparedData],
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str]
+) -> pd.DataFrame:
+	"""
+	Like `on_slk_intervals()`, but instead of the final value of each action, add the totals that it is computed from.
+	The totals of several target rows can be added together, so `rollup()` can derive the result for a coarser
+	segmentation from this one without going back to `data`.
+	
+	For each action named `x` the columns added are
+	 - `LengthWeightedAverage`: `x__value_len`, the sum of value times overlap length, and `x__valid_len`, the overlap
+	   length of non-blank values
+	 - `ProportionalSum`: `x__proportional_sum`
+	 - `KeepLongest`: `x__len__<value>`, the overlap length of each distinct value, where `<value>` is the `repr()` of
+	   the value
+	Totals are NaN where no non-blank data overlaps the target row. Other aggregations cannot be rolled up and raise an
+	exception.
+	"""
+	column_actions = _expand_actions(column_actions)
+	_check_rollup_actions(column_actions)
+	prepared_data = _prepare_merge(target, data, join_left, column_actions, from_to)
+	target_from, target_to, data_from, data_to, column_values = _merge_arrays(target, prepared_data, column_actions)
+	target_positions, data_positions = _overlap_pair_table(target_from, target_to, data_from, data_to, *_group_table(target, prepared_data))
+	overlap_len = (
+		np.minimum(data_to[data_positions],   target_to[target_positions]) -
+		np.maximum(data_from[data_positions], target_from[target_positions])
+	)
+	
+	def total(pair_target, weights):
+		# bincount gives int64 when there are no weights at all, so make sure the result can hold NaN
+		result = np.bincount(pair_target, weights=weights, minlength=len(target)).astype(float)
+		result[np.bincount(pair_target, minlength=len(target)) == 0] = np.nan
+		return result
+	
+	statistic_columns = {}
+	for column_action, values in zip(column_actions, column_values):
+		is_valid = ~pd.isna(values[data_positions]) & (overlap_len > 0)
+		pair_target = target_positions[is_valid]
+		pair_data   = data_positions[is_valid]
+		pair_len    = overlap_len[is_valid].astype(float)
+		
+		if column_action.aggregation.type == AggregationType.LengthWeightedAverage:
+			statistic_columns[f"{column_action.rename}__value_len"] = total(pair_target, values[pair_data].astype(float) * pair_len)
+			statistic_columns[f"{column_action.rename}__valid_len"] = total(pair_target, pair_len)
+		
+		elif column_action.aggregation.type == AggregationType.ProportionalSum:
+			statistic_columns[f"{column_action.rename}__proportional_sum"] = total(
+				pair_target,
+				values[pair_data].astype(float) * pair_len / (data_to[pair_data] - data_from[pair_data])
+			)
+		
+		elif column_action.aggregation.type == AggregationType.KeepLongest:
+			codes, uniques = prepared_data.factorized_column(column_action.column_name)
+			has_value = total(pair_target, pair_len)
+			value_len = np.bincount(
+				pair_target.astype(np.int64) * len(uniques) + codes[pair_data],
+				weights=pair_len,
+				minlength=len(target) * len(uniques)
+			).astype(float).reshape(len(target), len(uniques))
+			value_len[np.isnan(has_value)] = np.nan
+			for code, value in enumerate(uniques.tolist()):
+				statistic_columns[f"{column_action.rename}__len__{value!r}"] = value_len[:, code]
+	
+	return pd.concat([target, pd.DataFrame(statistic_columns, index=target.index)], axis=1)
+
+
+def rollup(
+		statistics: pd.DataFrame,
+		target: pd.DataFrame,
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str]
+) -> pd.DataFrame:
+	"""
+	Compute `column_actions` for a coarse `target` segmentation from the `statistics` of a finer segmentation, see
+	`sufficient_statistics()`. `column_actions` must be the same actions that the statistics were computed for.
+	
+	Each fine segment must lie entirely within one target segment. The result matches `on_slk_intervals()` when the fine
+	segments cover the target segments; data under gaps between fine segments is not counted.
+	"""
+	column_actions = _expand_actions(column_actions)
+	_check_rollup_actions(column_actions)
+	
+	statistic_columns = []
+	keep_longest_values = {}
+	for column_action in column_actions:
+		if column_action.aggregation.type == AggregationType.LengthWeightedAverage:
+			statistic_columns += [f"{column_action.rename}__value_len", f"{column_action.rename}__valid_len"]
+		elif column_action.aggregation.type == AggregationType.ProportionalSum:
+			statistic_columns += [f"{column_action.rename}__proportional_sum"]
+		elif column_action.aggregation.type == AggregationType.KeepLongest:
+			prefix = f"{column_action.rename}__len__"
+			value_columns = [column_name for column_name in statistics.columns if isinstance(column_name, str) and column_name.startswith(prefix)]
+			keep_longest_values[column_action.rename] = (value_columns, [_parse_statistic_value(column_name[len(prefix):]) for column_name in value_columns])
+			statistic_columns += value_columns
+	missing_columns = [column_name for column_name in statistic_columns if column_name not in statistics.columns]
+	if len(missing_columns) > 0:
+		raise Exception(f"Columns {missing_columns} are missing from `statistics`. Please compute them with `sufficient_statistics()` using the same `column_actions`.")
+	
+	for column_action in column_actions:
+		if column_action.rename in target.columns:
+			raise Exception(f"Cannot roll up '{column_action.rename}' into target because the target already contains a column of that name.")
+	
+	prepared_statistics = prepare(statistics, join_left, from_to, columns=statistic_columns)
+	target_from, target_to, fine_from, fine_to, _ = _merge_arrays(target, prepared_statistics, [])
+	target_positions, fine_positions = _overlap_pair_table(target_from, target_to, fine_from, fine_to, *_group_table(target, prepared_statistics))
+	overlap_len = (
+		np.minimum(fine_to[fine_positions],   target_to[target_positions]) -
+		np.maximum(fine_from[fine_positions], target_from[target_positions])
+	)
+	is_inside = overlap_len > 0
+	if np.any(overlap_len[is_inside] != (fine_to - fine_from)[fine_positions[is_inside]]):
+		raise Exception("Some segments of `statistics` cross a boundary between segments of `target`. Each fine segment must lie entirely within one target segment.")
+	target_positions = target_positions[is_inside]
+	fine_positions   = fine_positions[is_inside]
+	
+	def total(column_name):
+		values = prepared_statistics.data[column_name].to_numpy(dtype=float)[fine_positions]
+		is_valid = ~np.isnan(values)
+		# bincount gives int64 when there are no weights at all, so make sure the result can hold NaN
+		result = np.bincount(target_positions[is_valid], weights=values[is_valid], minlength=len(target)).astype(float)
+		result[np.bincount(target_positions[is_valid], minlength=len(target)) == 0] = np.nan
+		return result
+	
+	result_columns = {}
+	for column_action in column_actions:
+		if column_action.aggregation.type == AggregationType.LengthWeightedAverage:
+			with np.errstate(invalid="ignore", divide="ignore"):
+				result_columns[column_action.rename] = total(f"{column_action.rename}__value_len") / total(f"{column_action.rename}__valid_len")
+		
+		elif column_action.aggregation.type == AggregationType.ProportionalSum:
+			result_columns[column_action.rename] = total(f"{column_action.rename}__proportional_sum")
+		
+		elif column_action.aggregation.type == AggregationType.KeepLongest:
+			# ties resolve to the smallest value, as in `on_slk_intervals()`
+			value_columns, values = keep_longest_values[column_action.rename]
+			value_order = pd.Index(values).argsort() if len(values) > 0 else np.empty(0, dtype=np.intp)
+			value_len = np.column_stack([total(value_columns[index]) for index in value_order]).reshape(len(target), len(values))
+			has_value = ~np.all(np.isnan(value_len), axis=1)
+			longest = np.full(len(target), np.nan, dtype=object)
+			if len(values) > 0:
+				longest[has_value] = np.array(values, dtype=object)[value_order][np.argmax(np.nan_to_num(value_len[has_value], nan=-np.inf), axis=1)]
+			result_columns[column_action.rename] = longest
+	
+	return pd.concat([target, pd.DataFrame(result_columns, index=target.index).infer_objects()], axis=1)
+
+
+def _check_rollup_actions(column_actions: List[Action]):
+	for column_action in column_actions:
+		if column_action.aggregation.type not in _ROLLUP_AGGREGATION_TYPES:
+			raise Exception(
+				f"Cannot compute sufficient statistics for {column_action.aggregation.type.name} of column '{column_action.column_name}'. "
+				f"Only {', '.join(aggregation_type.name for aggregation_type in _ROLLUP_AGGREGATION_TYPES)} can be rolled up."
+			)
+
 
+def _parse_statistic_value(text: str):
+	"""Recover a KeepLongest value from the `repr()` used in its statistic column name"""
+	try:
+		return ast.literal_eval(text)
+	except (ValueError, SyntaxError):
+		return text
+
+
+_COALESCE_AGGREGATION_TYPES = (
+	AggregationType.LengthWeightedAverage,
+	AggregationType.KeepLongest,
+)
 
-def on_slk_intervals(target: pd.DataFrame, data: pd.DataFrame, join_left: List[str], column_actions: List[Action], from_to: Tuple[str, str]):
+
+def coalesce(
+		data: pd.DataFrame,
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str]
+) -> pd.DataFrame:
+	"""
+	Join runs of touching `data` rows that have identical values in every column used by `column_actions`, within each
+	`join_left` group, so that later merges with the same `column_actions` have fewer rows to process. Each run becomes
+	one row labelled with the index of its first row, running from the `from` of its first row to the `to` of its last.
+	Only the `join_left`, `from_to` and action columns are kept.
+	
+	Only `LengthWeightedAverage` and `KeepLongest` give the same result for coalesced data; every other aggregation
+	depends on how the data is split into rows, so an exception is raised for them.
+	"""
+	if not isinstance(join_left, list):
+		raise Exception("Parameter `join_left` must be a list literal. Tuples and other sequence types will lead to cryptic errors from pandas.")
+	column_actions = _expand_actions(column_actions)
+	for column_action in column_actions:
+		if column_action.aggregation.type not in _COALESCE_AGGREGATION_TYPES:
+			raise Exception(
+				f"Cannot coalesce data for {column_action.aggregation.type.name} of column '{column_action.column_name}' because "
+				f"the result depends on how the data is split into rows. Only "
+				f"{' and '.join(aggregation_type.name for aggregation_type in _COALESCE_AGGREGATION_TYPES)} can be used with coalesced data."
+			)
+	columns = _action_columns(column_actions)
+	missing_columns = [column_name for column_name in join_left + list(from_to) + columns if column_name not in data.columns]
+	if len(missing_columns) > 0:
+		raise Exception(f"Cannot coalesce data. Columns {missing_columns} are missing from `data`.")
+	
 	slk_from, slk_to = from_to
+	data = data.loc[:, list(dict.fromkeys([*join_left, *from_to, *columns]))]
+	if len(data) == 0:
+		return data.copy()
+	group = data.groupby(join_left, sort=False, dropna=False).ngroup().to_numpy()
+	data_from = data[slk_from].to_numpy()
+	data_to   = data[slk_to].to_numpy()
+	# blank values are given the same code as each other, so they can be joined too
+	value_codes = [pd.factorize(data[column_name].to_numpy())[0] for column_name in columns]
 	
-	result_index = []
-	result_rows = []
+	# sort by group and values, then along the road. A row continues the run of the row before it when it has the same
+	# group and values and begins where that row ends.
+	order = np.lexsort((data_to, data_from, *value_codes[::-1], group))
+	is_continuation = (group[order][1:] == group[order][:-1]) & (data_from[order][1:] == data_to[order][:-1])
+	for codes in value_codes:
+		is_continuation &= codes[order][1:] == codes[order][:-1]
+	
+	run_start = np.flatnonzero(np.append(True, ~is_continuation))
+	run_first = order[run_start]
+	run_last  = order[np.append(run_start[1:], len(order)) - 1]
+	
+	# return the runs of each group in order along the road
+	run_order = np.lexsort((data_from[run_first], group[run_first]))
+	result = data.iloc[run_first[run_order]].copy()
+	result[slk_to] = data_to[run_last[run_order]]
+	return result
+
 
+def _prepare_merge(
+		target: pd.DataFrame,
+		data: Union[pd.DataFrame, PreparedData],
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str],
+		memory_budget: Optional[int] = None
+):
+	"""Check the parameters shared by every kind of merge, then prepare the data and group the target."""
+	_check_merge_parameters(target, data, join_left, column_actions, from_to, memory_budget)
+	if isinstance(data, PreparedData):
+		return data
+	# Only carry the columns that are needed through the copy and sort done by `prepare()`
+	return prepare(data, join_left, from_to, columns=_action_columns(column_actions))
+
+
+def _check_merge_parameters(
+		target: pd.DataFrame,
+		data: Union[pd.DataFrame, PreparedData],
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str],
+		memory_budget: Optional[int] = None,
+		threads: int = 1
+):
+	"""The checks of `_prepare_merge()`, which are cheap and are done before `data` is copied or sorted"""
 	if not isinstance(join_left, list):
 		raise Exception("Parameter `join_left` must be a list literal. Tuples and other sequence types will lead to cryptic errors from pandas.")
 	
@@ -109,11 +1118,21 @@ def on_slk_intervals(target: pd.DataFrame, data: pd.DataFrame, join_left: List[s
 			else:
 				raise Exception(f"Cannot merge column '{column_action.column_name}' as '{column_action.rename}' into target because the target already contains a column named '{column_action.rename}'.")
 
+	if isinstance(data, PreparedData):
+		if data.join_left != join_left or data.from_to != tuple(from_to):
+			raise Exception(f"`data` was prepared with join_left={data.join_left} and from_to={data.from_to}. It cannot be merged using join_left={join_left} and from_to={tuple(from_to)}.")
+		for column_action in column_actions:
+			if column_action.column_name not in data.columns:
+				raise Exception(f"Cannot merge column '{column_action.column_name}' because it was not included when `data` was prepared.")
+		data_columns = [*data.join_left, *data.from_to, *data.columns]
+	else:
+		data_columns = data.columns
+	
 	missing_columns = []
 	for column_name in join_left+list(from_to):
-		if column_name not in data.columns and column_name not in target.columns:
+		if column_name not in data_columns and column_name not in target.columns:
 			missing_columns.append(f"Column '{column_name}' is missing from both `target` and `data`.")
-		elif column_name not in data.columns:
+		elif column_name not in data_columns:
 			missing_columns.append(f"Column '{column_name}' is missing from `data`.")
 		elif column_name not in target.columns:
 			missing_columns.append(f"Column '{column_name}' is missing from `target`.")
@@ -124,160 +1143,655 @@ def on_slk_intervals(target: pd.DataFrame, data: pd.DataFrame, join_left: List[s
 			"\n".join(missing_columns)
 		)
 
-	# ReIndex data for faster O(N) lookup
-	data = data.assign(data_id=data.index)
-	data = data.set_index([*join_left, 'data_id'])
-	data = data.sort_index()
+	if memory_budget is not None:
+		estimated_bytes = _estimate_memory(target, data, join_left, column_actions, from_to, threads)
+		if estimated_bytes > memory_budget:
+			raise Exception(
+				f"This merge is estimated to need about {estimated_bytes / 2**20:,.1f} MiB of memory, "
+				f"which exceeds the `memory_budget` of {memory_budget / 2**20:,.1f} MiB."
+			)
+
+
+def _action_columns(column_actions: List[Action]) -> List[str]:
+	"""The distinct data columns named by `column_actions`, in order of first use"""
+	return list(dict.fromkeys(column_action.column_name for column_action in column_actions))
+
+
+def _estimate_memory(
+		target: pd.DataFrame,
+		data: Union[pd.DataFrame, PreparedData],
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str],
+		threads: int = 1
+) -> int:
+	"""
+	Roughly estimate the peak memory in bytes used by `on_slk_intervals()`.
 	
-	# Group target data by Road Number and Carriageway
-	try:
-		target_groups = target.groupby(join_left)
-	except KeyError:
-		matching_columns = [col for col in join_left if col in target.columns]
-		raise Exception(f"Parameter join_left={join_left} did not match" + (
-			" any columns in the target DataFrame" if len(matching_columns) == 0
-			else f" all columns in target DataFrame. Only matched columns {matching_columns}"
-		))
+	This counts two copies of the projected data while it is sorted by `prepare()`, the overlap pair table and the
+	arrays derived from it for each action (assuming each data row overlaps about one target row, as is the case for
+	well-formed segmentations), and the copy of the target made by the final join. Object columns are counted by
+	their pointers only, as the copies share the underlying python objects. Each of the `threads` that aggregate
+	actions at once allocates its own arrays derived from the pair table, so those are counted once per thread.
+	"""
+	if isinstance(data, PreparedData):
+		data_rows = len(data.data)
+		estimated_bytes = 0
+	else:
+		data_rows = len(data)
+		projected_columns = list(dict.fromkeys([*join_left, *from_to, *_action_columns(column_actions)]))
+		estimated_bytes = 2 * (
+			sum(int(data[column_name].memory_usage(index=False, deep=False)) for column_name in projected_columns) +
+			int(data.index.memory_usage(deep=False))
+		)
 	
+	estimated_pairs = len(target) + data_rows
+	active_threads = max(min(threads, len(column_actions)), 1)
+	estimated_bytes += estimated_pairs * 8 * (4 + 4 * len(column_actions) * active_threads)
+	estimated_bytes += int(target.memory_usage(index=True, deep=False).sum()) + len(target) * 8 * len(column_actions)
+	return estimated_bytes
+
 
+def _merge_arrays(target: pd.DataFrame, prepared_data: PreparedData, column_actions: List[Action]):
+	"""Return the `(target_from, target_to, data_from, data_to, column_values)` arrays used by the sweep engine"""
+	slk_from, slk_to = prepared_data.from_to
+	return (
+		target[slk_from].to_numpy(),
+		target[slk_to].to_numpy(),
+		prepared_data.data[slk_from].to_numpy(),
+		prepared_data.data[slk_to].to_numpy(),
+		[prepared_data.data[column_action.column_name].to_numpy() for column_action in column_actions],
+	)
+
+
+def _merge_group_table(
+		prepared_data: PreparedData,
+		group_table: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+		target_from: np.ndarray,
+		target_to: np.ndarray,
+		data_from: np.ndarray,
+		data_to: np.ndarray,
+		column_values: List[np.ndarray],
+		column_actions: List[Action],
+		workers: int,
+		profile=NO_PROFILE,
+		threads: int = 1
+) -> Tuple[np.ndarray, list]:
+	"""Run the sweep engine over the target rows listed in `group_table` and return the output of `_aggregate_pairs()`"""
+	if workers == 1 and _can_use_prefix_sums(prepared_data, target_from, target_to, column_actions):
+		with profile.phase("prefix_sums", len(group_table[0])):
+			return _aggregate_prefix_sums(
+				prepared_data,
+				group_table,
+				target_from,
+				target_to,
+				column_actions,
+				profile
+			)
 	
-	# Main Loop
-	for target_group_index, target_group in target_groups:
-		try:
-			data_matching_target_group = data.loc[target_group_index]
-		except KeyError:
-			# There was no data matching the target group. Skip adding output. output to these rows will be NaN for all columns.
+	if workers > 1:
+		# the workers are not profiled, only the time spent in the pool as a whole
+		with profile.phase("process_pool", len(group_table[0])):
+			return _merge_in_process_pool(
+				workers,
+				group_table,
+				target_from,
+				target_to,
+				data_from,
+				data_to,
+				column_values,
+				column_actions
+			)
+	
+	with profile.phase("overlap", len(group_table[0])):
+		target_positions, data_positions = _overlap_pair_table(target_from, target_to, data_from, data_to, *group_table, profile=profile)
+	column_codes = [
+		prepared_data.factorized_column(column_action.column_name) if column_action.aggregation.type == AggregationType.KeepLongest else None
+		for column_action in column_actions
+	]
+	with profile.phase("aggregate", len(target_positions)):
+		return _aggregate_pairs(
+			target_positions,
+			data_positions,
+			target_from,
+			target_to,
+			data_from,
+			data_to,
+			column_values,
+			column_actions,
+			profile,
+			column_codes,
+			threads
+		)
+
+
+class _PrefixSumIndex:
+	"""
+	Cumulative sums of one data column along the SLK axis of each `join_left` group.
+	
+	Within each group the data is sorted by `from`. Only valid when the data rows of every group are disjoint and have
+	positive length, see `_can_use_prefix_sums()`. The rows of a group that overlap a target are then one contiguous
+	range, and any sum over that range is the difference of two cumulative sums. Groups are keyed by the position of
+	their first row in the prepared data.
+	"""
+	def __init__(self, data_from: np.ndarray, data_to: np.ndarray, values: np.ndarray, group_offsets: np.ndarray):
+		self.groups = {}
+		for data_start, data_stop in zip(group_offsets[:-1].tolist(), group_offsets[1:].tolist()):
+			order = np.argsort(data_from[data_start:data_stop], kind="stable")
+			group_from  = data_from[data_start:data_stop][order]
+			group_to    = data_to[data_start:data_stop][order]
+			group_value = values[data_start:data_stop][order]
+			group_len   = group_to - group_from
+			is_valid = ~pd.isna(group_value)
+			if group_value.dtype.kind == "b":
+				# bools are summed as integers, as they are by the other engines
+				group_value = group_value.astype(np.int64)
+			elif group_value.dtype.kind not in "iu":
+				group_value = np.where(is_valid, group_value, 0).astype(float)
+			self.groups[data_start] = (
+				group_from,
+				group_to,
+				group_value,
+				is_valid,
+				group_len,
+				_prefix_sum(group_value),
+				_prefix_sum(is_valid.astype(np.int64)),
+				_prefix_sum(group_value * group_len),
+				_prefix_sum(is_valid * group_len),
+			)
+
+
+def _prefix_sum(values: np.ndarray) -> np.ndarray:
+	"""Cumulative sum with a leading zero, so that the sum of `values[lo:hi]` is `result[hi] - result[lo]`"""
+	result = np.zeros(len(values) + 1, dtype=values.dtype)
+	np.cumsum(values, out=result[1:])
+	return result
+
+
+_ADDITIVE_AGGREGATION_TYPES = (
+	AggregationType.LengthWeightedAverage,
+	AggregationType.ProportionalSum,
+	AggregationType.Sum,
+)
+
+
+def _can_use_prefix_sums(prepared_data: PreparedData, target_from: np.ndarray, target_to: np.ndarray, column_actions: List[Action]) -> bool:
+	"""
+	The prefix sum index can be used when every action is additive along the SLK axis, every column is numeric,
+	every target has positive length, and the data rows within each group are disjoint with positive length.
+	"""
+	if not all(column_action.aggregation.type in _ADDITIVE_AGGREGATION_TYPES for column_action in column_actions):
+		return False
+	if not all(prepared_data.data[column_action.column_name].dtype.kind in "biuf" for column_action in column_actions):
+		return False
+	with np.errstate(invalid="ignore"):
+		if not np.all(target_from < target_to):
+			return False
+	
+	if prepared_data.has_disjoint_groups is None:
+		slk_from, slk_to = prepared_data.from_to
+		data_from = prepared_data.data[slk_from].to_numpy()
+		data_to   = prepared_data.data[slk_to].to_numpy()
+		group_lengths = np.diff(prepared_data.group_offsets)
+		data_group = np.repeat(np.arange(len(group_lengths)), group_lengths)
+		order = np.lexsort((data_from, data_group))
+		sorted_from  = data_from[order]
+		sorted_to    = data_to[order]
+		sorted_group = data_group[order]
+		with np.errstate(invalid="ignore"):
+			prepared_data.has_disjoint_groups = bool(
+				np.all(sorted_from < sorted_to) and
+				np.all((sorted_to[:-1] <= sorted_from[1:]) | (sorted_group[:-1] != sorted_group[1:]))
+			)
+	return prepared_data.has_disjoint_groups
+
+
+def _aggregate_prefix_sums(
+		prepared_data: PreparedData,
+		group_table: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+		target_from: np.ndarray,
+		target_to: np.ndarray,
+		column_actions: List[Action],
+		profile=NO_PROFILE
+) -> Tuple[np.ndarray, list]:
+	"""
+	Compute additive aggregations using the prefix sum index, with two `searchsorted` lookups per target and no
+	overlap pairs at all. Returns the same `(result_targets, column_results)` as `_aggregate_pairs()`.
+	"""
+	target_order, target_offsets, data_starts, data_stops = group_table
+	prefix_sum_indexes = [prepared_data.prefix_sum_index(column_action.column_name) for column_action in column_actions]
+	
+	result_target_parts = []
+	column_result_parts = [([], []) for _ in column_actions]
+	for group in range(len(data_starts)):
+		group_started = profile.clock()
+		target_group_positions = target_order[target_offsets[group]:target_offsets[group + 1]]
+		if data_starts[group] == data_stops[group]:
+			profile.group_finished(group, len(target_group_positions), 0, 0, group_started)
 			continue
-		except TypeError as e:
-			# The datatype of group_index is picky... sometimes it wants a tuple, sometimes it will accept a list
-			# this appears to be a bug or inconsistency with pandas when using multi-index dataframes.
-			print(f"Error: Could not group the following data by {target_group_index}:")
-			print(f"type(group_index)  {type(target_group_index)}:")
-			print("the data:")
-			print(data)
-			raise e
+		group_target_from = target_from[target_group_positions]
+		group_target_to   = target_to[target_group_positions]
+		group_pairs = 0
 		
-		# Iterate row by row through the target group
-		for target_index, target_row in target_group.iterrows():
-			
-			# Select data with overlapping slk interval
-			data_to_aggregate_for_target_group = data_matching_target_group[
-				(data_matching_target_group[slk_from] < target_row[slk_to]) &
-				(data_matching_target_group[slk_to] > target_row[slk_from])
-			]#.copy()
-			# TODO: the copy function on the line above has a lot to do with the slowness of this algorithm
-			#       because all columns are copied, not just the ones we are aggregating, for wide dataframes
-			#       there is potentially a huge amount of memory allocated and deallocated that doesnt need to be.
-			#       only needs to be copied so that the "overlap_len" column can be added. If we can avoid adding
-			#       this column we might do a lot better.
+		for column_action_index, (column_action, prefix_sum_index) in enumerate(zip(column_actions, prefix_sum_indexes)):
+			(
+				group_from, group_to, group_value, is_valid, group_len,
+				prefix_value, prefix_valid, prefix_value_len, prefix_valid_len
+			) = prefix_sum_index.groups[data_starts[group]]
 			
-			# if no data matches the target group then skip
-			if data_to_aggregate_for_target_group.empty:
-				continue
+			# rows lo:hi are exactly the rows overlapping each target
+			lo = np.searchsorted(group_to,   group_target_from, side="right")
+			hi = np.searchsorted(group_from, group_target_to,   side="left")
+			if column_action_index == 0:
+				result_target_parts.append(target_group_positions[hi > lo])
+				group_pairs = int(np.sum(np.maximum(hi - lo, 0)))
 			
-			# compute overlaps for each row of data
-			overlap_min = np.maximum(data_to_aggregate_for_target_group[slk_from], target_row[slk_from])
-			overlap_max = np.minimum(data_to_aggregate_for_target_group[slk_to],   target_row[slk_to])
+			valid_count = prefix_valid[hi] - prefix_valid[lo]
+			has_value = valid_count > 0
 			
-			# overlap_len = np.maximum(overlap_max - overlap_min, 0)  # np.maximum() is not needed due to filters above
-			overlap_len = overlap_max - overlap_min
+			# the first and last overlapping rows may only partly overlap the target. Every row between them is
+			# completely inside the target and is summed using the prefix sums.
+			first = lo[has_value]
+			last  = hi[has_value] - 1
+			has_interior = last > first
+			interior = np.where(has_interior, first + 1, last)
+			first_overlap_len = np.minimum(group_to[first], group_target_to[has_value]) - np.maximum(group_from[first], group_target_from[has_value])
+			last_overlap_len  = np.where(has_interior, np.minimum(group_to[last], group_target_to[has_value]) - group_from[last], 0)
 			
-			# expect this to trigger warning about setting value on view?
-			# does not seem to though
-			#data_to_aggregate_for_target_group["overlap_len"] = overlap_len  # Remove this... there is no reason to attached overlap_len to the original dataframe
+			aggregation_type = column_action.aggregation.type
+			if aggregation_type == AggregationType.LengthWeightedAverage:
+				result = (
+					(group_value[first] * first_overlap_len + (prefix_value_len[last] - prefix_value_len[interior]) + group_value[last] * last_overlap_len) /
+					(is_valid[first]    * first_overlap_len + (prefix_valid_len[last] - prefix_valid_len[interior]) + is_valid[last]    * last_overlap_len)
+				)
 			
-			# for each column of data that we keep, we must aggregate each field down to a single value
-			# create a blank row to store the result of each column
-			aggregated_result_row = []
-			for column_action_index, column_action in enumerate(column_actions):
-
-				column_len_to_aggregate: pd.DataFrame = (
-					data_to_aggregate_for_target_group
-					.loc[:, [column_action.column_name]]
-					.assign(overlap_len=overlap_len)  # assign is done here so that NaN data can be dropped at the same time as the overlap lengths. Later we also benefit from the combination by being able to concurrently sort both columns.
+			elif aggregation_type == AggregationType.ProportionalSum:
+				result = (
+					group_value[first] * first_overlap_len / group_len[first] +
+					(prefix_value[last] - prefix_value[interior]) +
+					group_value[last] * last_overlap_len / group_len[last]
 				)
-				column_len_to_aggregate = column_len_to_aggregate[
-					~ column_len_to_aggregate.iloc[:, 0].isna() &
-					  (column_len_to_aggregate["overlap_len"] > 0)
-				]
-				
-				if column_len_to_aggregate.empty:
-					# Infill with np.nan or we will lose our column position.
-					aggregated_result_row.append(np.nan)
-					continue
-				
-				column_to_aggregate:             pandas.Series = column_len_to_aggregate.iloc[:, 0]
-				column_to_aggregate_overlap_len: pandas.Series = column_len_to_aggregate.iloc[:, 1]
-				
-				if column_action.aggregation.type   == AggregationType.Average:
-					aggregated_result_row.append(
-						column_to_aggregate.mean()
-					)
-					
-				elif column_action.aggregation.type == AggregationType.First:
-					aggregated_result_row.append(column_to_aggregate.iloc[0])
-				
-				elif column_action.aggregation.type == AggregationType.LengthWeightedAverage:
-					total_overlap_length = column_to_aggregate_overlap_len.sum()
-					aggregated_result_row.append(
-						(column_to_aggregate * column_to_aggregate_overlap_len).sum() / total_overlap_length
-					)
-
-				elif column_action.aggregation.type == AggregationType.KeepLongestSegment:
-					aggregated_result_row.append(
-						column_to_aggregate.loc[column_to_aggregate_overlap_len.idxmax()]
-					)
-
-				elif column_action.aggregation.type == AggregationType.KeepLongest:
-					aggregated_result_row.append(
-						column_to_aggregate_overlap_len.groupby(column_to_aggregate).sum().idxmax()
-					)
-
-				elif column_action.aggregation.type == AggregationType.LengthWeightedPercentile:
-					column_len_to_aggregate = column_len_to_aggregate.sort_values(
-						by=column_action.column_name,
-						ascending=True
-					)
-
-					column_to_aggregate:             pandas.Series = column_len_to_aggregate.iloc[:, 0] # TODO: Why is this repeated?
-					column_to_aggregate_overlap_len: pandas.Series = column_len_to_aggregate.iloc[:, 1] # TODO: Why is this repeated?
-					
-					x_coords = (column_to_aggregate_overlap_len.rolling(2).mean()).fillna(0).cumsum()
-					x_coords /= x_coords.iloc[-1]
-					result = np.interp(
-						column_action.aggregation.percentile,
-						x_coords.to_numpy(),
-						column_to_aggregate
-					)
-					aggregated_result_row.append(result)
-
-				elif column_action.aggregation.type == AggregationType.ProportionalSum:
-					# total_overlap_length = column_to_aggregate_overlap_len.sum()
-					data_to_aggregate_for_target_group_slk_length = data_to_aggregate_for_target_group[slk_to]-data_to_aggregate_for_target_group[slk_from]
-					aggregated_result_row.append(
-						(column_to_aggregate * column_to_aggregate_overlap_len/data_to_aggregate_for_target_group_slk_length).sum()
-					)
-				
-				elif column_action.aggregation.type == AggregationType.Sum:
-					aggregated_result_row.append(
-						column_to_aggregate.sum()
-					)
-
-				elif column_action.aggregation.type == AggregationType.IndexOfMax:
-					aggregated_result_row.append(
-						column_to_aggregate.idxmax()
-					)
-				
-				# elif column_action.aggregation.type == AggregationType.SumMaxPerCategory:
-				# 	column_to_aggregate.index
 			
-			result_index.append(target_index)
-			result_rows.append(aggregated_result_row)
-	
-	return target.join(
-		pd.DataFrame(
-			result_rows,
-			columns=[x.rename for x in column_actions],
-			index=result_index
+			elif aggregation_type == AggregationType.Sum:
+				result = prefix_value[last + 1] - prefix_value[first]
+			
+			column_result_parts[column_action_index][0].append(target_group_positions[has_value])
+			column_result_parts[column_action_index][1].append(result)
+		profile.group_finished(group, len(target_group_positions), data_stops[group] - data_starts[group], group_pairs, group_started)
+	
+	if len(result_target_parts) == 0:
+		return np.empty(0, dtype=np.intp), [(np.empty(0, dtype=np.intp), np.empty(0)) for _ in column_actions]
+	
+	result_targets = np.concatenate(result_target_parts)
+	column_results = []
+	for run_target_parts, result_parts in column_result_parts:
+		run_target = np.concatenate(run_target_parts)
+		run_order = np.argsort(run_target)
+		column_results.append((run_target[run_order], np.concatenate(result_parts)[run_order]))
+	return np.sort(result_targets), column_results
+
+
+def _group_table(target: pd.DataFrame, prepared_data: PreparedData) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+	"""
+	Describe where each `join_left` group lives in `target` and in the prepared data.
+	
+	Returns `(target_order, target_offsets, data_starts, data_stops)`; the target positions of group `g` are
+	`target_order[target_offsets[g]:target_offsets[g+1]]` and its data positions are `data_starts[g]:data_stops[g]`.
+	Groups are listed in sorted order of their `join_left` values. Groups with no data are given an empty data range.
+	Target rows with a blank `join_left` value do not belong to any group.
+	"""
+	return _TargetGroups(target, prepared_data.join_left).group_table(prepared_data)
+
+
+class _TargetGroups:
+	"""
+	The `join_left` groups of a target, found once so that they can be matched against any number of prepared datasets.
+	
+	The combined `join_left` value of each target row is encoded as one integer. Each column is first encoded by its
+	position in a sorted dictionary of the values found in that column of the target, and the column codes are then
+	combined, so that codes follow the sorted order of the `join_left` values. The data groups are encoded with the same
+	dictionaries, and a data group whose value is not found in the target is given the code -1, like a blank value.
+	"""
+	def __init__(self, target: pd.DataFrame, join_left: List[str]):
+		self.dictionaries: List[pd.Index] = []
+		
+		# when combining the codes of another column could overflow, the combined codes found so far are renumbered.
+		# The renumbering is recorded so that data groups can be encoded the same way.
+		self.renumberings: List[Optional[np.ndarray]] = []
+		
+		target_code = np.zeros(len(target), dtype=np.int64)
+		target_is_blank = np.zeros(len(target), dtype=bool)
+		code_count = 1
+		for column_name in join_left:
+			target_values = target[column_name]
+			target_is_blank |= target_values.isna().to_numpy()
+			level_code, dictionary = pd.factorize(target_values, sort=True)
+			dictionary = pd.Index(dictionary)
+			
+			renumbering = None
+			if code_count * max(len(dictionary), 1) >= 2**62:
+				renumbering, target_code = np.unique(target_code, return_inverse=True)
+				code_count = len(renumbering)
+			self.dictionaries.append(dictionary)
+			self.renumberings.append(renumbering)
+			
+			target_code = target_code * len(dictionary) + level_code
+			code_count *= max(len(dictionary), 1)
+		target_code[target_is_blank] = -1
+		
+		keyed_positions = np.flatnonzero(target_code >= 0)
+		self.target_order: np.ndarray = keyed_positions[np.argsort(target_code[keyed_positions], kind="stable")].astype(np.intp)
+		self.group_code, group_size = np.unique(target_code[self.target_order], return_counts=True)
+		self.target_offsets: np.ndarray = np.zeros(len(self.group_code) + 1, dtype=np.intp)
+		np.cumsum(group_size, out=self.target_offsets[1:])
+	
+	def group_table(self, prepared_data: PreparedData) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+		"""The group table of this target merged with `prepared_data`, see `_group_table()`"""
+		group_key_codes = prepared_data.group_key_codes
+		data_group_code = np.zeros(len(group_key_codes), dtype=np.int64)
+		data_group_is_unmatched = np.zeros(len(group_key_codes), dtype=bool)
+		for level, (dictionary, renumbering) in enumerate(zip(self.dictionaries, self.renumberings)):
+			if renumbering is not None:
+				renumbered = np.minimum(np.searchsorted(renumbering, data_group_code), len(renumbering) - 1)
+				data_group_is_unmatched |= renumbering[renumbered] != data_group_code
+				data_group_code = renumbered
+			data_level_code = dictionary.get_indexer(prepared_data.data.index.levels[level])[group_key_codes[:, level]]
+			data_group_is_unmatched |= (group_key_codes[:, level] < 0) | (data_level_code < 0)
+			data_group_code = data_group_code * len(dictionary) + data_level_code
+		data_group_code[data_group_is_unmatched] = -1
+		
+		# the prepared data is sorted by its join_left values, but only sorted by code if both sort values the same way
+		data_group_order = np.argsort(data_group_code, kind="stable")
+		sorted_data_group_code = data_group_code[data_group_order]
+		found = np.minimum(np.searchsorted(sorted_data_group_code, self.group_code), max(len(sorted_data_group_code) - 1, 0))
+		if len(sorted_data_group_code) > 0:
+			has_data = sorted_data_group_code[found] == self.group_code
+			data_group = data_group_order[found]
+		else:
+			has_data = np.zeros(len(self.group_code), dtype=bool)
+			data_group = found
+		
+		# only index the offsets of groups that have data; empty data has no groups, so `data_group + 1` is out of range
+		data_starts = np.zeros(len(self.group_code), dtype=np.intp)
+		data_stops  = np.zeros(len(self.group_code), dtype=np.intp)
+		data_starts[has_data] = prepared_data.group_offsets[data_group[has_data]]
+		data_stops[has_data]  = prepared_data.group_offsets[data_group[has_data] + 1]
+		return self.target_order, self.target_offsets, data_starts, data_stops
+
+
+# aggregations of a non-numeric column that the process pool can compute from sorted factor codes, and those whose
+# results are values of the column, which must be decoded
+_POOL_CODED_AGGREGATION_TYPES = (
+	AggregationType.First,
+	AggregationType.KeepLongest,
+	AggregationType.KeepLongestSegment,
+	AggregationType.Max,
+	AggregationType.IndexOfMax,
+	AggregationType.Count,
+)
+_POOL_DECODED_AGGREGATION_TYPES = (
+	AggregationType.First,
+	AggregationType.KeepLongest,
+	AggregationType.KeepLongestSegment,
+	AggregationType.Max,
+)
+
+
+def _merge_in_process_pool(
+		workers: int,
+		group_table: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+		target_from: np.ndarray,
+		target_to: np.ndarray,
+		data_from: np.ndarray,
+		data_to: np.ndarray,
+		column_values: List[np.ndarray],
+		column_actions: List[Action]
+) -> Tuple[np.ndarray, list]:
+	"""
+	Spread the `join_left` groups over a pool of worker processes and gather the results.
+	
+	Arrays reach the workers as memory-mapped `.npy` files in a temporary directory, so only the list of groups for
+	each shard is pickled. Non-numeric columns are written as sorted factor codes (NaN where the value is missing),
+	which order, compare and select exactly like the values they encode. Results that are values of the column are
+	decoded again once the workers finish; Count and IndexOfMax results are used as they are.
+	"""
+	target_order, target_offsets, data_starts, data_stops = group_table
+	
+	encoded_column_values = []
+	column_uniques = []
+	for column_action, values in zip(column_actions, column_values):
+		if values.dtype.kind in "biuf":
+			encoded_column_values.append(values)
+			column_uniques.append(None)
+			continue
+		if column_action.aggregation.type not in _POOL_CODED_AGGREGATION_TYPES:
+			raise Exception(f"Cannot compute {column_action.aggregation.type.name} of the non-numeric column '{column_action.column_name}' when `workers` is greater than 1.")
+		codes, uniques = pd.factorize(values, sort=True)
+		encoded_column_values.append(np.where(codes == -1, np.nan, codes))
+		column_uniques.append(uniques if column_action.aggregation.type in _POOL_DECODED_AGGREGATION_TYPES else None)
+	
+	# Balance the shards by giving each group, largest first, to the shard with the least work so far
+	group_cost = (target_offsets[1:] - target_offsets[:-1]) + (data_stops - data_starts)
+	shard_cost = np.zeros(workers)
+	shard_groups = [[] for _ in range(workers)]
+	for group in np.argsort(-group_cost, kind="stable"):
+		shard = np.argmin(shard_cost)
+		shard_groups[shard].append(group)
+		shard_cost[shard] += group_cost[group]
+	
+	with tempfile.TemporaryDirectory(prefix="dtimsprep_") as array_directory:
+		arrays = {
+			"target_from":    target_from,
+			"target_to":      target_to,
+			"data_from":      data_from,
+			"data_to":        data_to,
+			"target_order":   target_order,
+			"target_offsets": target_offsets,
+			"data_starts":    data_starts,
+			"data_stops":     data_stops,
+			**{f"column_{column_action_index}": values for column_action_index, values in enumerate(encoded_column_values)}
+		}
+		for name, array in arrays.items():
+			np.save(os.path.join(array_directory, f"{name}.npy"), array, allow_pickle=False)
+		
+		with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+			shard_results = list(executor.map(
+				_merge_shard,
+				[array_directory] * workers,
+				[np.array(groups, dtype=np.intp) for groups in shard_groups],
+				[column_actions] * workers
+			))
+	
+	result_targets = np.concatenate([shard_result_targets for shard_result_targets, _ in shard_results])
+	result_order = np.argsort(result_targets)
+	column_results = []
+	for column_action_index, uniques in enumerate(column_uniques):
+		run_targets = np.concatenate([shard_column_results[column_action_index][0] for _, shard_column_results in shard_results])
+		results     = np.concatenate([shard_column_results[column_action_index][1] for _, shard_column_results in shard_results])
+		run_order = np.argsort(run_targets)
+		run_targets = run_targets[run_order]
+		results     = results[run_order]
+		if uniques is not None and len(results) > 0:
+			results = uniques[results.astype(np.intp)]
+		column_results.append((run_targets, results))
+	return result_targets[result_order], column_results
+
+
+def _result_dtypes(prepared_data: PreparedData, column_actions: List[Action]) -> list:
+	"""
+	The dtype of each result column, fixed from the data column and action alone. Numeric results are float64 and bool
+	results are object, so that both can hold blanks; other results keep the dtype of the data column.
+	"""
+	result_dtypes = []
+	for column_action in column_actions:
+		aggregation_type = column_action.aggregation.type
+		if aggregation_type == AggregationType.IndexOfMax:
+			source_dtype = prepared_data.data.index.levels[-1].dtype
+		elif aggregation_type in (AggregationType.First, AggregationType.KeepLongest, AggregationType.KeepLongestSegment, AggregationType.Max):
+			source_dtype = prepared_data.data[column_action.column_name].dtype
+		else:
+			source_dtype = np.dtype(float)
+		
+		if source_dtype.kind in "iuf":
+			result_dtypes.append(np.dtype(float))
+		elif source_dtype.kind == "b":
+			result_dtypes.append(np.dtype(object))
+		else:
+			result_dtypes.append(source_dtype)
+	return result_dtypes
+
+
+def _result_frame(
+		target: pd.DataFrame,
+		data: pd.DataFrame,
+		result_targets: np.ndarray,
+		column_results: list,
+		column_actions: List[Action],
+		target_positions: Optional[np.ndarray] = None,
+		dtypes: Optional[list] = None
+) -> pd.DataFrame:
+	"""
+	Scatter the output of `_aggregate_pairs` into one buffer per column action, indexed by target position.
+	
+	The result has one row for each of the sorted `target_positions` (every target row if omitted) and the matching
+	index labels of `target`, so it can be placed beside the target by position without an index join. Rows that
+	matched no data are NaN. The columns are cast to `dtypes` if given, otherwise their dtypes are inferred.
+	"""
+	column_names = [x.rename for x in column_actions]
+	if target_positions is None:
+		target_positions = np.arange(len(target))
+	
+	result_columns = {}
+	for column_action_index, (column_action, (run_target, result)) in enumerate(zip(column_actions, column_results)):
+		if len(result_targets) == 0:
+			result_columns[column_action_index] = np.full(len(target_positions), np.nan, dtype=object)
+			continue
+		
+		if column_action.aggregation.type == AggregationType.IndexOfMax:
+			result = data.index.get_level_values("data_id").to_numpy()[result]
+		
+		if len(run_target) == len(target_positions):
+			# every row has a value, so the column keeps its dtype
+			result_columns[column_action_index] = result
+		else:
+			result_column = np.full(len(target_positions), np.nan, dtype=float if result.dtype.kind in "iuf" else object)
+			result_column[np.searchsorted(target_positions, run_target)] = result
+			result_columns[column_action_index] = result_column
+	
+	result = pd.DataFrame(result_columns, index=target.index[target_positions])
+	if dtypes is not None:
+		result = result.astype(dict(enumerate(dtypes)))
+	elif len(result_targets) > 0:
+		result = result.infer_objects()
+	result.columns = column_names
+	return result
+
+
+def _aggregate_row(data_to_aggregate_for_target_group: pd.DataFrame, target_from, target_to, column_actions: List[Action], from_to: Tuple[str, str]) -> list:
+	"""Aggregate the data rows overlapping a single target row down to one value per column action."""
+	slk_from, slk_to = from_to
+	
+	# compute overlaps for each row of data
+	overlap_min = np.maximum(data_to_aggregate_for_target_group[slk_from], target_from)
+	overlap_max = np.minimum(data_to_aggregate_for_target_group[slk_to],   target_to)
+	
+	# overlap_len = np.maximum(overlap_max - overlap_min, 0)  # np.maximum() is not needed due to filters above
+	overlap_len = overlap_max - overlap_min
+	
+	# for each column of data that we keep, we must aggregate each field down to a single value
+	# create a blank row to store the result of each column
+	aggregated_result_row = []
+	for column_action_index, column_action in enumerate(column_actions):
+
+		column_len_to_aggregate: pd.DataFrame = (
+			data_to_aggregate_for_target_group
+			.loc[:, [column_action.column_name]]
+			.assign(overlap_len=overlap_len)  # assign is done here so that NaN data can be dropped at the same time as the overlap lengths. Later we also benefit from the combination by being able to concurrently sort both columns.
 		)
-	)
+		column_len_to_aggregate = column_len_to_aggregate[
+			~ column_len_to_aggregate.iloc[:, 0].isna() &
+			  (column_len_to_aggregate["overlap_len"] > 0)
+		]
+		
+		if column_len_to_aggregate.empty:
+			# Infill with np.nan or we will lose our column position.
+			aggregated_result_row.append(np.nan)
+			continue
+		
+		column_to_aggregate:             pandas.Series = column_len_to_aggregate.iloc[:, 0]
+		column_to_aggregate_overlap_len: pandas.Series = column_len_to_aggregate.iloc[:, 1]
+		
+		if column_action.aggregation.type   == AggregationType.Average:
+			aggregated_result_row.append(
+				column_to_aggregate.mean()
+			)
+			
+		elif column_action.aggregation.type == AggregationType.First:
+			aggregated_result_row.append(column_to_aggregate.iloc[0])
+		
+		elif column_action.aggregation.type == AggregationType.LengthWeightedAverage:
+			total_overlap_length = column_to_aggregate_overlap_len.sum()
+			aggregated_result_row.append(
+				(column_to_aggregate * column_to_aggregate_overlap_len).sum() / total_overlap_length
+			)
+
+		elif column_action.aggregation.type == AggregationType.KeepLongestSegment:
+			aggregated_result_row.append(
+				column_to_aggregate.loc[column_to_aggregate_overlap_len.idxmax()]
+			)
+
+		elif column_action.aggregation.type == AggregationType.KeepLongest:
+			aggregated_result_row.append(
+				column_to_aggregate_overlap_len.groupby(column_to_aggregate).sum().idxmax()
+			)
+
+		elif column_action.aggregation.type == AggregationType.LengthWeightedPercentile:
+			column_len_to_aggregate = column_len_to_aggregate.sort_values(
+				by=column_action.column_name,
+				ascending=True,
+				kind="stable"
+			)
+
+			column_to_aggregate:             pandas.Series = column_len_to_aggregate.iloc[:, 0] # TODO: Why is this repeated?
+			column_to_aggregate_overlap_len: pandas.Series = column_len_to_aggregate.iloc[:, 1] # TODO: Why is this repeated?
+			
+			x_coords = (column_to_aggregate_overlap_len.rolling(2).mean()).fillna(0).cumsum()
+			x_coords /= x_coords.iloc[-1]
+			result = np.interp(
+				column_action.aggregation.percentile,
+				x_coords.to_numpy(),
+				column_to_aggregate
+			)
+			aggregated_result_row.append(result)
+
+		elif column_action.aggregation.type == AggregationType.ProportionalSum:
+			# total_overlap_length = column_to_aggregate_overlap_len.sum()
+			data_to_aggregate_for_target_group_slk_length = data_to_aggregate_for_target_group[slk_to]-data_to_aggregate_for_target_group[slk_from]
+			aggregated_result_row.append(
+				(column_to_aggregate * column_to_aggregate_overlap_len/data_to_aggregate_for_target_group_slk_length).sum()
+			)
+		
+		elif column_action.aggregation.type == AggregationType.Sum:
+			aggregated_result_row.append(
+				column_to_aggregate.sum()
+			)
+
+		elif column_action.aggregation.type == AggregationType.IndexOfMax:
+			aggregated_result_row.append(
+				column_to_aggregate.idxmax()
+			)
+		
+		elif column_action.aggregation.type == AggregationType.Count:
+			aggregated_result_row.append(
+				len(column_to_aggregate)
+			)
+		
+		elif column_action.aggregation.type == AggregationType.Max:
+			aggregated_result_row.append(
+				column_to_aggregate.max()
+			)
+		
+		# elif column_action.aggregation.type == AggregationType.SumMaxPerCategory:
+		# 	column_to_aggregate.index
+
+	return aggregated_result_row
@@ -0,0 +1,129 @@
+import importlib.util
+import json
+import os
+from typing import Optional, List, Tuple
+
+import pandas as pd
+
+from dtimsprep.core import Action, _expand_actions
+
+# the schema of every dataset written by `write_partitioned()` is kept in this file, along with the partition columns
+_COMMON_METADATA = "_common_metadata"
+_PARTITION_BY_KEY = b"dtimsprep.partition_by"
+
+
+def _require_pyarrow():
+	if importlib.util.find_spec("pyarrow") is None:
+		raise Exception("Reading and writing Parquet datasets requires the `pyarrow` package. Please install it with `pip install pyarrow`.")
+
+
+def write_partitioned(frame: pd.DataFrame, directory: str, partition_by: List[str]):
+	"""
+	Write `frame` to `directory` as a Parquet dataset with one folder for each distinct value of the `partition_by`
+	columns, for example `road=H001/`. The index is kept. Partitions already in `directory` are replaced when `frame`
+	has rows for them, and kept otherwise.
+	"""
+	_require_pyarrow()
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+
+	if not isinstance(partition_by, list):
+		raise Exception("Parameter `partition_by` must be a list literal.")
+	missing_columns = [column_name for column_name in partition_by if column_name not in frame.columns]
+	if len(missing_columns) > 0:
+		raise Exception(f"Cannot write dataset. Partition columns {missing_columns} are missing from `frame`.")
+
+	table = pa.Table.from_pandas(frame, preserve_index=True)
+	pq.write_to_dataset(
+		table,
+		directory,
+		partition_cols=partition_by,
+		existing_data_behavior="delete_matching",
+		# pyarrow refuses to write more than 1024 partitions by default, fewer than the roads of a state network
+		max_partitions=max(len(frame), 1)
+	)
+	pq.write_metadata(
+		table.schema.with_metadata({**table.schema.metadata, _PARTITION_BY_KEY: json.dumps(partition_by).encode()}),
+		os.path.join(directory, _COMMON_METADATA)
+	)
+
+
+def read_partitioned(
+		directory: str,
+		columns: Optional[List[str]] = None,
+		partitions: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
+	"""
+	Read a dataset written by `write_partitioned()`, with its index.
+
+	Only the listed `columns` are read (all of them if omitted). If `partitions` is given only rows whose values in the
+	columns of `partitions` match a whole row of `partitions` are returned; whole partition folders are skipped without
+	being opened, and other columns are filtered using the statistics stored in each file. Rows of `partitions` with a
+	blank value match nothing.
+	"""
+	_require_pyarrow()
+	import pyarrow as pa
+	import pyarrow.dataset as ds
+	import pyarrow.parquet as pq
+
+	metadata_path = os.path.join(directory, _COMMON_METADATA)
+	if not os.path.exists(metadata_path):
+		raise Exception(f"'{directory}' is not a dataset written by `write_partitioned()`. The file '{_COMMON_METADATA}' is missing.")
+	schema = pq.read_schema(metadata_path)
+	partition_by = json.loads(schema.metadata[_PARTITION_BY_KEY])
+	dataset = ds.dataset(
+		directory,
+		schema=schema,
+		format="parquet",
+		partitioning=ds.partitioning(pa.schema([schema.field(column_name) for column_name in partition_by]), flavor="hive")
+	)
+
+	if columns is not None:
+		missing_columns = [column_name for column_name in columns if column_name not in schema.names]
+		if len(missing_columns) > 0:
+			raise Exception(f"Columns {missing_columns} are missing from the dataset in '{directory}'.")
+		index_columns = [column_name for column_name in schema.pandas_metadata["index_columns"] if isinstance(column_name, str)]
+		columns = list(dict.fromkeys([*columns, *index_columns]))
+
+	row_filter = None
+	key_table = None
+	if partitions is not None:
+		keys = partitions.dropna().drop_duplicates()
+		key_table = pa.table({column_name: pa.array(keys[column_name], type=schema.field(column_name).type) for column_name in keys.columns})
+		for column_name in keys.columns:
+			column_filter = ds.field(column_name).isin(key_table[column_name].unique())
+			row_filter = column_filter if row_filter is None else row_filter & column_filter
+
+	table = dataset.to_table(columns=columns, filter=row_filter)
+	if key_table is not None and key_table.num_columns > 1:
+		# the filter above matches every combination of the values in each column, which is fast to apply to whole
+		# partitions and row groups. Keep only the rows whose combination of values is a row of `partitions`.
+		# The join does not keep the column order or the pandas metadata that restores the index, so put both back.
+		table = (
+			table.join(key_table, keys=key_table.column_names, join_type="left semi")
+			.select(table.column_names)
+			.replace_schema_metadata(table.schema.metadata)
+		)
+
+	# split_blocks and self_destruct let numeric columns without blanks become DataFrame columns without a copy, and
+	# release each Arrow column as soon as it has been converted
+	return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def read_for_merge(
+		directory: str,
+		target: pd.DataFrame,
+		join_left: List[str],
+		column_actions: List[Action],
+		from_to: Tuple[str, str]
+) -> pd.DataFrame:
+	"""
+	Read just the part of a dataset written by `write_partitioned()` that `merge.on_slk_intervals()` needs for these
+	parameters: the `join_left`, `from_to` and action columns of the rows whose `join_left` values appear in `target`.
+	"""
+	action_columns = [column_action.column_name for column_action in _expand_actions(column_actions)]
+	return read_partitioned(
+		directory,
+		columns=list(dict.fromkeys([*join_left, *from_to, *action_columns])),
+		partitions=target.loc[:, join_left].drop_duplicates()
+	)
@@ -0,0 +1,123 @@
+import contextlib
+import threading
+import time
+from typing import Optional, List, Dict, Callable, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+	# pandas is only imported when a report is requested, so that `dtimsprep.core` can be used without it
+	import pandas as pd
+
+
+class MergeProgress:
+	def __init__(self, done_rows: int, total_rows: int, elapsed_seconds: float, eta_seconds: Optional[float]):
+		"""Passed to the `progress` callback of `MergeProfile` each time a `join_left` group is finished"""
+		self.done_rows: int = done_rows
+		self.total_rows: int = total_rows
+		self.elapsed_seconds: float = elapsed_seconds
+		self.eta_seconds: Optional[float] = eta_seconds
+
+	def __repr__(self):
+		eta = "unknown" if self.eta_seconds is None else f"{self.eta_seconds:.1f}s"
+		return f"MergeProgress({self.done_rows}/{self.total_rows} target rows, elapsed {self.elapsed_seconds:.1f}s, eta {eta})"
+
+
+class MergeProfile:
+	def __init__(self, progress: Optional[Callable[[MergeProgress], Any]] = None):
+		"""
+		Pass an instance to the `profile` parameter of `merge.on_slk_intervals()` to record where the time goes.
+
+		After the merge, `phases()`, `groups()` and `aggregations()` return the wall time and row counts of each phase,
+		each `join_left` group, and each aggregation type. If a `progress` callback is given it is called with a
+		`MergeProgress` each time a group is finished.
+		"""
+		self.progress: Optional[Callable[[MergeProgress], Any]] = progress
+		self.phase_seconds: Dict[str, float] = {}
+		self.phase_rows: Dict[str, int] = {}
+		self.aggregation_seconds: Dict[str, float] = {}
+		self.aggregation_rows: Dict[str, int] = {}
+		self.group_keys: Optional["pd.DataFrame"] = None
+		self.group_records: List[tuple] = []
+		self.total_rows: int = 0
+		self.done_rows: int = 0
+		self.start_time: Optional[float] = None
+		self.lock = threading.Lock()
+
+	def start(self, total_rows: int, group_keys: "pd.DataFrame"):
+		"""`group_keys` holds the `join_left` values of each group, one row per group"""
+		self.total_rows = total_rows
+		self.group_keys = group_keys
+		self.done_rows = 0
+		self.start_time = time.perf_counter()
+
+	def clock(self) -> float:
+		return time.perf_counter()
+
+	@contextlib.contextmanager
+	def phase(self, name: str, rows: int = 0):
+		started = time.perf_counter()
+		yield
+		self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + time.perf_counter() - started
+		self.phase_rows[name] = self.phase_rows.get(name, 0) + rows
+
+	def aggregation_finished(self, name: str, rows: int, started: float):
+		# may be called from several threads at once, see the `threads` parameter of `merge.on_slk_intervals()`
+		finished = time.perf_counter()
+		with self.lock:
+			self.aggregation_seconds[name] = self.aggregation_seconds.get(name, 0.0) + finished - started
+			self.aggregation_rows[name] = self.aggregation_rows.get(name, 0) + rows
+
+	def group_finished(self, group: int, target_rows: int, data_rows: int, pairs: int, started: float):
+		finished = time.perf_counter()
+		self.group_records.append((group, target_rows, data_rows, pairs, finished - started))
+		self.done_rows += target_rows
+		if self.progress is not None:
+			elapsed_seconds = finished - self.start_time
+			self.progress(MergeProgress(
+				self.done_rows,
+				self.total_rows,
+				elapsed_seconds,
+				elapsed_seconds / self.done_rows * (self.total_rows - self.done_rows) if self.done_rows > 0 else None
+			))
+
+	def phases(self) -> "pd.DataFrame":
+		import pandas as pd
+		return pd.DataFrame({
+			"seconds": pd.Series(self.phase_seconds, dtype=float),
+			"rows":    pd.Series(self.phase_rows, dtype=int),
+		})
+
+	def aggregations(self) -> "pd.DataFrame":
+		import pandas as pd
+		return pd.DataFrame({
+			"seconds": pd.Series(self.aggregation_seconds, dtype=float),
+			"rows":    pd.Series(self.aggregation_rows, dtype=int),
+		})
+
+	def groups(self) -> "pd.DataFrame":
+		import pandas as pd
+		records = pd.DataFrame(self.group_records, columns=["group", "target_rows", "data_rows", "pairs", "seconds"])
+		group_keys = self.group_keys.iloc[records["group"].to_numpy()].reset_index(drop=True)
+		return pd.concat([group_keys, records.drop(columns="group")], axis=1)
+
+
+class _NoProfile:
+	"""Stands in for `MergeProfile` when profiling is not requested. Every method does nothing."""
+	_NULL_CONTEXT = contextlib.nullcontext()
+
+	def start(self, total_rows, group_keys):
+		pass
+
+	def clock(self):
+		return 0.0
+
+	def phase(self, name, rows=0):
+		return self._NULL_CONTEXT
+
+	def aggregation_finished(self, name, rows, started):
+		pass
+
+	def group_finished(self, group, target_rows, data_rows, pairs, started):
+		pass
+
+
+NO_PROFILE = _NoProfile()
@@ -0,0 +1,165 @@
+from typing import Optional, List, Tuple, Dict
+
+import numpy as np
+import pandas as pd
+
+from dtimsprep.merge import Action, AggregationType, overlay, _expand_actions, _action_columns
+
+# actions with these aggregations describe categories; any change of value is a change point. Every other action
+# describes a measurement, which changes when it moves further than its tolerance from the section average.
+_CATEGORICAL_AGGREGATION_TYPES = (
+	AggregationType.First,
+	AggregationType.KeepLongest,
+	AggregationType.KeepLongestSegment,
+)
+
+
+def homogeneous_sections(
+		datasets: List[Tuple[pd.DataFrame, List[Action]]],
+		join_left: List[str],
+		from_to: Tuple[str, str],
+		min_length: float = 0,
+		max_length: float = np.inf,
+		tolerances: Optional[Dict[str, float]] = None
+) -> pd.DataFrame:
+	"""
+	Build a segmentation whose sections are homogeneous in the columns used by the `column_actions` of each
+	`(data, column_actions)` pair in `datasets`, and that can be used directly as the `target` of
+	`merge.on_slk_intervals()`.
+
+	The data is first split at every breakpoint with `merge.overlay()`. One pass along each road then starts a new
+	section at each change point: where a categorical column (`First`, `KeepLongest`) changes value, or a numeric
+	column moves more than `tolerances[column_name]` (default 0) away from the length weighted average of the section
+	so far. Change points are ignored until a section is at least `min_length` long, and a section is ended early
+	rather than grow beyond `max_length`. Sections never span gaps in the data or cross `join_left` groups.
+	
+	`max_length` takes priority over `min_length`: a section shorter than `min_length` is still ended where the next
+	piece of data would take it beyond `max_length`. Sections can also be short at gaps and at the end of each group.
+	"""
+	if min_length < 0 or max_length <= 0 or min_length > max_length:
+		raise Exception(f"Parameters `min_length` and `max_length` must satisfy 0 <= min_length <= max_length and max_length > 0. Got min_length={min_length} and max_length={max_length}.")
+	tolerances = {} if tolerances is None else tolerances
+
+	categorical_columns = []
+	numeric_columns = []
+	for data, column_actions in datasets:
+		for column_action in _expand_actions(column_actions):
+			if column_action.aggregation.type in _CATEGORICAL_AGGREGATION_TYPES:
+				categorical_columns.append(column_action.column_name)
+			else:
+				if not pd.api.types.is_numeric_dtype(data[column_action.column_name]):
+					raise Exception(f"Column '{column_action.column_name}' is used with {column_action.aggregation.type.name}, so it must be numeric to find change points in it.")
+				numeric_columns.append(column_action.column_name)
+	categorical_columns = list(dict.fromkeys(categorical_columns))
+	numeric_columns = [column_name for column_name in dict.fromkeys(numeric_columns) if column_name not in categorical_columns]
+	unknown_tolerances = [column_name for column_name in tolerances if column_name not in numeric_columns]
+	if len(unknown_tolerances) > 0:
+		raise Exception(f"`tolerances` were given for {unknown_tolerances}, which are not numeric columns of any action.")
+
+	slk_from, slk_to = from_to
+	pieces = _split_long_pieces(
+		overlay([(data, _action_columns(column_actions)) for data, column_actions in datasets], join_left, from_to),
+		from_to,
+		max_length
+	)
+	if len(pieces) == 0:
+		return pieces.loc[:, [*join_left, slk_from, slk_to]].reset_index(drop=True)
+
+	piece_from = pieces[slk_from].to_numpy()
+	piece_to   = pieces[slk_to].to_numpy()
+	group = pieces.groupby(join_left, sort=False).ngroup().to_numpy()
+	# a new section must start at the start of each group and after each gap
+	is_forced_start = np.append(True, (group[1:] != group[:-1]) | (piece_from[1:] != piece_to[:-1]))
+	# blank values are given the same code as each other, so a blank followed by a blank is not a change
+	category_codes = np.empty((len(pieces), len(categorical_columns)), dtype=np.intp)
+	for index, column_name in enumerate(categorical_columns):
+		category_codes[:, index] = pd.factorize(pieces[column_name])[0]
+	is_category_change = np.append(True, np.any(category_codes[1:] != category_codes[:-1], axis=1))
+
+	section_start = _change_points(
+		piece_from.tolist(),
+		piece_to.tolist(),
+		is_forced_start.tolist(),
+		is_category_change.tolist(),
+		[pieces[column_name].to_numpy(dtype=float).tolist() for column_name in numeric_columns],
+		[tolerances.get(column_name, 0) for column_name in numeric_columns],
+		min_length,
+		max_length
+	)
+
+	section_last = np.append(section_start[1:], len(pieces)) - 1
+	sections = pieces.iloc[section_start].loc[:, join_left].reset_index(drop=True)
+	sections[slk_from] = piece_from[section_start]
+	sections[slk_to]   = piece_to[section_last]
+	return sections
+
+
+def _split_long_pieces(pieces: pd.DataFrame, from_to: Tuple[str, str], max_length: float) -> pd.DataFrame:
+	"""Cut each piece longer than `max_length` into the fewest equal parts that are short enough"""
+	slk_from, slk_to = from_to
+	if np.isinf(max_length):
+		return pieces
+	length = (pieces[slk_to] - pieces[slk_from]).to_numpy()
+	part_count = np.maximum(np.ceil(length / max_length), 1).astype(np.intp)
+	part = np.arange(part_count.sum()) - np.repeat(np.cumsum(part_count) - part_count, part_count)
+	pieces = pieces.iloc[np.repeat(np.arange(len(pieces)), part_count)].reset_index(drop=True)
+	part_from = pieces[slk_from].to_numpy() + np.repeat(length, part_count) * part / np.repeat(part_count, part_count)
+	part_to   = pieces[slk_from].to_numpy() + np.repeat(length, part_count) * (part + 1) / np.repeat(part_count, part_count)
+	if pd.api.types.is_integer_dtype(pieces[slk_from]):
+		# keep integer chainages integer. Parts of a piece still meet, because both ends are rounded the same way.
+		part_from = np.round(part_from)
+		part_to   = np.round(part_to)
+	pieces[slk_from] = part_from.astype(pieces[slk_from].dtype)
+	pieces[slk_to]   = part_to.astype(pieces[slk_to].dtype)
+	return pieces
+
+
+def _change_points(
+		piece_from: list,
+		piece_to: list,
+		is_forced_start: list,
+		is_category_change: list,
+		numeric_values: List[list],
+		numeric_tolerances: List[float],
+		min_length: float,
+		max_length: float
+) -> np.ndarray:
+	"""
+	The sequential pass of `homogeneous_sections()`. Returns the position of the first piece of each section.
+
+	The inputs are python lists, since reading single elements from lists is much faster than from numpy arrays.
+	"""
+	section_start = []
+	section_from = 0
+	value_sums = [0.0] * len(numeric_values)
+	value_lengths = [0.0] * len(numeric_values)
+	for position in range(len(piece_from)):
+		piece_length = piece_to[position] - piece_from[position]
+		is_start = is_forced_start[position]
+		if not is_start:
+			section_length = piece_from[position] - section_from
+			if section_length + piece_length > max_length:
+				is_start = True
+			elif section_length >= min_length:
+				is_start = is_category_change[position]
+				for values, tolerance, value_sum, value_length in zip(numeric_values, numeric_tolerances, value_sums, value_lengths):
+					if is_start:
+						break
+					value = values[position]
+					if value_length == 0:
+						# the section so far is blank in this column
+						is_start = value == value
+					else:
+						is_start = value != value or abs(value - value_sum / value_length) > tolerance
+
+		if is_start:
+			section_start.append(position)
+			section_from = piece_from[position]
+			value_sums = [0.0] * len(numeric_values)
+			value_lengths = [0.0] * len(numeric_values)
+		for index, values in enumerate(numeric_values):
+			value = values[position]
+			if value == value:
+				value_sums[index] += value * piece_length
+				value_lengths[index] += piece_length
+	return np.array(section_start, dtype=np.intp)
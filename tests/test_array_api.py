@@ -0,0 +1,72 @@
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_array_api_matches_on_slk_intervals(seed):
+	segments, data = random_network(seed)
+	# arrays have no row labels, so IndexOfMax returns positions. Compare against data labelled by position.
+	data = data.reset_index(drop=True)
+	array_actions = [column_action for column_action in column_actions if column_action.aggregation.type != merge.AggregationType.KeepLongestSegment]
+	
+	result = merge.on_slk_interval_arrays(
+		{column_name: segments[column_name].to_numpy() for column_name in segments.columns},
+		{column_name: data[column_name].to_numpy() for column_name in data.columns},
+		["road", "cwy"],
+		array_actions,
+		("slk_from", "slk_to")
+	)
+	expected = merge.on_slk_intervals(segments, data, ["road", "cwy"], array_actions, ("slk_from", "slk_to"))
+	
+	assert list(result.keys()) == [column_action.rename for column_action in array_actions]
+	pd.testing.assert_frame_equal(
+		pd.DataFrame(result, index=segments.index).infer_objects(),
+		expected.loc[:, list(result.keys())],
+		check_dtype=False
+	)
+
+
+def test_array_api_structured_arrays():
+	target = np.array([("a", 0, 10), ("a", 10, 20), ("b", 0, 10), ("c", 0, 10)], dtype=[("road", "U1"), ("slk_from", int), ("slk_to", int)])
+	data = np.array([("b", 0, 5, 1.0), ("a", 5, 15, 2.0), ("a", 15, 20, 4.0), ("b", 5, 10, 3.0)], dtype=[("road", "U1"), ("slk_from", int), ("slk_to", int), ("measure", float)])
+	result = merge.on_slk_interval_arrays(target, data, ["road"], [
+		merge.Action("measure", merge.Aggregation.LengthWeightedAverage()),
+		merge.Action("measure", merge.Aggregation.IndexOfMax(), rename="argmax"),
+	], ("slk_from", "slk_to"))
+	np.testing.assert_array_equal(result["measure"], [2.0, 3.0, 2.0, np.nan])
+	np.testing.assert_array_equal(result["argmax"], [1, 2, 3, np.nan])
+
+
+def test_array_api_does_not_import_pandas():
+	script = """
+import sys
+import numpy as np
+from dtimsprep.core import on_slk_interval_arrays, Action, Aggregation
+result = on_slk_interval_arrays(
+	{"road": np.array(["a", "a"]), "slk_from": np.array([0, 10]), "slk_to": np.array([10, 20])},
+	{"road": np.array(["a"]), "slk_from": np.array([5]), "slk_to": np.array([15]), "measure": np.array([2.0])},
+	["road"],
+	[Action("measure", Aggregation.KeepLongest())],
+	("slk_from", "slk_to"),
+)
+assert result["measure"].tolist() == [2.0, 2.0]
+assert "pandas" not in sys.modules
+"""
+	subprocess.run([sys.executable, "-c", script], check=True)
+
+
+def test_array_api_missing_columns():
+	with pytest.raises(Exception, match=re.escape("Column 'measure' is missing from `data`.")):
+		merge.on_slk_interval_arrays(
+			{"road": np.array(["a"]), "slk_from": np.array([0]), "slk_to": np.array([10])},
+			{"road": np.array(["a"]), "slk_from": np.array([0]), "slk_to": np.array([10])},
+			["road"],
+			[merge.Action("measure", merge.Aggregation.Sum())],
+			("slk_from", "slk_to")
+		)
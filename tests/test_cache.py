@@ -0,0 +1,82 @@
+import os
+import pandas as pd
+import pytest
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+@pytest.fixture
+def cache_misses(monkeypatch):
+	"""Record each call to `_group_table`, which is only reached when the cache misses"""
+	calls = []
+	group_table = merge._group_table
+
+	def counting_group_table(*args, **kwargs):
+		calls.append(1)
+		return group_table(*args, **kwargs)
+
+	monkeypatch.setattr(merge, "_group_table", counting_group_table)
+	return calls
+
+
+@pytest.mark.parametrize("engine", ["sweep", "reference"])
+def test_cached_result_is_identical(tmp_path, cache_misses, engine):
+	cache = merge.MergeCache(tmp_path)
+	segments, data = random_network(0)
+
+	first  = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine, cache=cache)
+	second = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine, cache=cache)
+	assert len(cache_misses) == 1
+	pd.testing.assert_frame_equal(second, first)
+	pd.testing.assert_frame_equal(first, merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine))
+
+
+def test_cache_misses_when_inputs_change(tmp_path, cache_misses):
+	cache = merge.MergeCache(tmp_path)
+	segments, data = random_network(1)
+	merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), cache=cache)
+
+	# other columns of the target do not affect the result
+	merge.on_slk_intervals(segments.assign(note="x"), data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), cache=cache)
+	assert len(cache_misses) == 1
+
+	changed_data = data.copy()
+	changed_data.iloc[0, changed_data.columns.get_loc("measure")] = 100.0
+	result = merge.on_slk_intervals(segments, changed_data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), cache=cache)
+	assert len(cache_misses) == 2
+	pd.testing.assert_frame_equal(result, merge.on_slk_intervals(segments, changed_data, ["road", "cwy"], column_actions, ("slk_from", "slk_to")))
+
+	merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions[:3], ("slk_from", "slk_to"), cache=cache)
+	assert len(cache_misses) == 4
+
+
+def test_cache_hit_does_not_prepare_data(tmp_path, monkeypatch):
+	cache = merge.MergeCache(tmp_path)
+	segments, data = random_network(2)
+	first = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), cache=cache)
+
+	def failing_prepare(*args, **kwargs):
+		raise AssertionError("`prepare()` was called on a cache hit")
+
+	monkeypatch.setattr(merge, "prepare", failing_prepare)
+	second = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), cache=cache, validation="strict")
+	pd.testing.assert_frame_equal(second, first)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+	cache = merge.MergeCache(tmp_path)
+	results = {key: pd.DataFrame({"value": range(index * 1000, index * 1000 + 1000)}) for index, key in enumerate(["a", "b", "c"])}
+	cache.put("a", results["a"])
+	cache.put("b", results["b"])
+	cache.get("a")
+
+	# room for two results, so storing a third evicts "b", which was used least recently
+	cache.max_bytes = 2 * max(os.path.getsize(tmp_path / "a.parquet"), os.path.getsize(tmp_path / "b.parquet")) + 100
+	cache.put("c", results["c"])
+
+	assert cache.get("b") is None
+	pd.testing.assert_frame_equal(cache.get("a"), results["a"])
+	pd.testing.assert_frame_equal(cache.get("c"), results["c"])
+
+	cache.clear()
+	assert cache.get("a") is None
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network
+
+
+coalesce_actions = [
+	merge.Action('measure',  rename="lenw_mean", aggregation=merge.Aggregation.LengthWeightedAverage()),
+	merge.Action('measure',  rename="longest",   aggregation=merge.Aggregation.KeepLongest()),
+	merge.Action('category', rename="category",  aggregation=merge.Aggregation.KeepLongest()),
+]
+
+
+def split_rows(data, step):
+	"""Cut every data row into pieces at each multiple of `step`, as a survey extract would"""
+	rows = []
+	for row in data.itertuples(index=False):
+		breaks = np.unique(np.concatenate([[row.slk_from, row.slk_to], np.arange(row.slk_from - row.slk_from % step + step, row.slk_to, step)]))
+		rows += [row._replace(slk_from=piece_from, slk_to=piece_to) for piece_from, piece_to in zip(breaks[:-1], breaks[1:])]
+	return pd.DataFrame(rows, columns=data.columns)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_coalesce_keeps_results(seed):
+	segments, data = random_network(seed)
+	data = data[data["slk_from"] < data["slk_to"]]
+	split_data = split_rows(data, 10)
+	coalesced = merge.coalesce(split_data, ["road", "cwy"], coalesce_actions, ("slk_from", "slk_to"))
+	assert len(coalesced) < len(split_data)
+	pd.testing.assert_frame_equal(
+		merge.on_slk_intervals(segments, coalesced,  ["road", "cwy"], coalesce_actions, ("slk_from", "slk_to")),
+		merge.on_slk_intervals(segments, split_data, ["road", "cwy"], coalesce_actions, ("slk_from", "slk_to")),
+	)
+
+
+def test_coalesce_runs():
+	data = pd.DataFrame({
+		"road":     ["H001", "H001", "H001", "H001", "H002", "H001"],
+		"slk_from": [0,      10,     20,     30,     40,     45],
+		"slk_to":   [10,     20,     30,     40,     50,     50],
+		"category": ["A",    "A",    None,   None,   None,   None],
+	}, index=[5, 1, 2, 3, 4, 6])
+	result = merge.coalesce(data.iloc[::-1], ["road"], [merge.Action("category", merge.Aggregation.KeepLongest())], ("slk_from", "slk_to"))
+	pd.testing.assert_frame_equal(result, pd.DataFrame({
+		"road":     ["H001", "H001", "H001", "H002"],
+		"slk_from": [0,      20,     45,     40],
+		"slk_to":   [20,     40,     50,     50],
+		"category": ["A",    None,   None,   None],
+	}, index=[5, 2, 6, 4]))
+
+
+def test_coalesce_empty_data():
+	_, data = random_network(0)
+	result = merge.coalesce(data.iloc[:0].assign(note="x"), ["road", "cwy"], coalesce_actions, ("slk_from", "slk_to"))
+	pd.testing.assert_frame_equal(result, data.iloc[:0])
+
+
+def test_coalesce_refuses_length_dependent_aggregations():
+	segments, data = random_network(0)
+	for aggregation in [merge.Aggregation.ProportionalSum(), merge.Aggregation.Sum(), merge.Aggregation.First(), merge.Aggregation.LengthWeightedPercentile(0.5)]:
+		with pytest.raises(Exception, match=re.escape(f"Cannot coalesce data for {aggregation.type.name} of column 'measure' because the result depends on how the data is split into rows.")):
+			merge.coalesce(data, ["road", "cwy"], [merge.Action("measure", aggregation)], ("slk_from", "slk_to"))
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_threads_match_serial(seed):
+	segments, data = random_network(seed)
+	threaded_actions = [
+		*column_actions,
+		merge.Action('measure', merge.Aggregation.LengthWeightedPercentiles([0.1, 0.5, 0.9])),
+	]
+	res_serial   = merge.on_slk_intervals(segments, data, ["road", "cwy"], threaded_actions, ("slk_from", "slk_to"))
+	res_threaded = merge.on_slk_intervals(segments, data, ["road", "cwy"], threaded_actions, ("slk_from", "slk_to"), threads=4)
+	pd.testing.assert_frame_equal(res_threaded, res_serial)
+
+
+def test_threads_with_profile():
+	segments, data = random_network(2)
+	profile = merge.MergeProfile()
+	merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), threads=3, profile=profile)
+	assert set(profile.aggregations().index) == {column_action.aggregation.type.name for column_action in column_actions}
+
+
+def test_threads_errors():
+	segments, data = random_network(0)
+	with pytest.raises(Exception, match=re.escape("Parameter `threads` must be at least 1. Got 0.")):
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), threads=0)
+	with pytest.raises(Exception, match=re.escape("Parameter `threads` can only be greater than 1 when using the 'sweep' engine with `workers=1`.")):
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), threads=2, engine="reference")
+	with pytest.raises(Exception, match=re.escape("Parameter `threads` can only be greater than 1 when using the 'sweep' engine with `workers=1`.")):
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), threads=2, workers=2)
@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+import dtimsprep.merge as merge
+from testing import random_network, column_actions, disjoint_network
+
+
+@pytest.fixture
+def merged_group_counts(monkeypatch):
+	"""Record how many groups each call to `_merge_group_table` is asked to merge"""
+	counts = []
+	merge_group_table = merge._merge_group_table
+
+	def counting_merge_group_table(prepared_data, group_table, *args, **kwargs):
+		counts.append(len(group_table[2]))
+		return merge_group_table(prepared_data, group_table, *args, **kwargs)
+
+	monkeypatch.setattr(merge, "_merge_group_table", counting_merge_group_table)
+	return counts
+
+
+def merge_incremental(segments, data, state_path):
+	return merge.on_slk_intervals_incremental(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), state_path)
+
+
+def merge_full(segments, data):
+	return merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+
+
+def test_incremental_merge_only_recomputes_changed_groups(tmp_path, merged_group_counts):
+	state_path = tmp_path / "state.pickle"
+	segments, data = random_network(0)
+	group_count = segments.groupby(["road", "cwy"]).ngroups
+
+	result = merge_incremental(segments, data, state_path)
+	assert merged_group_counts == [group_count]
+	pd.testing.assert_frame_equal(result, merge_full(segments, data), check_exact=True)
+
+	# nothing changed
+	merged_group_counts.clear()
+	result = merge_incremental(segments, data, state_path)
+	assert merged_group_counts == []
+	pd.testing.assert_frame_equal(result, merge_full(segments, data), check_exact=True)
+
+	# change the data of one group and the segmentation of another
+	data.loc[(data["road"] == "H002") & (data["cwy"] == "L"), "measure"] += 1
+	changed_segments = (segments["road"] == "H003") & (segments["cwy"] == "R")
+	segments.loc[changed_segments, "slk_to"] = segments.loc[changed_segments, "slk_to"] - 1
+	merged_group_counts.clear()
+	result = merge_incremental(segments, data, state_path)
+	assert merged_group_counts == [2]
+	pd.testing.assert_frame_equal(result, merge_full(segments, data), check_exact=True)
+
+
+def test_incremental_merge_with_reordered_and_new_rows(tmp_path):
+	state_path = tmp_path / "state.pickle"
+	segments, data = random_network(1)
+	merge_incremental(segments, data, state_path)
+
+	# rows of other groups move around, a new road appears, and one data row is deleted
+	segments = pd.concat([segments.sample(frac=1, random_state=5), segments.assign(road="H004").iloc[:6]])
+	segments.index = range(len(segments))
+	data = pd.concat([data.iloc[1:], data.assign(road="H004").iloc[:20]])
+	data = data.reset_index(drop=True)
+	pd.testing.assert_frame_equal(merge_incremental(segments, data, state_path), merge_full(segments, data), check_exact=True)
+
+
+def test_incremental_merge_recomputes_everything_when_actions_change(tmp_path, merged_group_counts):
+	state_path = tmp_path / "state.pickle"
+	segments, data = random_network(2)
+	merge_incremental(segments, data, state_path)
+
+	merged_group_counts.clear()
+	other_actions = [merge.Action("measure", merge.Aggregation.Sum())]
+	result = merge.on_slk_intervals_incremental(segments, data, ["road", "cwy"], other_actions, ("slk_from", "slk_to"), state_path)
+	assert merged_group_counts == [segments.groupby(["road", "cwy"]).ngroups]
+	pd.testing.assert_frame_equal(result, merge.on_slk_intervals(segments, data, ["road", "cwy"], other_actions, ("slk_from", "slk_to")))
+
+
+def test_incremental_merge_recomputes_everything_when_prefix_sums_switch(tmp_path, merged_group_counts):
+	state_path = tmp_path / "state.pickle"
+	segments, data = disjoint_network(3)
+	additive_actions = [merge.Action("measure", rename="lenw_mean", aggregation=merge.Aggregation.LengthWeightedAverage())]
+	merge.on_slk_intervals_incremental(segments, data, ["road", "cwy"], additive_actions, ("slk_from", "slk_to"), state_path)
+
+	# one overlapping row stops every group from using prefix sums in a full merge
+	data = pd.concat([data, data.iloc[:1].assign(slk_to=data.iloc[0]["slk_to"] + 5)], ignore_index=True)
+	merged_group_counts.clear()
+	result = merge.on_slk_intervals_incremental(segments, data, ["road", "cwy"], additive_actions, ("slk_from", "slk_to"), state_path)
+	assert merged_group_counts == [segments.groupby(["road", "cwy"]).ngroups]
+	pd.testing.assert_frame_equal(result, merge.on_slk_intervals(segments, data, ["road", "cwy"], additive_actions, ("slk_from", "slk_to")), check_exact=True)
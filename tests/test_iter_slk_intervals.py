@@ -0,0 +1,63 @@
+import pandas as pd
+import numpy as np
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+# groups are merged in batches of about `_ITER_BATCH_ROWS` target rows; check that batches of one and several groups
+# are split back into the right chunks
+@pytest.mark.parametrize("batch_rows", [1, 20, 65536])
+def test_iter_slk_intervals_by_group(monkeypatch, batch_rows):
+	monkeypatch.setattr(merge, "_ITER_BATCH_ROWS", batch_rows)
+	segments, data = random_network(11)
+	# a target row with a blank join_left value is still returned
+	segments.loc[1000] = ["H001", None, 10, 20]
+
+	res = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	chunks = list(merge.iter_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to")))
+
+	# one chunk per road and carriageway, plus the blank carriageway
+	assert len(chunks) == 3 * 3 + 1
+	for chunk in chunks[:-1]:
+		assert len(chunk[["road", "cwy"]].drop_duplicates()) == 1
+	assert chunks[-1].index.tolist() == [1000]
+
+	pd.testing.assert_frame_equal(pd.concat(chunks).loc[res.index], res)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_iter_slk_intervals_by_chunk_size(chunk_size):
+	segments, data = random_network(12)
+	prepared = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"))
+
+	res = merge.on_slk_intervals(segments, prepared, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	chunks = list(merge.iter_slk_intervals(segments, prepared, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), chunk_size=chunk_size))
+
+	assert len(chunks) == int(np.ceil(len(segments) / chunk_size))
+	assert all(len(chunk) <= chunk_size for chunk in chunks)
+	pd.testing.assert_frame_equal(pd.concat(chunks), res)
+
+
+def test_iter_slk_intervals_dtypes_do_not_depend_on_chunk():
+	segments, data = random_network(13)
+	data = data.dropna(subset=["measure"]).astype({"measure": "int64"})
+	int_column_actions = [
+		merge.Action('measure',  rename="sum",      aggregation=merge.Aggregation.Sum()),
+		merge.Action('measure',  rename="longest",  aggregation=merge.Aggregation.KeepLongest()),
+		merge.Action('measure',  rename="argmax",   aggregation=merge.Aggregation.IndexOfMax()),
+		merge.Action('category', rename="category", aggregation=merge.Aggregation.KeepLongest()),
+	]
+	# chunks of one row either match data, which keeps int64, or match nothing, which would be object
+	chunks = list(merge.iter_slk_intervals(segments, data, ["road", "cwy"], int_column_actions, ("slk_from", "slk_to"), chunk_size=1))
+	for chunk in chunks:
+		pd.testing.assert_series_equal(chunk.dtypes, chunks[0].dtypes)
+	assert list(chunks[0].dtypes[["sum", "longest", "argmax"]]) == [np.dtype(float)] * 3
+	assert chunks[0]["category"].dtype == data["category"].dtype
+
+
+def test_iter_slk_intervals_chunk_size_error():
+	segments, data = random_network(0)
+	with pytest.raises(Exception, match=re.escape("Parameter `chunk_size` must be at least 1. Got 0.")):
+		next(merge.iter_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), chunk_size=0))
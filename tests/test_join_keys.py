@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+def test_group_table_matches_groupby():
+	segments, data = random_network(0)
+	# keys that only appear in the target, and blank keys in both dataframes
+	segments.iloc[:5, segments.columns.get_loc("road")] = "H999"
+	segments.iloc[5:8, segments.columns.get_loc("cwy")] = None
+	data.iloc[:4, data.columns.get_loc("road")] = None
+
+	prepared_data = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"))
+	target_order, target_offsets, data_starts, data_stops = merge._group_table(segments, prepared_data)
+
+	target_groups = segments.groupby(["road", "cwy"]).indices
+	assert len(data_starts) == len(target_groups)
+	for group, (key, positions) in enumerate(target_groups.items()):
+		assert target_order[target_offsets[group]:target_offsets[group + 1]].tolist() == positions.tolist()
+		group_data = prepared_data.data.iloc[data_starts[group]:data_stops[group]]
+		expected_data_rows = ((data["road"] == key[0]) & (data["cwy"] == key[1])).sum()
+		assert len(group_data) == expected_data_rows
+		assert (group_data.index.droplevel("data_id") == key).all()
+
+
+@pytest.mark.parametrize("engine", ["sweep", "reference"])
+def test_join_keys_with_blanks_and_unmatched_groups(engine):
+	segments, data = random_network(1)
+	segments.iloc[:5, segments.columns.get_loc("road")] = "H999"
+	segments.iloc[5:8, segments.columns.get_loc("cwy")] = None
+	data.iloc[:4, data.columns.get_loc("road")] = None
+
+	result = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine)
+	assert result.iloc[:8, 4:].isna().all().all()
+
+	expected = merge.on_slk_intervals(segments.iloc[8:], data.iloc[4:], ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine)
+	pd.testing.assert_frame_equal(result.iloc[8:], expected, check_dtype=False)
+
+
+def test_join_keys_of_different_dtypes():
+	segments, data = random_network(2)
+	road_numbers = {"H001": 1, "H002": 2, "H003": 3}
+	segments["road"] = segments["road"].map(road_numbers).astype("int64")
+	data["road"] = data["road"].map(road_numbers).astype("float64")
+
+	result = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	reference = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="reference")
+	assert result["lenw_mean"].notna().any()
+	pd.testing.assert_frame_equal(result, reference, check_exact=False, rtol=1e-12)
+
+
+def test_single_join_left_column():
+	segments, data = random_network(3)
+	segments = segments[segments["cwy"] == "L"].drop(columns="cwy")
+	data = data[data["cwy"] == "L"].drop(columns="cwy")
+
+	result = merge.on_slk_intervals(segments, data, ["road"], column_actions, ("slk_from", "slk_to"))
+	reference = merge.on_slk_intervals(segments, data, ["road"], column_actions, ("slk_from", "slk_to"), engine="reference")
+	pd.testing.assert_frame_equal(result, reference, check_exact=False, rtol=1e-12)
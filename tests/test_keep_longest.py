@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+import dtimsprep.merge as merge
+from testing import random_network
+
+
+@pytest.mark.parametrize("engine", ["sweep", "reference"])
+def test_keep_longest_ties_resolve_to_smallest_value(engine):
+	segments = pd.DataFrame([
+		["A", 0, 100],
+		["A", 100, 200],
+	], columns=["road", "slk_from", "slk_to"])
+
+	data = pd.DataFrame([
+		["A",   0,  25, 77, "D"],
+		["A",  25,  50, 33, "B"],
+		["A",  50,  75, 66, "C"],
+		["A",  75, 100, 55, "A"],
+		["A", 100, 125, 99, "Z"],
+		["A", 125, 150, 11, "Y"],
+		["A", 150, 200, 99, "Z"],
+	], columns=["road", "slk_from", "slk_to", "measure", "category"])
+
+	result = merge.on_slk_intervals(segments, data, ["road"], [
+		merge.Action("measure",  merge.Aggregation.KeepLongest()),
+		merge.Action("category", merge.Aggregation.KeepLongest()),
+	], ("slk_from", "slk_to"), engine=engine)
+
+	assert result["measure"].tolist() == [33, 99]
+	assert result["category"].tolist() == ["A", "Z"]
+
+
+def test_keep_longest_factorizes_once():
+	segments, data = random_network(0)
+	prepared_data = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"))
+	column_actions = [
+		merge.Action("category", rename="category_longest", aggregation=merge.Aggregation.KeepLongest()),
+		merge.Action("measure",  rename="measure_longest",  aggregation=merge.Aggregation.KeepLongest()),
+	]
+
+	first_result = merge.on_slk_intervals(segments, prepared_data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	assert set(prepared_data.factorized_columns) == {"category", "measure"}
+	codes, uniques = prepared_data.factorized_columns["category"]
+	assert list(uniques) == ["A", "B", "C"]
+
+	second_result = merge.on_slk_intervals(segments, prepared_data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	assert prepared_data.factorized_columns["category"][0] is codes
+	pd.testing.assert_frame_equal(first_result, second_result)
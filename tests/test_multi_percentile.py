@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_percentiles_match_single_percentile_actions(seed):
+	segments, data = random_network(seed)
+	percentiles = [0.0, 0.1, 0.5, 0.75, 0.9, 1.0]
+
+	res_multi = merge.on_slk_intervals(segments, data, ["road", "cwy"], [
+		merge.Action('measure', merge.Aggregation.LengthWeightedPercentiles(percentiles)),
+	], ("slk_from", "slk_to"))
+
+	single_actions = [
+		merge.Action('measure', merge.Aggregation.LengthWeightedPercentile(percentile), rename=f"measure_p{percentile * 100:g}")
+		for percentile in percentiles
+	]
+	res_single    = merge.on_slk_intervals(segments, data, ["road", "cwy"], single_actions, ("slk_from", "slk_to"))
+	res_reference = merge.on_slk_intervals(segments, data, ["road", "cwy"], single_actions, ("slk_from", "slk_to"), engine="reference")
+
+	assert list(res_multi.columns[-len(percentiles):]) == ["measure_p0", "measure_p10", "measure_p50", "measure_p75", "measure_p90", "measure_p100"]
+	pd.testing.assert_frame_equal(res_multi, res_single)
+	pd.testing.assert_frame_equal(res_multi, res_reference)
+
+
+def test_percentiles_rename_list():
+	segments, data = random_network(0)
+	result = merge.on_slk_intervals(segments, data, ["road", "cwy"], [
+		merge.Action('measure', merge.Aggregation.LengthWeightedPercentiles([0.1, 0.9]), rename=["low", "high"]),
+	], ("slk_from", "slk_to"))
+	assert list(result.columns) == ["road", "cwy", "slk_from", "slk_to", "low", "high"]
+	assert not (result["low"] > result["high"]).any()
+
+	with pytest.raises(Exception, match=re.escape("The `rename` list for column 'measure' has 1 names but 2 percentiles were requested.")):
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], [
+			merge.Action('measure', merge.Aggregation.LengthWeightedPercentiles([0.1, 0.9]), rename=["low"]),
+		], ("slk_from", "slk_to"))
+
+
+def test_percentiles_out_of_range():
+	with pytest.raises(ValueError, match="Do you need to divide by 100?"):
+		merge.Aggregation.LengthWeightedPercentiles([0.5, 75])
+	with pytest.raises(ValueError, match="At least one percentile is required."):
+		merge.Aggregation.LengthWeightedPercentiles([])
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network
+
+
+measure_actions = [
+	merge.Action('measure', rename="measure_mean", aggregation=merge.Aggregation.LengthWeightedAverage()),
+	merge.Action('measure', rename="measure_max",  aggregation=merge.Aggregation.IndexOfMax()),
+]
+category_actions = [
+	merge.Action('category', aggregation=merge.Aggregation.KeepLongest()),
+]
+
+
+def test_many_matches_chained_merges():
+	segments, pavement = random_network(0)
+	_, traffic = random_network(1)
+	traffic = traffic.rename(columns={"measure": "traffic"})
+	traffic_actions = [merge.Action('traffic', aggregation=merge.Aggregation.ProportionalSum())]
+	prepared_traffic = merge.prepare(traffic, ["road", "cwy"], ("slk_from", "slk_to"))
+
+	result = merge.on_slk_intervals_many(segments, [
+		(pavement,         measure_actions + category_actions),
+		(prepared_traffic, traffic_actions),
+	], ["road", "cwy"], ("slk_from", "slk_to"))
+
+	expected = merge.on_slk_intervals(segments, pavement, ["road", "cwy"], measure_actions + category_actions, ("slk_from", "slk_to"))
+	expected = merge.on_slk_intervals(expected, traffic,  ["road", "cwy"], traffic_actions,                    ("slk_from", "slk_to"))
+	pd.testing.assert_frame_equal(result, expected)
+
+
+def test_many_with_threads():
+	segments, pavement = random_network(2)
+	_, surface = random_network(3)
+	datasets = [(pavement, measure_actions), (surface, category_actions)]
+	pd.testing.assert_frame_equal(
+		merge.on_slk_intervals_many(segments, datasets, ["road", "cwy"], ("slk_from", "slk_to"), threads=2),
+		merge.on_slk_intervals_many(segments, datasets, ["road", "cwy"], ("slk_from", "slk_to")),
+	)
+
+
+def test_many_repeated_result_columns():
+	segments, pavement = random_network(0)
+	with pytest.raises(Exception, match=re.escape("The result columns ['category'] are produced more than once.")):
+		merge.on_slk_intervals_many(segments, [
+			(pavement, category_actions),
+			(pavement, category_actions),
+		], ["road", "cwy"], ("slk_from", "slk_to"))
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network
+
+
+def test_overlay_example():
+	pavement = pd.DataFrame({
+		"road":          ["H001", "H001", "H002"],
+		"slk_from":      [0,      40,     0],
+		"slk_to":        [40,     100,    50],
+		"pavement_type": ["tA",   "tB",   "tC"],
+	})
+	traffic = pd.DataFrame({
+		"road":     ["H001", "H001", "H003"],
+		"slk_from": [20,     120,    0],
+		"slk_to":   [60,     130,    10],
+		"aadt":     [1000.0, 2000.0, 3000.0],
+	})
+	result = merge.overlay([(pavement, ["pavement_type"]), (traffic, ["aadt"])], ["road"], ("slk_from", "slk_to"))
+	pd.testing.assert_frame_equal(result, pd.DataFrame({
+		"road":          ["H001", "H001", "H001", "H001", "H001", "H002", "H003"],
+		"slk_from":      [0,      20,     40,     60,     120,    0,      0],
+		"slk_to":        [20,     40,     60,     100,    130,    50,     10],
+		"pavement_type": ["tA",   "tA",   "tB",   "tB",   np.nan, "tC",   np.nan],
+		"aadt":          [np.nan, 1000.0, 1000.0, np.nan, 2000.0, np.nan, 3000.0],
+	}), check_dtype=False)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_overlay_of_segmentations(seed):
+	# random segmentations don't overlap themselves, so each piece lies within exactly one row of each
+	pavement, _ = random_network(seed)
+	traffic, _  = random_network(seed + 10)
+	pavement = pavement.assign(pavement_id=np.arange(len(pavement)))
+	traffic  = traffic.assign(traffic_id=np.arange(len(traffic)))
+	result = merge.overlay([(pavement, ["pavement_id"]), (traffic, ["traffic_id"])], ["road", "cwy"], ("slk_from", "slk_to"))
+	
+	assert (result["slk_from"] < result["slk_to"]).all()
+	for name, data in [("pavement_id", pavement), ("traffic_id", traffic)]:
+		# each piece takes its value from a row that contains it, and the pieces cover every row exactly
+		matched = result.dropna(subset=[name]).merge(data, left_on=name, right_on=name, suffixes=("", "_source"))
+		assert ((matched["slk_from"] >= matched["slk_from_source"]) & (matched["slk_to"] <= matched["slk_to_source"]) & (matched["road"] == matched["road_source"])).all()
+		covered = matched.assign(length=matched["slk_to"] - matched["slk_from"]).groupby(name)["length"].sum()
+		pd.testing.assert_series_equal(
+			covered.sort_index(),
+			(data["slk_to"] - data["slk_from"]).set_axis(data[name]).sort_index().rename("length").rename_axis(name),
+			check_dtype=False,
+			check_index_type=False
+		)
+
+
+def test_overlay_errors():
+	pavement, _ = random_network(0)
+	with pytest.raises(Exception, match=re.escape("Cannot overlay data. Columns ['pavement_type'] are missing from one of the `datasets`.")):
+		merge.overlay([(pavement, ["pavement_type"])], ["road", "cwy"], ("slk_from", "slk_to"))
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parallel_merge_matches_serial(workers):
+	segments, data = random_network(5)
+
+	res_serial   = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	res_parallel = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), workers=workers)
+
+	pd.testing.assert_frame_equal(res_parallel, res_serial)
+
+
+def test_parallel_merge_more_workers_than_groups():
+	segments, data = random_network(6)
+	segments = segments[segments["road"] == "H001"]
+
+	res_serial   = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	res_parallel = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), workers=8)
+
+	pd.testing.assert_frame_equal(res_parallel, res_serial)
+
+
+def test_parallel_merge_non_numeric_count_max_and_index_of_max():
+	segments, data = random_network(7)
+	category_actions = [
+		merge.Action('category', rename="category_count",  aggregation=merge.Aggregation.Count()),
+		merge.Action('category', rename="category_max",    aggregation=merge.Aggregation.Max()),
+		merge.Action('category', rename="category_argmax", aggregation=merge.Aggregation.IndexOfMax()),
+	]
+	res_serial   = merge.on_slk_intervals(segments, data, ["road", "cwy"], category_actions, ("slk_from", "slk_to"))
+	res_parallel = merge.on_slk_intervals(segments, data, ["road", "cwy"], category_actions, ("slk_from", "slk_to"), workers=2)
+	assert res_serial["category_max"].notna().any()
+	pd.testing.assert_frame_equal(res_parallel, res_serial)
+
+
+def test_parallel_merge_errors():
+	segments, data = random_network(0)
+
+	with pytest.raises(Exception, match=re.escape("Parameter `workers` can only be greater than 1 when using the 'sweep' engine.")):
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="reference", workers=2)
+
+	with pytest.raises(Exception, match=re.escape("Cannot compute Average of the non-numeric column 'category' when `workers` is greater than 1.")):
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], [merge.Action("category", merge.Aggregation.Average())], ("slk_from", "slk_to"), workers=2)
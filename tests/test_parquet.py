@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+import dtimsprep.parquet as parquet
+from testing import random_network, column_actions
+
+
+def test_partitioned_round_trip(tmp_path):
+	segments, data = random_network(0)
+	parquet.write_partitioned(data, tmp_path, ["road"])
+	assert sorted(path.name for path in tmp_path.iterdir()) == ["_common_metadata", "road=H001", "road=H002", "road=H003"]
+	
+	result = parquet.read_partitioned(tmp_path)
+	pd.testing.assert_frame_equal(result.loc[data.index, data.columns], data)
+	
+	# rewriting one road replaces only that partition
+	parquet.write_partitioned(data[data["road"] == "H002"].iloc[:3], tmp_path, ["road"])
+	assert (parquet.read_partitioned(tmp_path)["road"] == "H002").sum() == 3
+
+
+def test_many_partitions(tmp_path):
+	data = pd.DataFrame({"road": [f"R{road_index:04d}" for road_index in range(1500)], "slk_from": 0, "slk_to": 10})
+	parquet.write_partitioned(data, tmp_path, ["road"])
+	assert len(parquet.read_partitioned(tmp_path)) == 1500
+
+
+def test_read_for_merge(tmp_path):
+	segments, data = random_network(1)
+	parquet.write_partitioned(data, tmp_path, ["road", "cwy"])
+	target = segments[(segments["road"] == "H001") & (segments["cwy"] != "R")]
+	
+	assert list(parquet.read_for_merge(tmp_path, target, ["road", "cwy"], column_actions[:3], ("slk_from", "slk_to")).columns) == ["road", "cwy", "slk_from", "slk_to", "measure"]
+	
+	subset = parquet.read_for_merge(tmp_path, target, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	assert set(map(tuple, subset[["road", "cwy"]].drop_duplicates().to_numpy())) == {("H001", "L")}
+	pd.testing.assert_frame_equal(
+		merge.on_slk_intervals(target, subset, ["road", "cwy"], column_actions, ("slk_from", "slk_to")),
+		merge.on_slk_intervals(target, data,   ["road", "cwy"], column_actions, ("slk_from", "slk_to")),
+	)
+
+
+def test_read_for_merge_reads_only_target_keys(tmp_path):
+	segments, data = random_network(3)
+	parquet.write_partitioned(data, tmp_path, ["road"])
+	target = segments[((segments["road"] == "H001") & (segments["cwy"] == "L")) | ((segments["road"] == "H002") & (segments["cwy"] == "R"))]
+	
+	# not every combination of the road and cwy values in the target
+	subset = parquet.read_for_merge(tmp_path, target, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	assert set(map(tuple, subset[["road", "cwy"]].drop_duplicates().to_numpy())) == {("H001", "L"), ("H002", "R")}
+	expected = data[((data["road"] == "H001") & (data["cwy"] == "L")) | ((data["road"] == "H002") & (data["cwy"] == "R"))]
+	pd.testing.assert_frame_equal(subset.loc[expected.index, expected.columns], expected)
+	
+	assert len(parquet.read_partitioned(tmp_path, partitions=pd.DataFrame({"road": ["H003"], "cwy": [None]}))) == 0
+
+
+def test_partitioned_errors(tmp_path):
+	segments, data = random_network(2)
+	with pytest.raises(Exception, match=re.escape("Partition columns ['lane'] are missing from `frame`.")):
+		parquet.write_partitioned(data, tmp_path, ["lane"])
+	with pytest.raises(Exception, match=re.escape("is not a dataset written by `write_partitioned()`")):
+		parquet.read_partitioned(tmp_path)
+	parquet.write_partitioned(data, tmp_path, ["road"])
+	with pytest.raises(Exception, match=re.escape("Columns ['lane'] are missing from the dataset")):
+		parquet.read_partitioned(tmp_path, columns=["lane"])
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network
+
+
+point_actions = [
+	merge.Action('measure',  rename="count",    aggregation=merge.Aggregation.Count()),
+	merge.Action('measure',  rename="sum",      aggregation=merge.Aggregation.Sum()),
+	merge.Action('measure',  rename="max",      aggregation=merge.Aggregation.Max()),
+	merge.Action('measure',  rename="argmax",   aggregation=merge.Aggregation.IndexOfMax()),
+	merge.Action('category', rename="first",    aggregation=merge.Aggregation.First()),
+]
+
+
+def random_points(seed, segments):
+	rng = np.random.default_rng(seed)
+	points = segments.sample(n=300, replace=True, random_state=seed).loc[:, ["road", "cwy"]].reset_index(drop=True)
+	# include points on segment boundaries, outside the segmentation and with a blank SLK
+	points["slk"] = np.where(rng.random(len(points)) < 0.3, segments["slk_from"].sample(n=len(points), replace=True, random_state=seed).to_numpy(), rng.integers(-20, 520, len(points))).astype(float)
+	points.loc[rng.random(len(points)) < 0.05, "slk"] = np.nan
+	points["measure"] = np.where(rng.random(len(points)) < 0.1, np.nan, rng.integers(0, 8, len(points)).astype(float))
+	points["category"] = rng.choice(["A", "B", None], len(points))
+	points.index = rng.permutation(len(points)) * 2 + 1
+	return points
+
+
+def brute_force(segments, points):
+	"""Give each point to the containing segment with the greatest `from`, then aggregate with pandas"""
+	owner = []
+	for point in points.itertuples():
+		containing = segments[
+			(segments["road"] == point.road) & (segments["cwy"] == point.cwy) &
+			(segments["slk_from"] <= point.slk) & (segments["slk_to"] >= point.slk)
+		]
+		owner.append(containing["slk_from"].idxmax() if len(containing) > 0 else np.nan)
+	owned = points.assign(owner=owner).dropna(subset=["owner"]).sort_index()
+	measures = owned.dropna(subset=["measure"]).groupby("owner")["measure"]
+	return segments.assign(
+		count=measures.count(),
+		sum=measures.sum(),
+		max=measures.max(),
+		argmax=measures.idxmax(),
+		first=owned.dropna(subset=["category"]).groupby("owner")["category"].first(),
+	)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_points_match_brute_force(seed):
+	segments, _ = random_network(seed)
+	points = random_points(seed, segments)
+	result = merge.on_slk_points(segments, points, ["road", "cwy"], point_actions, ("slk_from", "slk_to"), "slk")
+	pd.testing.assert_frame_equal(result, brute_force(segments, points), check_dtype=False)
+
+
+def test_points_errors():
+	segments, _ = random_network(0)
+	points = random_points(0, segments)
+	with pytest.raises(Exception, match=re.escape("Cannot compute LengthWeightedAverage of column 'measure' for point data.")):
+		merge.on_slk_points(segments, points, ["road", "cwy"], [merge.Action("measure", merge.Aggregation.LengthWeightedAverage())], ("slk_from", "slk_to"), "slk")
+	with pytest.raises(Exception, match=re.escape("The rows of `target` overlap each other within a `join_left` group.")):
+		merge.on_slk_points(pd.concat([segments, segments.iloc[:1]]), points, ["road", "cwy"], point_actions, ("slk_from", "slk_to"), "slk")
+	with pytest.raises(Exception, match=re.escape("Column 'chainage' is missing from `points`.")):
+		merge.on_slk_points(segments, points, ["road", "cwy"], point_actions, ("slk_from", "slk_to"), "chainage")
@@ -0,0 +1,73 @@
+import pandas as pd
+import numpy as np
+import pytest
+import dtimsprep.merge as merge
+from testing import random_network, disjoint_network
+
+
+additive_column_actions = [
+	merge.Action('measure', rename="lenw_mean",      aggregation=merge.Aggregation.LengthWeightedAverage()),
+	merge.Action('measure', rename="prop_sum",       aggregation=merge.Aggregation.ProportionalSum()),
+	merge.Action('measure', rename="sum",            aggregation=merge.Aggregation.Sum()),
+	merge.Action('count',   rename="count_sum",      aggregation=merge.Aggregation.Sum()),
+	merge.Action('count',   rename="count_prop_sum", aggregation=merge.Aggregation.ProportionalSum()),
+]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_prefix_sum_index_matches_reference(seed):
+	segments, data = disjoint_network(seed)
+	prepared = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"))
+
+	res_reference  = merge.on_slk_intervals(segments, data,     ["road", "cwy"], additive_column_actions, ("slk_from", "slk_to"), engine="reference")
+	res_prefix_sum = merge.on_slk_intervals(segments, prepared, ["road", "cwy"], additive_column_actions, ("slk_from", "slk_to"))
+
+	assert prepared.has_disjoint_groups
+	assert set(prepared.prefix_sum_indexes.keys()) == {"measure", "count"}
+	assert res_prefix_sum["count_sum"].dtype == res_reference["count_sum"].dtype
+	pd.testing.assert_frame_equal(res_prefix_sum, res_reference, check_exact=False, rtol=1e-9)
+
+
+def test_prefix_sum_index_bool_column():
+	_, data = disjoint_network(0)
+	data["flag"] = data["count"] % 3 == 0
+	# every target matches data, so no column is made float by blank results
+	target = data.loc[:, ["road", "cwy", "slk_from", "slk_to"]]
+	bool_column_actions = [
+		merge.Action('flag', rename="flag_sum",      aggregation=merge.Aggregation.Sum()),
+		merge.Action('flag', rename="flag_prop_sum", aggregation=merge.Aggregation.ProportionalSum()),
+		merge.Action('flag', rename="flag_mean",     aggregation=merge.Aggregation.LengthWeightedAverage()),
+	]
+	prepared = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"))
+	res_reference  = merge.on_slk_intervals(target, data,     ["road", "cwy"], bool_column_actions, ("slk_from", "slk_to"), engine="reference")
+	res_prefix_sum = merge.on_slk_intervals(target, prepared, ["road", "cwy"], bool_column_actions, ("slk_from", "slk_to"))
+	assert "flag" in prepared.prefix_sum_indexes
+	assert res_prefix_sum["flag_sum"].dtype == np.int64
+	pd.testing.assert_frame_equal(res_prefix_sum, res_reference, check_exact=False, rtol=1e-9)
+
+
+def test_prefix_sum_index_not_used_for_overlapping_data():
+	segments, data = random_network(0)
+	data = data.dropna(subset=["measure"])
+	prepared = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"))
+
+	res_reference = merge.on_slk_intervals(segments, data,     ["road", "cwy"], additive_column_actions[:3], ("slk_from", "slk_to"), engine="reference")
+	res_sweep     = merge.on_slk_intervals(segments, prepared, ["road", "cwy"], additive_column_actions[:3], ("slk_from", "slk_to"))
+
+	assert prepared.has_disjoint_groups is False
+	assert len(prepared.prefix_sum_indexes) == 0
+	pd.testing.assert_frame_equal(res_sweep, res_reference, check_exact=False, rtol=1e-12)
+
+
+def test_prefix_sum_index_not_used_for_non_additive_actions():
+	segments, data = disjoint_network(0)
+	prepared = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"))
+	merge.on_slk_intervals(
+		segments,
+		prepared,
+		["road", "cwy"],
+		[*additive_column_actions, merge.Action('measure', rename="first", aggregation=merge.Aggregation.First())],
+		("slk_from", "slk_to")
+	)
+	assert prepared.has_disjoint_groups is None
+	assert len(prepared.prefix_sum_indexes) == 0
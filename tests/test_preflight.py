@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+def issue_rows(report, frame, check):
+	issues = report.issues
+	return sorted(issues.loc[(issues["frame"] == frame) & (issues["check"] == check), "row"])
+
+
+def test_preflight_finds_each_problem():
+	target = pd.DataFrame({
+		"road":     ["H001", "H001", "H001", "H001"],
+		"slk_from": [0.0,    20.0,   30.0,   np.nan],
+		"slk_to":   [10.0,   10.0,   30.5,   40.0],
+	}, index=["a", "b", "c", "d"])
+	data = pd.DataFrame({
+		"road":     ["H001", "H001", "H001", "H001", "H002"],
+		"slk_from": [0,      50,     10,     20,     15],
+		"slk_to":   [100,    60,     10,     30,     30],
+		"measure":  [1.0,    2.0,    3.0,    4.0,    5.0],
+	}, index=[10, 11, 12, 13, 14])
+	
+	report = merge.preflight(target, data, ["road"], ("slk_from", "slk_to"))
+	assert not report.ok
+	assert issue_rows(report, "target", "reversed_interval") == ["b"]
+	assert issue_rows(report, "target", "blank_chainage") == ["d"]
+	assert issue_rows(report, "target", "non_integer_slk") == ["c"]
+	assert issue_rows(report, "data", "zero_length") == [12]
+	assert issue_rows(report, "data", "overlapping_data") == [11, 13]
+	assert list(report.errors()["check"]) == ["blank_chainage", "reversed_interval"]
+	
+	prepared_report = merge.preflight(target, merge.prepare(data, ["road"], ("slk_from", "slk_to")), ["road"], ("slk_from", "slk_to"))
+	pd.testing.assert_frame_equal(
+		prepared_report.issues.sort_values(["frame", "check"], ignore_index=True),
+		report.issues.sort_values(["frame", "check"], ignore_index=True)
+	)
+
+
+def test_preflight_join_left_dtype_mismatch():
+	segments, data = random_network(0)
+	report = merge.preflight(segments.assign(cwy=1), data, ["road", "cwy"], ("slk_from", "slk_to"))
+	assert list(report.errors()["check"]) == ["join_left_dtype_mismatch"]
+	assert list(report.errors()["column"]) == ["cwy"]
+	assert merge.preflight(segments, data, ["road", "cwy"], ("slk_from", "slk_to")).ok
+
+
+def test_preflight_categorical_join_left():
+	segments, data = random_network(0)
+	# a categorical column of strings joins to a string column, so strict validation passes
+	categorical_segments = segments.astype({"road": "category"})
+	assert merge.preflight(categorical_segments, data, ["road", "cwy"], ("slk_from", "slk_to")).ok
+	assert merge.preflight(segments, data.astype({"road": "category"}), ["road", "cwy"], ("slk_from", "slk_to")).ok
+	pd.testing.assert_frame_equal(
+		merge.on_slk_intervals(categorical_segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), validation="strict").astype({"road": str}),
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to")),
+	)
+	# categories of numbers do not join to strings
+	assert not merge.preflight(segments.assign(cwy=pd.Categorical([1] * len(segments))), data, ["road", "cwy"], ("slk_from", "slk_to")).ok
+
+
+def test_strict_validation():
+	segments, data = random_network(1)
+	# random_network data has zero length and overlapping rows, which are only warnings
+	pd.testing.assert_frame_equal(
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), validation="strict"),
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to")),
+	)
+	
+	reversed_data = data.copy()
+	reversed_data.iloc[0, reversed_data.columns.get_loc("slk_to")] = reversed_data.iloc[0, reversed_data.columns.get_loc("slk_from")] - 5
+	with pytest.raises(Exception, match=re.escape("The preflight checks found errors in the inputs.")):
+		merge.on_slk_intervals(segments, reversed_data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), validation="strict")
+	with pytest.raises(Exception, match=re.escape("Parameter `validation` must be either 'skip' or 'strict'. Got 'lenient'.")):
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), validation="lenient")
@@ -0,0 +1,66 @@
+import pandas as pd
+import pickle
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+@pytest.mark.parametrize("engine", ["sweep", "reference"])
+def test_prepared_data_matches_unprepared(engine):
+	segments, data = random_network(7)
+	data_copy = data.copy()
+
+	prepared = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"), columns=["measure", "category"])
+
+	res_unprepared = merge.on_slk_intervals(segments, data,     ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine)
+	res_prepared   = merge.on_slk_intervals(segments, prepared, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine)
+
+	pd.testing.assert_frame_equal(res_prepared, res_unprepared)
+	pd.testing.assert_frame_equal(data, data_copy)
+
+
+def test_prepared_data_can_be_reused_on_other_segmentations():
+	segments_a, data = random_network(8)
+	segments_b, _    = random_network(9)
+
+	prepared = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"))
+
+	for segments in [segments_a, segments_b]:
+		pd.testing.assert_frame_equal(
+			merge.on_slk_intervals(segments, prepared, ["road", "cwy"], column_actions, ("slk_from", "slk_to")),
+			merge.on_slk_intervals(segments, data,     ["road", "cwy"], column_actions, ("slk_from", "slk_to")),
+		)
+
+
+def test_prepared_data_save_load(tmp_path):
+	segments, data = random_network(10)
+
+	prepared = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"), columns=["measure", "category"])
+	prepared.save(tmp_path / "prepared.pickle")
+	loaded = merge.PreparedData.load(tmp_path / "prepared.pickle")
+	unpickled = pickle.loads(pickle.dumps(prepared))
+
+	res_prepared = merge.on_slk_intervals(segments, prepared, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	pd.testing.assert_frame_equal(merge.on_slk_intervals(segments, loaded,    ["road", "cwy"], column_actions, ("slk_from", "slk_to")), res_prepared)
+	pd.testing.assert_frame_equal(merge.on_slk_intervals(segments, unpickled, ["road", "cwy"], column_actions, ("slk_from", "slk_to")), res_prepared)
+
+	with open(tmp_path / "not_prepared.pickle", "wb") as file:
+		pickle.dump(data, file)
+	with pytest.raises(Exception, match="does not contain `PreparedData`"):
+		merge.PreparedData.load(tmp_path / "not_prepared.pickle")
+
+
+def test_prepared_data_errors():
+	segments, data = random_network(0)
+
+	with pytest.raises(Exception, match=re.escape("Cannot prepare data. Columns ['measur'] are missing from `data`.")):
+		merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"), columns=["measur"])
+
+	prepared = merge.prepare(data, ["road", "cwy"], ("slk_from", "slk_to"), columns=["measure"])
+
+	with pytest.raises(Exception, match=re.escape("`data` was prepared with join_left=['road', 'cwy'] and from_to=('slk_from', 'slk_to'). It cannot be merged using join_left=['road'] and from_to=('slk_from', 'slk_to').")):
+		merge.on_slk_intervals(segments, prepared, ["road"], column_actions, ("slk_from", "slk_to"))
+
+	with pytest.raises(Exception, match=re.escape("Cannot merge column 'category' because it was not included when `data` was prepared.")):
+		merge.on_slk_intervals(segments, prepared, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
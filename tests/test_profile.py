@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+import dtimsprep.merge as merge
+from testing import random_network, column_actions, disjoint_network
+
+
+@pytest.mark.parametrize("engine", ["sweep", "reference"])
+def test_profile_does_not_change_result(engine):
+	segments, data = random_network(0)
+	res_plain    = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine)
+	res_profiled = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine, profile=merge.MergeProfile())
+	pd.testing.assert_frame_equal(res_profiled, res_plain)
+
+
+@pytest.mark.parametrize("engine, phases", [
+	("sweep",     ["prepare", "group", "overlap", "aggregate", "assemble"]),
+	("reference", ["prepare", "group", "reference_loop", "assemble"]),
+])
+def test_profile_records_phases_and_groups(engine, phases):
+	segments, data = random_network(1)
+	profile = merge.MergeProfile()
+	merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine, profile=profile)
+
+	assert list(profile.phases().index) == phases
+	assert (profile.phases()["seconds"] >= 0).all()
+
+	groups = profile.groups()
+	assert list(groups.columns) == ["road", "cwy", "target_rows", "data_rows", "pairs", "seconds"]
+	assert list(groups[["road", "cwy"]].itertuples(index=False, name=None)) == list(segments.groupby(["road", "cwy"]).groups.keys())
+	assert groups["target_rows"].sum() == len(segments)
+	# carriageway S has no data
+	assert (groups[groups["cwy"] == "S"]["data_rows"] == 0).all()
+	assert (groups[groups["cwy"] != "S"]["data_rows"] > 0).all()
+
+
+def test_profile_records_aggregations():
+	segments, data = random_network(2)
+	profile = merge.MergeProfile()
+	merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), profile=profile)
+	assert set(profile.aggregations().index) == {column_action.aggregation.type.name for column_action in column_actions}
+
+
+def test_profile_prefix_sums():
+	segments, data = disjoint_network(0)
+	profile = merge.MergeProfile()
+	merge.on_slk_intervals(segments, data, ["road", "cwy"], [
+		merge.Action("measure", rename="sum", aggregation=merge.Aggregation.Sum()),
+	], ("slk_from", "slk_to"), profile=profile)
+	assert "prefix_sums" in profile.phases().index
+	assert profile.groups()["target_rows"].sum() == len(segments)
+
+
+def test_progress_callback():
+	segments, data = random_network(3)
+	events = []
+	merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), profile=merge.MergeProfile(progress=events.append))
+
+	assert len(events) == segments.groupby(["road", "cwy"]).ngroups
+	assert [event.done_rows for event in events] == sorted(event.done_rows for event in events)
+	assert events[-1].done_rows == events[-1].total_rows == len(segments)
+	assert events[-1].eta_seconds == 0
@@ -0,0 +1,57 @@
+import pandas as pd
+import numpy as np
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+def wide_network(seed, extra_columns=150):
+	segments, data = random_network(seed)
+	rng = np.random.default_rng(seed)
+	extra = pd.DataFrame(
+		rng.random((len(data), extra_columns)),
+		columns=[f"unused_{column_index}" for column_index in range(extra_columns)],
+		index=data.index
+	)
+	return segments, pd.concat([data, extra], axis=1)
+
+
+def test_unused_columns_do_not_change_result():
+	segments, data = random_network(13)
+	_, wide_data = wide_network(13)
+
+	pd.testing.assert_frame_equal(
+		merge.on_slk_intervals(segments, wide_data, ["road", "cwy"], column_actions, ("slk_from", "slk_to")),
+		merge.on_slk_intervals(segments, data,      ["road", "cwy"], column_actions, ("slk_from", "slk_to")),
+	)
+
+
+def test_memory_budget():
+	segments, wide_data = wide_network(14)
+	narrow_data = wide_data[["road", "cwy", "slk_from", "slk_to", "measure", "category"]]
+
+	# the estimate only counts the columns used by the merge
+	narrow_estimate = merge._estimate_memory(segments, narrow_data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	wide_estimate   = merge._estimate_memory(segments, wide_data,   ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	assert narrow_estimate == wide_estimate
+	assert wide_estimate < wide_data.memory_usage(index=True, deep=False).sum()
+
+	merge.on_slk_intervals(segments, wide_data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), memory_budget=wide_estimate)
+
+	with pytest.raises(Exception, match=re.escape("MiB of memory, which exceeds the `memory_budget` of 0.0 MiB.")):
+		merge.on_slk_intervals(segments, wide_data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), memory_budget=1)
+
+
+def test_memory_budget_counts_threads():
+	segments, data = random_network(15)
+	serial_estimate   = merge._estimate_memory(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	threaded_estimate = merge._estimate_memory(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), threads=4)
+	assert threaded_estimate > serial_estimate
+	# there are no more busy threads than actions
+	assert merge._estimate_memory(segments, data, ["road", "cwy"], column_actions[:2], ("slk_from", "slk_to"), threads=4) == \
+		merge._estimate_memory(segments, data, ["road", "cwy"], column_actions[:2], ("slk_from", "slk_to"), threads=2)
+
+	merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), memory_budget=serial_estimate)
+	with pytest.raises(Exception, match=re.escape("which exceeds the `memory_budget`")):
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), memory_budget=serial_estimate, threads=4)
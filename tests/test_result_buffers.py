@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+@pytest.mark.parametrize("engine", ["sweep", "reference"])
+def test_non_unique_target_index(engine):
+	segments, data = random_network(0)
+	expected = merge.on_slk_intervals(segments.reset_index(drop=True), data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine)
+
+	# every label is used twice and the labels are not sorted
+	segments.index = [label // 2 for label in range(len(segments))][::-1]
+	result = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine=engine)
+
+	assert result.index.equals(segments.index)
+	pd.testing.assert_frame_equal(result.reset_index(drop=True), expected)
+
+
+def test_non_unique_target_index_in_chunks():
+	segments, data = random_network(1)
+	segments.index = [0] * len(segments)
+	expected = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	chunks = list(merge.iter_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), chunk_size=7))
+	pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+
+def test_result_dtypes():
+	segments, data = random_network(2)
+	data = data.dropna(subset=["measure"]).astype({"measure": "int64"})
+	result = merge.on_slk_intervals(segments, data, ["road", "cwy"], [
+		merge.Action("measure",  rename="sum",      aggregation=merge.Aggregation.Sum()),
+		merge.Action("category", rename="category", aggregation=merge.Aggregation.First()),
+	], ("slk_from", "slk_to"))
+
+	# carriageway S has no data, so the integer sum must be widened to hold NaN
+	assert result["sum"].dtype == "float64"
+	assert result["category"].dtype != "float64"
+	assert result[result["cwy"] == "S"][["sum", "category"]].isna().all().all()
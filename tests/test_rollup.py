@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network
+
+
+rollup_actions = [
+	merge.Action('measure',  rename="lenw_mean", aggregation=merge.Aggregation.LengthWeightedAverage()),
+	merge.Action('measure',  rename="prop_sum",  aggregation=merge.Aggregation.ProportionalSum()),
+	merge.Action('measure',  rename="longest",   aggregation=merge.Aggregation.KeepLongest()),
+	merge.Action('category', rename="category",  aggregation=merge.Aggregation.KeepLongest()),
+]
+
+
+def fine_segmentation(segments, step):
+	"""Split each segment at every multiple of `step`"""
+	rows = []
+	for road, cwy, slk_from, slk_to in segments[["road", "cwy", "slk_from", "slk_to"]].itertuples(index=False):
+		breaks = np.unique(np.concatenate([[slk_from, slk_to], np.arange(slk_from - slk_from % step + step, slk_to, step)]))
+		rows += [[road, cwy, fine_from, fine_to] for fine_from, fine_to in zip(breaks[:-1], breaks[1:])]
+	return pd.DataFrame(rows, columns=["road", "cwy", "slk_from", "slk_to"])
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_rollup_matches_direct_merge(seed):
+	segments, data = random_network(seed)
+	statistics = merge.sufficient_statistics(fine_segmentation(segments, 10), data, ["road", "cwy"], rollup_actions, ("slk_from", "slk_to"))
+	result = merge.rollup(statistics, segments, ["road", "cwy"], rollup_actions, ("slk_from", "slk_to"))
+	expected = merge.on_slk_intervals(segments, data, ["road", "cwy"], rollup_actions, ("slk_from", "slk_to"))
+	pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-9)
+
+
+def test_rollup_no_overlapping_data():
+	segments, data = random_network(0)
+	data = data.assign(road="H999")
+	statistics = merge.sufficient_statistics(fine_segmentation(segments, 10), data, ["road", "cwy"], rollup_actions, ("slk_from", "slk_to"))
+	result = merge.rollup(statistics, segments, ["road", "cwy"], rollup_actions, ("slk_from", "slk_to"))
+	assert result[[column_action.rename for column_action in rollup_actions]].isna().all().all()
+	assert len(result) == len(segments)
+
+
+def test_rollup_errors():
+	segments, data = random_network(0)
+	with pytest.raises(Exception, match=re.escape("Cannot compute sufficient statistics for Sum of column 'measure'.")):
+		merge.sufficient_statistics(segments, data, ["road", "cwy"], [merge.Action('measure', merge.Aggregation.Sum())], ("slk_from", "slk_to"))
+	
+	statistics = merge.sufficient_statistics(segments, data, ["road", "cwy"], rollup_actions, ("slk_from", "slk_to"))
+	with pytest.raises(Exception, match=re.escape("cross a boundary between segments of `target`")):
+		merge.rollup(statistics, fine_segmentation(segments, 10), ["road", "cwy"], rollup_actions, ("slk_from", "slk_to"))
+	with pytest.raises(Exception, match=re.escape("Columns ['measure__proportional_sum'] are missing from `statistics`.")):
+		merge.rollup(statistics, segments, ["road", "cwy"], [merge.Action('measure', merge.Aggregation.ProportionalSum())], ("slk_from", "slk_to"))
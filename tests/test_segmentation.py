@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+import dtimsprep.segmentation as segmentation
+from testing import random_network
+
+
+pavement = pd.DataFrame({
+	"road":           ["H001", "H001", "H001", "H001", "H001", "H002"],
+	"slk_from":       [0,      100,    150,    200,    400,    0],
+	"slk_to":         [100,    150,    200,    400,    450,    1000],
+	"pavement_type":  ["tA",   "tA",   "tB",   "tB",   "tA",   "tC"],
+	"pavement_width": [3.0,    3.2,    3.2,    6.0,    6.0,    3.5],
+})
+pavement_actions = [
+	merge.Action("pavement_type",  merge.Aggregation.KeepLongest()),
+	merge.Action("pavement_width", merge.Aggregation.LengthWeightedAverage()),
+]
+
+
+def sections(**kwargs):
+	return segmentation.homogeneous_sections([(pavement, pavement_actions)], ["road"], ("slk_from", "slk_to"), **kwargs)
+
+
+def test_change_points():
+	pd.testing.assert_frame_equal(sections(), pd.DataFrame({
+		"road":     ["H001", "H001", "H001", "H001", "H001", "H002"],
+		"slk_from": [0,      100,    150,    200,    400,    0],
+		"slk_to":   [100,    150,    200,    400,    450,    1000],
+	}))
+	# a small change of width is ignored, but pavement_type still changes at 150
+	pd.testing.assert_frame_equal(sections(tolerances={"pavement_width": 0.5}), pd.DataFrame({
+		"road":     ["H001", "H001", "H001", "H001", "H002"],
+		"slk_from": [0,      150,    200,    400,    0],
+		"slk_to":   [150,    200,    400,    450,    1000],
+	}))
+
+
+def test_min_and_max_length():
+	pd.testing.assert_frame_equal(sections(min_length=120, max_length=300), pd.DataFrame({
+		"road":     ["H001", "H001", "H001", "H002", "H002", "H002", "H002"],
+		"slk_from": [0,      150,    400,    0,      250,    500,    750],
+		"slk_to":   [150,    400,    450,    250,    500,    750,    1000],
+	}))
+
+
+def test_numeric_columns_only():
+	result = segmentation.homogeneous_sections([(pavement, pavement_actions[1:])], ["road"], ("slk_from", "slk_to"))
+	pd.testing.assert_frame_equal(result, pd.DataFrame({
+		"road":     ["H001", "H001", "H001", "H002"],
+		"slk_from": [0,      100,    200,    0],
+		"slk_to":   [100,    200,    450,    1000],
+	}))
+
+
+def test_max_length_takes_priority_over_min_length():
+	data = pd.DataFrame({
+		"road":          ["H001", "H001", "H001"],
+		"slk_from":      [0,      100,    350],
+		"slk_to":        [100,    350,    500],
+		"pavement_type": ["tA",   "tB",   "tB"],
+	})
+	result = segmentation.homogeneous_sections([(data, pavement_actions[:1])], ["road"], ("slk_from", "slk_to"), min_length=120, max_length=300)
+	# the first section is shorter than min_length, since adding the next piece would make it longer than max_length
+	pd.testing.assert_frame_equal(result, pd.DataFrame({
+		"road":     ["H001", "H001", "H001"],
+		"slk_from": [0,      100,    350],
+		"slk_to":   [100,    350,    500],
+	}))
+
+
+def test_empty_datasets():
+	result = segmentation.homogeneous_sections([(pavement.iloc[:0], pavement_actions)], ["road"], ("slk_from", "slk_to"))
+	pd.testing.assert_frame_equal(result, pavement.iloc[:0].loc[:, ["road", "slk_from", "slk_to"]].reset_index(drop=True))
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_sections_are_homogeneous(seed):
+	segments, _ = random_network(seed)
+	_, data = random_network(seed + 10)
+	data = data[data["slk_from"] < data["slk_to"]]
+	layers = segments.assign(layer=np.arange(len(segments)) % 3)
+	datasets = [
+		(layers, [merge.Action("layer",    merge.Aggregation.First())]),
+		(data,   [merge.Action("category", merge.Aggregation.KeepLongest())]),
+	]
+	result = segmentation.homogeneous_sections(datasets, ["road", "cwy"], ("slk_from", "slk_to"), max_length=100)
+	assert ((result["slk_to"] - result["slk_from"]) <= 100).all()
+	
+	# find the section of every overlay piece; each section must hold one value of each column
+	pieces = merge.overlay([(layers, ["layer"]), (data, ["category"])], ["road", "cwy"], ("slk_from", "slk_to"))
+	pieces = merge.on_slk_intervals(pieces, result.assign(section=np.arange(len(result))), ["road", "cwy"], [merge.Action("section", merge.Aggregation.KeepLongest())], ("slk_from", "slk_to"))
+	assert pieces["section"].notna().all()
+	assert (pieces.groupby("section")[["layer", "category"]].nunique(dropna=False) == 1).all().all()
+	assert (pieces["slk_to"] - pieces["slk_from"]).sum() == (result["slk_to"] - result["slk_from"]).sum()
+
+
+def test_homogeneous_sections_errors():
+	with pytest.raises(Exception, match=re.escape("must satisfy 0 <= min_length <= max_length")):
+		sections(min_length=200, max_length=100)
+	with pytest.raises(Exception, match=re.escape("`tolerances` were given for ['pavement_type']")):
+		sections(tolerances={"pavement_type": 1})
+	with pytest.raises(Exception, match=re.escape("Column 'pavement_type' is used with LengthWeightedAverage, so it must be numeric")):
+		segmentation.homogeneous_sections([(pavement, [merge.Action("pavement_type", merge.Aggregation.LengthWeightedAverage())])], ["road"], ("slk_from", "slk_to"))
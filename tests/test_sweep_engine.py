@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+import re
+import dtimsprep.merge as merge
+from testing import random_network, column_actions
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2, 3])
+def test_sweep_engine_matches_reference(seed):
+	segments, data = random_network(seed)
+
+	res_reference = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="reference")
+	res_sweep     = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="sweep")
+
+	# grouped reductions may round differently to the pandas sums in the last binary place
+	pd.testing.assert_frame_equal(res_sweep, res_reference, check_exact=False, rtol=1e-12)
+
+
+def test_sweep_engine_is_default():
+	segments, data = random_network(0)
+	res_default = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"))
+	res_sweep   = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="sweep")
+	assert res_default.compare(res_sweep).empty
+
+
+def test_unknown_engine():
+	segments, data = random_network(0)
+	with pytest.raises(Exception, match=re.escape("Parameter `engine` must be either 'sweep' or 'reference'. Got 'fast'.")):
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="fast")
+
+
+def test_sweep_engine_integer_data():
+	segments, data = random_network(4)
+	data = data.dropna(subset=["measure"]).astype({"measure": "int64"})
+	integer_column_actions = [
+		merge.Action('measure', rename="longest", aggregation=merge.Aggregation.KeepLongest()),
+		merge.Action('measure', rename="first",   aggregation=merge.Aggregation.First()),
+		merge.Action('measure', rename="sum",     aggregation=merge.Aggregation.Sum()),
+		merge.Action('measure', rename="mean",    aggregation=merge.Aggregation.Average()),
+	]
+
+	res_reference = merge.on_slk_intervals(segments, data, ["road", "cwy"], integer_column_actions, ("slk_from", "slk_to"), engine="reference")
+	res_sweep     = merge.on_slk_intervals(segments, data, ["road", "cwy"], integer_column_actions, ("slk_from", "slk_to"), engine="sweep")
+	pd.testing.assert_frame_equal(res_sweep, res_reference)
+
+	# integer dtypes survive when every target row is matched
+	matched_segments = segments[~res_reference["sum"].isna()]
+	res_reference = merge.on_slk_intervals(matched_segments, data, ["road", "cwy"], integer_column_actions, ("slk_from", "slk_to"), engine="reference")
+	res_sweep     = merge.on_slk_intervals(matched_segments, data, ["road", "cwy"], integer_column_actions, ("slk_from", "slk_to"), engine="sweep")
+	assert res_sweep["sum"].dtype == "int64"
+	pd.testing.assert_frame_equal(res_sweep, res_reference)
+
+
+def test_sweep_engine_no_matching_data():
+	segments, data = random_network(0)
+	data = data.assign(road="H999")
+	res_reference = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="reference")
+	res_sweep     = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="sweep")
+	pd.testing.assert_frame_equal(res_sweep, res_reference)
+
+
+def test_empty_data():
+	segments, data = random_network(0)
+	data = data.iloc[:0]
+	action_names = [column_action.rename for column_action in column_actions]
+	res_reference = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="reference")
+	res_sweep     = merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="sweep")
+	assert res_sweep[action_names].isna().all().all()
+	pd.testing.assert_frame_equal(res_sweep, res_reference)
+	chunks = pd.concat(merge.iter_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to")))
+	pd.testing.assert_frame_equal(chunks.loc[res_sweep.index, segments.columns], segments)
+	assert chunks[action_names].isna().all().all()
+	pd.testing.assert_frame_equal(merge.on_slk_intervals_many(segments, [(data, column_actions)], ["road", "cwy"], ("slk_from", "slk_to")), res_sweep)
+	overlaid = merge.overlay([(random_network(0)[1], ["measure"]), (data, ["category"])], ["road", "cwy"], ("slk_from", "slk_to"))
+	assert len(overlaid) > 0 and overlaid["category"].isna().all()
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_count_and_max_match_reference(seed):
+	segments, data = random_network(seed)
+	count_max_actions = [
+		merge.Action('measure',  rename="count",          aggregation=merge.Aggregation.Count()),
+		merge.Action('measure',  rename="max",            aggregation=merge.Aggregation.Max()),
+		merge.Action('category', rename="category_count", aggregation=merge.Aggregation.Count()),
+	]
+	pd.testing.assert_frame_equal(
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], count_max_actions, ("slk_from", "slk_to"), engine="sweep"),
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], count_max_actions, ("slk_from", "slk_to"), engine="reference"),
+		check_dtype=False
+	)
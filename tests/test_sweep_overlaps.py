@@ -0,0 +1,38 @@
+import tracemalloc
+import numpy as np
+import pandas as pd
+import dtimsprep.merge as merge
+from dtimsprep.core import _sweep_overlaps
+from testing import random_network, column_actions
+
+
+def test_long_data_row_does_not_make_every_row_a_candidate():
+	target_from = np.arange(6000) * 10
+	target_to   = target_from + 10
+	# well-formed data, plus one row covering the whole road
+	data_from = np.append(np.arange(6000) * 10 + 5, 0)
+	data_to   = np.append(np.arange(6000) * 10 + 15, 60000)
+
+	tracemalloc.start()
+	target_positions, data_positions = _sweep_overlaps(target_from, target_to, data_from, data_to)
+	peak_bytes = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	# before rows were split by length, every row after the long one was a candidate for every target (~600 MiB)
+	assert peak_bytes < 20 * 2**20
+	# target i overlaps data rows i - 1 and i, and the long row
+	expected_target = np.concatenate([np.arange(6000), np.arange(1, 6000), np.arange(6000)])
+	expected_data   = np.concatenate([np.arange(6000), np.arange(5999),    np.full(6000, 6000)])
+	expected_order = np.lexsort((expected_data, expected_target))
+	np.testing.assert_array_equal(target_positions, expected_target[expected_order])
+	np.testing.assert_array_equal(data_positions, expected_data[expected_order])
+
+
+def test_long_data_row_matches_reference():
+	segments, data = random_network(4)
+	long_rows = pd.DataFrame({"road": ["H001", "H002"], "cwy": ["L", "R"], "slk_from": [-20, 0], "slk_to": [600, 300], "measure": [9.0, 8.0], "category": ["C", None]}, index=[-1, -2])
+	data = pd.concat([data, long_rows])
+	pd.testing.assert_frame_equal(
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="sweep"),
+		merge.on_slk_intervals(segments, data, ["road", "cwy"], column_actions, ("slk_from", "slk_to"), engine="reference"),
+	)
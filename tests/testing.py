@@ -51,50 +51,128 @@ data = pd.DataFrame(
 	]
 )
 
-res = merge.on_slk_intervals(
-	segments,
-	data,
-	["road","cwy"],
-	[
-		merge.Action('measure_a', rename="longest",    aggregation=merge.Aggregation.KeepLongest()),
-		merge.Action('measure_a', rename="mean",       aggregation=merge.Aggregation.Average()),
-		merge.Action('measure_a', rename="lenw_mean",  aggregation=merge.Aggregation.LengthWeightedAverage()),
-		merge.Action('measure_a', rename="lenw_prc75", aggregation=merge.Aggregation.LengthWeightedPercentile(0.75)),
-		merge.Action('cat_1',     rename="cat",        aggregation=merge.Aggregation.KeepLongest()),
-	]
-)
 
-print(res)
-print(res.dtypes)
-exit()
-segments["segment_id"] = segments.index
-segments = segments.set_index(["road","cwy","segment_id"])
-segments.sort_index()
-# print(segments)
-
-data['data_id'] = data.index
-data = data.set_index(["road","cwy","data_id"])
-data = data.sort_index()
-# print(data)
-
-for segment_group_index, segment_group in segments.groupby(level=[0,1]):
-	print("\n\n==========================")
-	print(f"segment_group_index {segment_group_index}")
-	print(f"segment_group {segment_group}")
-	print(f"type(segment_group) {type(segment_group)}")
-	print(f"Dataframe: {isinstance(segment_group, pd.DataFrame)}")
-	print(f"Series: {isinstance(segment_group, pd.Series)}")
-
-
-	try:
-		data_to_merge = data.loc[segment_group_index]
-	except KeyError:
-		# no data under that key. Skip
-		continue
-	print(data_to_merge)
-
-	for segment_row_index, segment_row in segment_group.iterrows():
-		print("\n==========")
-		print(f"segment_row_index, {segment_row_index}")
-		print(f"segment_row, {segment_row}")
-		print(f"type(segment_row) {type(segment_row)}")
\ No newline at end of file
+def random_network(seed):
+	rng = np.random.default_rng(seed)
+
+	segment_rows = []
+	data_rows = []
+	for road in ["H001", "H002", "H003"]:
+		for cwy in ["L", "R", "S"]:
+			segment_breaks = np.unique(rng.integers(0, 500, size=12))
+			for slk_from, slk_to in zip(segment_breaks[:-1], segment_breaks[1:]):
+				segment_rows.append([road, cwy, slk_from, slk_to])
+			if cwy == "S":
+				# no data for this carriageway
+				continue
+			for _ in range(40):
+				# data deliberately contains overlapping, nested and zero length segments
+				slk_from = rng.integers(-20, 520)
+				slk_to = slk_from + rng.integers(0, 60)
+				data_rows.append([
+					road,
+					cwy,
+					slk_from,
+					slk_to,
+					np.nan if rng.random() < 0.1 else float(rng.integers(0, 8)),
+					rng.choice(["A", "B", "C", None]),
+				])
+
+	segments = pd.DataFrame(segment_rows, columns=["road", "cwy", "slk_from", "slk_to"])
+	data = pd.DataFrame(data_rows, columns=["road", "cwy", "slk_from", "slk_to", "measure", "category"])
+
+	# shuffle so that neither dataframe arrives sorted, and give data a non-trivial index
+	segments = segments.sample(frac=1, random_state=seed)
+	data = data.sample(frac=1, random_state=seed + 1)
+	data.index = data.index * 3 + 7
+	return segments, data
+
+
+column_actions = [
+	merge.Action('measure',  rename="longest",        aggregation=merge.Aggregation.KeepLongest()),
+	merge.Action('measure',  rename="longest_seg",    aggregation=merge.Aggregation.KeepLongestSegment()),
+	merge.Action('measure',  rename="mean",           aggregation=merge.Aggregation.Average()),
+	merge.Action('measure',  rename="lenw_mean",      aggregation=merge.Aggregation.LengthWeightedAverage()),
+	merge.Action('measure',  rename="lenw_prc75",     aggregation=merge.Aggregation.LengthWeightedPercentile(0.75)),
+	merge.Action('measure',  rename="first",          aggregation=merge.Aggregation.First()),
+	merge.Action('measure',  rename="prop_sum",       aggregation=merge.Aggregation.ProportionalSum()),
+	merge.Action('measure',  rename="sum",            aggregation=merge.Aggregation.Sum()),
+	merge.Action('measure',  rename="argmax",         aggregation=merge.Aggregation.IndexOfMax()),
+	merge.Action('category', rename="category",       aggregation=merge.Aggregation.KeepLongest()),
+	merge.Action('category', rename="category_first", aggregation=merge.Aggregation.First()),
+]
+
+
+def disjoint_network(seed):
+	rng = np.random.default_rng(seed)
+	segments, _ = random_network(seed)
+
+	data_rows = []
+	for road in ["H001", "H002", "H003"]:
+		for cwy in ["L", "R"]:
+			data_breaks = np.unique(rng.integers(-20, 520, size=60))
+			for slk_from, slk_to in zip(data_breaks[:-1], data_breaks[1:]):
+				if rng.random() < 0.15:
+					# leave a gap in the data
+					continue
+				data_rows.append([
+					road,
+					cwy,
+					slk_from,
+					slk_to,
+					np.nan if rng.random() < 0.1 else rng.random() * 10,
+					int(rng.integers(0, 100)),
+				])
+
+	data = pd.DataFrame(data_rows, columns=["road", "cwy", "slk_from", "slk_to", "measure", "count"])
+	return segments, data.sample(frac=1, random_state=seed)
+
+
+if __name__ == "__main__":
+	res = merge.on_slk_intervals(
+		segments,
+		data,
+		["road","cwy"],
+		[
+			merge.Action('measure_a', rename="longest",    aggregation=merge.Aggregation.KeepLongest()),
+			merge.Action('measure_a', rename="mean",       aggregation=merge.Aggregation.Average()),
+			merge.Action('measure_a', rename="lenw_mean",  aggregation=merge.Aggregation.LengthWeightedAverage()),
+			merge.Action('measure_a', rename="lenw_prc75", aggregation=merge.Aggregation.LengthWeightedPercentile(0.75)),
+			merge.Action('cat_1',     rename="cat",        aggregation=merge.Aggregation.KeepLongest()),
+		]
+	)
+
+	print(res)
+	print(res.dtypes)
+	exit()
+	segments["segment_id"] = segments.index
+	segments = segments.set_index(["road","cwy","segment_id"])
+	segments.sort_index()
+	# print(segments)
+
+	data['data_id'] = data.index
+	data = data.set_index(["road","cwy","data_id"])
+	data = data.sort_index()
+	# print(data)
+
+	for segment_group_index, segment_group in segments.groupby(level=[0,1]):
+		print("\n\n==========================")
+		print(f"segment_group_index {segment_group_index}")
+		print(f"segment_group {segment_group}")
+		print(f"type(segment_group) {type(segment_group)}")
+		print(f"Dataframe: {isinstance(segment_group, pd.DataFrame)}")
+		print(f"Series: {isinstance(segment_group, pd.Series)}")
+
+
+		try:
+			data_to_merge = data.loc[segment_group_index]
+		except KeyError:
+			# no data under that key. Skip
+			continue
+		print(data_to_merge)
+
+		for segment_row_index, segment_row in segment_group.iterrows():
+			print("\n==========")
+			print(f"segment_row_index, {segment_row_index}")
+			print(f"segment_row, {segment_row}")
+			print(f"type(segment_row) {type(segment_row)}")
\ No newline at end of file